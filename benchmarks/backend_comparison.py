@@ -0,0 +1,41 @@
+"""
+Run the command mix against several storage backends and compare their throughput.
+
+Each backend runs in its own interpreter, because database.py picks its backend at import time.
+The mongo run writes to whatever DB_URI points at, so point it at a scratch database.
+
+Usage:
+    python -m benchmarks.backend_comparison [--backends sqlite mongo] [--members 1000] [--operations 20000] [--concurrency 32]
+"""
+import argparse
+import subprocess
+import sys
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["sqlite", "mongo"], choices=("memory", "sqlite", "mongo"))
+    parser.add_argument("--members", type=int, default=1000)
+    parser.add_argument("--operations", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    for backend in args.backends:
+        command = [
+            sys.executable, "-m", "benchmarks.command_mix",
+            "--backend", backend,
+            "--members", str(args.members),
+            "--operations", str(args.operations),
+            "--concurrency", str(args.concurrency),
+            "--seed", str(args.seed),
+        ]
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"{backend}: failed\n{result.stderr.strip()}")
+            continue
+        print(result.stdout.strip())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Measure the memory hikari's cache takes under each cache profile (cache_profile.py), per 1k guild members.
+
+Every profile runs in a fresh interpreter with a GatewayBot built the way main.py builds it, with listeners
+for the events the extensions handle. Synthetic gateway dispatches go straight into hikari's event manager:
+a GUILD_CREATE per guild, with the first 250 members as Discord sends them, the rest of the members as
+member chunks the way the member backfill requests them, then message creates. RSS is read before and after,
+with garbage collected. The last step replays reactions on recent messages, 90% of them on the newest
+10% of messages, and counts how many the emote leaderboard would answer from the cache instead of REST.
+
+Usage:
+    python -m benchmarks.cache_memory [--guilds 10] [--members 10000] [--messages 20000] [--reactions 5000]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+from types import SimpleNamespace
+
+SNOWFLAKE_BASE = 100_000_000_000_000_000
+TIMESTAMP = "2024-01-01T00:00:00+00:00"
+LARGE_THRESHOLD = 250
+CHUNK_SIZE = 1000
+EMOJIS_PER_GUILD = 50
+
+
+def rss_kib() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def user_payload(user_id: int) -> dict:
+    return {"id": str(user_id), "username": f"member{user_id}", "discriminator": "0", "avatar": None, "global_name": f"Member {user_id}"}
+
+
+def member_payload(user_id: int) -> dict:
+    return {"user": user_payload(user_id), "roles": [], "joined_at": TIMESTAMP, "deaf": False, "mute": False, "flags": 0}
+
+
+def guild_payload(guild_id: int, member_ids: list[int]) -> dict:
+    return {
+        "id": str(guild_id),
+        "name": f"guild{guild_id}",
+        "icon": None,
+        "splash": None,
+        "discovery_splash": None,
+        "banner": None,
+        "description": None,
+        "owner_id": str(member_ids[0]),
+        "afk_channel_id": None,
+        "afk_timeout": 300,
+        "verification_level": 0,
+        "default_message_notifications": 0,
+        "explicit_content_filter": 0,
+        "mfa_level": 0,
+        "nsfw_level": 0,
+        "premium_tier": 0,
+        "premium_subscription_count": 0,
+        "premium_progress_bar_enabled": False,
+        "preferred_locale": "en-US",
+        "application_id": None,
+        "system_channel_id": None,
+        "system_channel_flags": 0,
+        "rules_channel_id": None,
+        "public_updates_channel_id": None,
+        "safety_alerts_channel_id": None,
+        "vanity_url_code": None,
+        "features": [],
+        "joined_at": TIMESTAMP,
+        "large": len(member_ids) > LARGE_THRESHOLD,
+        "unavailable": False,
+        "member_count": len(member_ids),
+        "max_members": 500000,
+        "max_video_channel_users": 25,
+        "roles": [{
+            "id": str(guild_id), "name": "@everyone", "color": 0, "hoist": False, "icon": None, "unicode_emoji": None,
+            "position": 0, "permissions": "0", "managed": False, "mentionable": False, "flags": 0
+        }],
+        "emojis": [{
+            "id": str(guild_id + 1 + i), "name": f"emoji{i}", "roles": [], "user": None, "require_colons": True,
+            "managed": False, "animated": False, "available": True
+        } for i in range(EMOJIS_PER_GUILD)],
+        "stickers": [],
+        "channels": [{
+            "id": str(guild_id), "type": 0, "name": "general", "position": 0, "permission_overwrites": [],
+            "nsfw": False, "topic": None, "last_message_id": None, "rate_limit_per_user": 0, "parent_id": None
+        }],
+        "threads": [],
+        "voice_states": [],
+        "presences": [],
+        "members": [member_payload(user_id) for user_id in member_ids[:LARGE_THRESHOLD]]
+    }
+
+
+def message_payload(message_id: int, guild_id: int, author_id: int) -> dict:
+    return {
+        "id": str(message_id),
+        "channel_id": str(guild_id),
+        "guild_id": str(guild_id),
+        "author": user_payload(author_id),
+        "member": {key: value for key, value in member_payload(author_id).items() if key != "user"},
+        "content": f"message {message_id} " + "lorem ipsum " * 8,
+        "timestamp": TIMESTAMP,
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "reactions": [],
+        "pinned": False,
+        "type": 0,
+        "flags": 0
+    }
+
+
+async def measure(profile: str, args: argparse.Namespace) -> dict:
+    import hikari
+    from cache_profile import cache_settings
+
+    bot = hikari.GatewayBot("MTIzNDU2Nzg5MDEyMzQ1Njc4.cache.benchmark", banner=None, cache_settings=cache_settings(profile, args.max_messages))
+
+    async def ignore(_: hikari.Event) -> None:
+        pass
+
+    # The events main.py and the extensions listen for, so hikari builds them as it would in production
+    for event_type in (hikari.GuildAvailableEvent, hikari.MemberChunkEvent, hikari.MemberCreateEvent, hikari.MessageCreateEvent):
+        bot.subscribe(event_type, ignore)
+
+    events = bot.event_manager
+    bot_user_id = SNOWFLAKE_BASE - 1
+    shard = SimpleNamespace(id=0, get_user_id=lambda: bot_user_id)
+    rng = random.Random(args.seed)
+
+    gc.collect()
+    before = rss_kib()
+
+    guilds = {}
+    for index in range(args.guilds):
+        guild_id = SNOWFLAKE_BASE + index * 10_000_000
+        member_ids = [guild_id + 1_000_000 + i for i in range(args.members)]
+        guilds[guild_id] = member_ids
+        events.on_guild_create(shard, guild_payload(guild_id, member_ids))
+
+        for chunk_index, start in enumerate(range(0, len(member_ids), CHUNK_SIZE)):
+            events.on_guild_members_chunk(shard, {
+                "guild_id": str(guild_id),
+                "members": [member_payload(user_id) for user_id in member_ids[start:start + CHUNK_SIZE]],
+                "chunk_index": chunk_index,
+                "chunk_count": -(-len(member_ids) // CHUNK_SIZE),
+                "not_found": [],
+                "nonce": "backfill"
+            })
+            # Let the dispatched events run, as the gateway would between payloads
+            await asyncio.sleep(0)
+
+    message_ids = []
+    for index in range(args.messages):
+        guild_id = rng.choice(list(guilds))
+        message_id = SNOWFLAKE_BASE * 2 + index
+        message_ids.append(message_id)
+        events.on_message_create(shard, message_payload(message_id, guild_id, rng.choice(guilds[guild_id])))
+        if index % 100 == 0:
+            await asyncio.sleep(0)
+
+    await asyncio.sleep(0)
+    gc.collect()
+    after = rss_kib()
+
+    recent = max(1, len(message_ids) // 10)
+    message_hits = emoji_hits = 0
+    for _ in range(args.reactions):
+        if rng.random() < 0.9:
+            message_id = rng.choice(message_ids[-recent:])
+        else:
+            message_id = rng.choice(message_ids)
+        message_hits += bot.cache.get_message(message_id) is not None
+        guild_id = rng.choice(list(guilds))
+        emoji_hits += bot.cache.get_emoji(guild_id + 1 + rng.randrange(EMOJIS_PER_GUILD)) is not None
+
+    return {
+        "profile": profile,
+        "rss_kib": after - before,
+        "members": args.guilds * args.members,
+        "cached_members": sum(len(members) for members in bot.cache.get_members_view().values()),
+        "cached_messages": len(bot.cache.get_messages_view()),
+        "message_hits": message_hits / max(args.reactions, 1),
+        "emoji_hits": emoji_hits / max(args.reactions, 1)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--members", type=int, default=10_000, help="Members per guild")
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--reactions", type=int, default=5_000)
+    parser.add_argument("--max-messages", type=int, default=1000, help="CACHE_MAX_MESSAGES for the bounded profiles")
+    parser.add_argument("--profiles", default="full,lean,none")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--profile", help=argparse.SUPPRESS)  # Set for the child run of a single profile
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(asyncio.run(measure(args.profile, args))))
+        return
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    print(f"{args.guilds} guilds x {args.members:,} members, {args.messages:,} messages, {args.reactions:,} reactions")
+    for profile in args.profiles.split(","):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.cache_memory", *sys.argv[1:], "--profile", profile],
+            cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()
+        result = json.loads(output[-1])
+        per_1k = result["rss_kib"] / max(result["members"] / 1000, 1e-9) / 1024
+        print(
+            f"  {profile:<5} RSS +{result['rss_kib'] / 1024:>7.1f} MiB  {per_1k:>6.2f} MiB per 1k members  "
+            f"cached: {result['cached_members']:>7,} members, {result['cached_messages']:>6,} messages  "
+            f"reaction lookups from cache: messages {result['message_hits']:.0%}, emojis {result['emoji_hits']:.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Replay a weighted mix of the bot's economy, gambling and leaderboard operations against a storage backend.
+
+The mix calls the same helpers the slash commands call (balance reads, deposits, bets, loans,
+emote counting and leaderboard reads), seeded so every run performs the same operations in the same order.
+With the memory backend it needs no database at all, the sqlite backend writes to a fresh temporary file,
+and the mongo backend writes to whatever DB_URI points at, so only run that against a scratch database.
+
+Usage:
+    python -m benchmarks.command_mix [--backend memory|sqlite|mongo] [--members 1000] [--operations 20000]
+                                     [--concurrency 32] [--latency-ms 0] [--seed 1]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+# Weight of each operation in the mix, roughly matching command usage in a busy guild
+MIX = {
+    "balance": 30,
+    "deposit": 10,
+    "bet": 25,
+    "emote": 25,
+    "leaderboard": 5,
+    "loan": 3,
+    "stats": 2,
+}
+
+
+def configure(backend: str, latency_ms: float) -> None:
+    """Pick the backend before database.py is imported, since it reads its settings at import time."""
+    os.environ["DB_BACKEND"] = backend
+    os.environ["DB_MEMORY_LATENCY_MS"] = str(latency_ms)
+    if backend == "sqlite":
+        os.environ["DB_SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="idiot_bench_"), "bench.sqlite3")
+
+
+async def seed_members(count: int) -> list[str]:
+    from database import members
+
+    user_ids = [str(100_000_000_000_000_000 + i) for i in range(count)]
+    now = datetime.now(timezone.utc)
+    await members.insert_many([
+        {
+            "id": user_id,
+            "username": f"member{i}",
+            "display_name": f"Member {i}",
+            "cash": 1_000_000.0,
+            "bank": 0.0,
+            "total_debt": 0,
+            "credit_score": 500,
+            "wins": 0,
+            "losses": 0,
+            "trophies": [],
+            "joined_at": now,
+            "created_at": now
+        } for i, user_id in enumerate(user_ids)
+    ], ordered=False)
+    return user_ids
+
+
+async def run_operation(name: str, user_id: str, rng: random.Random) -> None:
+    from database import emote_counters
+    import extensions.economy.economy_util as eu
+    import extensions.economy.banking as banking
+    import extensions.economy.gambling.gamble_util as gu
+    from extensions.emote_leaderboard.leaderboard import increment_emoji_count
+
+    if name == "balance":
+        await eu.get_user_balances(user_id)
+    elif name == "deposit":
+        await eu.transfer_balance(user_id, 10.0, "cash", "bank")
+        await eu.create_transaction_record(user_id, user_id, 10.0, "Deposit to bank", "deposit")
+    elif name == "bet":
+        placed, _ = await gu.place_bet(user_id, 5.0, "spin", "slots")
+        if placed:
+            won = rng.random() < 0.45
+            await gu.process_gambling_result(user_id, "1", "slots", 5.0, 10.0 if won else 0.0, "win" if won else "loss")
+    elif name == "emote":
+        await increment_emoji_count(1, 4242, SimpleNamespace(id=user_id))
+    elif name == "leaderboard":
+        await emote_counters.find({"guild_id": "1", "emoji_id": 4242}).sort("count", -1).limit(10).to_list(length=None)
+    elif name == "loan":
+        loan_id = await banking.create_loan(user_id, 200.0, 15.0, 4)
+        await banking.make_loan_payment(user_id, loan_id, 200.0)
+    elif name == "stats":
+        await gu.get_user_gambling_stats(user_id)
+
+
+async def run(args: argparse.Namespace) -> None:
+    configure(args.backend, args.latency_ms)
+
+    import database
+    from indexes import ensure_indexes
+    from extensions.economy.ledger import transaction_ledger, gambling_ledger
+
+    await database.connect()
+    await ensure_indexes()
+    user_ids = await seed_members(args.members)
+
+    rng = random.Random(args.seed)
+    names, weights = zip(*MIX.items())
+    plan = [(rng.choices(names, weights)[0], rng.choice(user_ids)) for _ in range(args.operations)]
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def timed(name: str, user_id: str, op_rng: random.Random) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await run_operation(name, user_id, op_rng)
+            latencies[name].append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(name, user_id, random.Random(args.seed + i)) for i, (name, user_id) in enumerate(plan)))
+    await transaction_ledger.drain()
+    await gambling_ledger.drain()
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.operations} operations on {args.backend} ({args.members} members, concurrency {args.concurrency}): "
+          f"{args.operations / elapsed:,.0f} ops/s")
+    for name in names:
+        samples = sorted(latencies[name])
+        if samples:
+            p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+            print(f"  {name:<12} n={len(samples):>6}  mean {statistics.fmean(samples):>8.3f} ms  p99 {p99:>8.3f} ms")
+    if hasattr(database.backend, "stats"):
+        print(f"  backend      {database.backend.stats()}")
+
+    await database.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="memory", choices=("memory", "sqlite", "mongo"))
+    parser.add_argument("--members", type=int, default=1000)
+    parser.add_argument("--operations", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated round trip added to every memory backend call")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
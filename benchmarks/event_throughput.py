@@ -0,0 +1,99 @@
+"""
+Measure how many reaction events per second the emote leaderboard listener takes in when every
+database round trip has a simulated latency.
+
+Each mode is a fresh interpreter that sends reactions with the tracked emoji through the real
+`emote_counter` listener, against the memory storage backend and the stand-in for Discord from
+benchmarks.reaction_logging. Every event runs as its own task, the way hikari runs listeners.
+
+    blocking  each database round trip holds the event loop, as the synchronous pymongo calls did
+    async     each round trip yields to the loop, as the async collections in database.py do
+
+REST calls to Discord yield to the loop in both modes, so only the database access differs.
+
+Usage:
+    python -m benchmarks.event_throughput [--events 500] [--latency-ms 20] [--concurrency 500]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+from benchmarks.reaction_logging import CHANNEL_ID, GUILD_ID, SNOWFLAKE_BASE, TRACKED_EMOJI, FakeDiscord
+
+
+async def measure(args: argparse.Namespace) -> dict:
+    os.environ["DB_BACKEND"] = "memory"
+    os.environ["DB_MEMORY_LATENCY_MS"] = str(args.latency_ms)
+    os.environ.setdefault("OWNER_ID", "0")
+
+    from storage.memory import MemoryCollection
+    if args.mode == "blocking":
+        async def blocking_round_trip(self) -> None:
+            if self.latency:
+                time.sleep(self.latency)
+        MemoryCollection._round_trip = blocking_round_trip
+
+    from database import guilds, emote_counters
+    from indexes import ensure_indexes
+    from extensions.emote_leaderboard.leaderboard import emote_counter
+
+    await ensure_indexes()
+    await guilds.insert_one({"guild_id": str(GUILD_ID), "tracked_emoji": TRACKED_EMOJI})
+    # REST calls keep a fixed, non-blocking latency in both modes
+    app = FakeDiscord(args.latency_ms / 1000, [SNOWFLAKE_BASE + i for i in range(args.members)])
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def react(index: int) -> None:
+        event = SimpleNamespace(
+            app=app,
+            guild_id=GUILD_ID,
+            channel_id=CHANNEL_ID,
+            message_id=SNOWFLAKE_BASE * 2 + index,
+            emoji_id=None,
+            emoji_name=TRACKED_EMOJI,
+            member=SimpleNamespace(id=SNOWFLAKE_BASE - 1, is_bot=False)
+        )
+        async with semaphore:
+            await emote_counter(event)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(asyncio.create_task(react(i)) for i in range(args.events)))
+    elapsed = time.perf_counter() - start
+
+    counted = sum(counter["count"] for counter in await emote_counters.find({}, {"_id": 0, "count": 1}).to_list(length=None))
+    return {"events_per_second": args.events / elapsed, "counted": counted}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Simulated database and REST round trip")
+    parser.add_argument("--concurrency", type=int, default=500, help="Events handled at once")
+    parser.add_argument("--members", type=int, default=100, help="Distinct message authors credited")
+    parser.add_argument("--mode", help=argparse.SUPPRESS)  # Set for the child run of a single mode
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(asyncio.run(measure(args))))
+        return
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for label, mode in (("blocking (sync pymongo)", "blocking"), ("async collections", "async")):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.event_throughput", *sys.argv[1:], "--mode", mode],
+            cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()
+        result = json.loads(output[-1])
+        print(
+            f"{label:<24} {result['events_per_second']:>10.1f} events/sec  "
+            f"({args.events} reactions through emote_counter, {args.latency_ms:.0f} ms round trips, {result['counted']} counted)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Load test the HTTP interaction server (http_main.py) with signed slash command payloads.
+
+The server runs in this process against the memory storage backend, with a freshly generated key pair
+standing in for the application's public key and command syncing turned off. Each request is a signed
+command interaction built the way Discord sends it. The mix is /ping and /bank balance, the latter for
+seeded members. Lightbulb sends each reply to Discord's interaction callback endpoint before the server
+answers the request. A local stand-in for the Discord API, set through DISCORD_REST_URL, receives those
+callbacks, so no Discord connection is needed. A request counts as served only once its reply has been
+received there. A request with a bad signature is sent first and must be rejected.
+
+Usage:
+    python -m benchmarks.http_interactions [--requests 5000] [--concurrency 64] [--members 1000] [--port 8089]
+
+The stand-in Discord API listens on the next port up.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timezone
+
+SNOWFLAKE_BASE = 100_000_000_000_000_000
+APPLICATION_ID = "900000000000000001"
+GUILD_ID = "900000000000000002"
+CHANNEL_ID = "900000000000000003"
+
+# Weight of each command in the mix
+MIX = {
+    "ping": 1,
+    "bank balance": 3,
+}
+
+
+def command_payload(interaction_id: int, user_id: int, command: str) -> dict:
+    """Build a guild slash command interaction, with the subcommand as an option when there is one."""
+    name, *subcommand = command.split()
+    return {
+        "id": str(interaction_id),
+        "application_id": APPLICATION_ID,
+        "type": 2,
+        "token": f"token-{interaction_id}",
+        "version": 1,
+        "guild_id": GUILD_ID,
+        "channel_id": CHANNEL_ID,
+        "channel": {"id": CHANNEL_ID, "type": 0, "name": "general", "permissions": "2147483647"},
+        "member": {
+            "user": {"id": str(user_id), "username": f"member{user_id}", "discriminator": "0", "avatar": None, "global_name": None},
+            "roles": [],
+            "joined_at": "2024-01-01T00:00:00+00:00",
+            "permissions": "2147483647",
+            "deaf": False,
+            "mute": False
+        },
+        "data": {
+            "id": str(SNOWFLAKE_BASE - len(name)),
+            "name": name,
+            "type": 1,
+            "options": [{"name": subcommand[0], "type": 1, "options": []}] if subcommand else []
+        },
+        "locale": "en-US",
+        "guild_locale": "en-US",
+        "app_permissions": "2147483647",
+        "entitlements": [],
+        "authorizing_integration_owners": {"0": GUILD_ID},
+        "context": 0,
+        "attachment_size_limit": 10485760
+    }
+
+
+async def start_fake_discord(port: int, callbacks: dict[str, dict]):
+    """Accept interaction callbacks the way Discord's API does and remember each reply."""
+    from aiohttp import web
+
+    async def interaction_callback(request: web.Request) -> web.Response:
+        interaction_id = request.match_info["interaction"]
+        callbacks[interaction_id] = await request.json()
+        # hikari asks for the callback response object (with_response=true)
+        return web.json_response({"interaction": {"id": interaction_id, "type": 2}})
+
+    app = web.Application()
+    app.router.add_post("/api/v10/interactions/{interaction}/{token}/callback", interaction_callback)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+def sign(signing_key, body: bytes) -> dict[str, str]:
+    timestamp = str(int(time.time()))
+    signature = signing_key.sign(timestamp.encode() + body).signature.hex()
+    return {
+        "Content-Type": "application/json",
+        "X-Signature-Ed25519": signature,
+        "X-Signature-Timestamp": timestamp
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    from nacl.signing import SigningKey
+
+    signing_key = SigningKey.generate()
+    os.environ["DB_BACKEND"] = "memory"
+    os.environ["PUBLIC_KEY"] = signing_key.verify_key.encode().hex()
+    os.environ["HTTP_SYNC_COMMANDS"] = "false"
+    os.environ["DISCORD_REST_URL"] = f"http://127.0.0.1:{args.port + 1}/api/v10"
+    os.environ.setdefault("BOT_TOKEN", "load-test")
+    os.environ.setdefault("OWNER_ID", "0")
+
+    import aiohttp
+    import http_main
+    from database import members
+
+    callbacks: dict[str, dict] = {}
+    fake_discord = await start_fake_discord(args.port + 1, callbacks)
+    await http_main.bot.start(host="127.0.0.1", port=args.port, check_for_updates=False)
+
+    now = datetime.now(timezone.utc)
+    user_ids = [SNOWFLAKE_BASE + i for i in range(args.members)]
+    await members.insert_many([{
+        "id": str(user_id), "username": f"member{user_id}", "display_name": f"member{user_id}",
+        "cash": 1000.0, "bank": 0.0, "total_debt": 0, "credit_score": 500, "wins": 0, "losses": 0,
+        "trophies": [], "joined_at": now, "created_at": now
+    } for user_id in user_ids])
+
+    url = f"http://127.0.0.1:{args.port}/"
+    rng = random.Random(args.seed)
+    names, weights = zip(*MIX.items())
+    plan = [(rng.choices(names, weights)[0], rng.choice(user_ids)) for _ in range(args.requests)]
+
+    latencies: dict[str, list[float]] = {name: [] for name in names}
+    failures = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with aiohttp.ClientSession() as session:
+        body = json.dumps(command_payload(SNOWFLAKE_BASE * 2, user_ids[0], "ping")).encode()
+        headers = sign(signing_key, body + b" ")
+        async with session.post(url, data=body, headers=headers) as response:
+            print(f"bad signature -> HTTP {response.status}")
+
+        async def send(index: int, command: str, user_id: int) -> None:
+            nonlocal failures
+            interaction_id = str(SNOWFLAKE_BASE * 2 + index + 1)
+            body = json.dumps(command_payload(int(interaction_id), user_id, command)).encode()
+            async with semaphore:
+                start = time.perf_counter()
+                async with session.post(url, data=body, headers=sign(signing_key, body)) as response:
+                    await response.read()
+                elapsed = (time.perf_counter() - start) * 1000
+
+            # Type 4 is CHANNEL_MESSAGE_WITH_SOURCE, the command's reply
+            reply = callbacks.pop(interaction_id, {})
+            if response.status not in (200, 204) or reply.get("type") != 4:
+                failures += 1
+                if failures <= 3:
+                    print(f"  {command} failed: HTTP {response.status}, reply {reply}")
+                return
+            latencies[command].append(elapsed)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(send(i, command, user_id) for i, (command, user_id) in enumerate(plan)))
+        elapsed = time.perf_counter() - start
+
+    print(f"{args.requests} interactions, concurrency {args.concurrency}: {args.requests / elapsed:,.0f} req/s, {failures} failed")
+    for name in names:
+        samples = sorted(latencies[name])
+        if samples:
+            p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+            print(f"  {name:<13} n={len(samples):>6}  mean {statistics.fmean(samples):>8.3f} ms  p99 {p99:>8.3f} ms")
+
+    await http_main.bot.close()
+    await fake_discord.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--members", type=int, default=1000)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Compare query latency on the hot-path member, bot message and gambling history lookups
+with and without the indexes declared in indexes.py.
+
+Needs a reachable MongoDB (DB_URI). All data goes into a scratch database that is dropped afterwards.
+
+Usage:
+    python -m benchmarks.index_latency [--members 100000] [--queries 500]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timezone
+
+from dotenv import main as dotenv_main
+from pymongo import AsyncMongoClient, InsertOne
+
+SCRATCH_DB = "idiot_index_benchmark"
+
+
+async def seed(db, member_count: int) -> None:
+    members = db["members"]
+    bot_messages = db["bot_messages"]
+    gambling_history = db["gambling_history"]
+
+    batch = []
+    for i in range(member_count):
+        batch.append(InsertOne({
+            "id": str(100_000_000_000_000_000 + i),
+            "username": f"user{i}",
+            "cash": 1000,
+            "bank": 0,
+            "credit_score": 500,
+        }))
+        if len(batch) == 10_000:
+            await members.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        await members.bulk_write(batch, ordered=False)
+
+    await bot_messages.insert_many([
+        {"message_id": str(i), "guild_id": str(i % 50), "creator_id": str(i)} for i in range(member_count // 10)
+    ])
+    await gambling_history.insert_many([
+        {"player_id": str(100_000_000_000_000_000 + (i % member_count)), "bet_amount": 10, "payout_amount": 0,
+         "timestamp": datetime.now(timezone.utc)} for i in range(member_count)
+    ])
+
+
+async def measure(db, member_count: int, queries: int) -> dict[str, list[float]]:
+    timings = {"members.find_one(id)": [], "bot_messages.find_one(message_id, guild_id)": [], "gambling_history.find(player_id)": []}
+
+    for _ in range(queries):
+        i = random.randrange(member_count)
+
+        start = time.perf_counter()
+        await db["members"].find_one({"id": str(100_000_000_000_000_000 + i)})
+        timings["members.find_one(id)"].append(time.perf_counter() - start)
+
+        j = random.randrange(member_count // 10)
+        start = time.perf_counter()
+        await db["bot_messages"].find_one({"message_id": str(j), "guild_id": str(j % 50)})
+        timings["bot_messages.find_one(message_id, guild_id)"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await db["gambling_history"].find({"player_id": str(100_000_000_000_000_000 + i)}).to_list(length=None)
+        timings["gambling_history.find(player_id)"].append(time.perf_counter() - start)
+
+    return timings
+
+
+def report(label: str, timings: dict[str, list[float]]) -> None:
+    print(f"\n{label}")
+    for name, samples in timings.items():
+        samples.sort()
+        p50 = statistics.median(samples) * 1000
+        p95 = samples[int(len(samples) * 0.95) - 1] * 1000
+        print(f"  {name:<46} p50={p50:8.3f} ms  p95={p95:8.3f} ms")
+
+
+async def run(member_count: int, queries: int) -> None:
+    dotenv_main.load_dotenv()
+    client = AsyncMongoClient(os.environ["DB_URI"])
+    db = client[SCRATCH_DB]
+
+    try:
+        await client.drop_database(SCRATCH_DB)
+        print(f"Seeding {member_count} members...")
+        await seed(db, member_count)
+
+        report("Without indexes", await measure(db, member_count, queries))
+
+        await db["members"].create_index("id", unique=True)
+        await db["bot_messages"].create_index([("message_id", 1), ("guild_id", 1)], unique=True)
+        await db["gambling_history"].create_index([("player_id", 1), ("timestamp", -1)])
+
+        report("With indexes", await measure(db, member_count, queries))
+    finally:
+        await client.drop_database(SCRATCH_DB)
+        await client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.members, args.queries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Measure the memory and lookup cost of the known-member set used by on_message_create.
+
+KnownMembers is compared with a plain set of int IDs and a set of str IDs (how member IDs are stored).
+Memory is what tracemalloc attributes to building each structure. The lookup time is per message,
+for authors that are registered (hit) and authors that are not (miss). The merge is what adding
+KNOWN_MEMBERS_MERGE_THRESHOLD new members costs: how long the adds hold the event loop, how long the
+merge takes in its worker thread, and the longest the event loop went without running meanwhile.
+A set[int] has no merge.
+Runs offline against the memory storage backend.
+
+Usage:
+    python -m benchmarks.known_members [--ids 1000000] [--lookups 200000]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import time
+import tracemalloc
+
+os.environ.setdefault("DB_BACKEND", "memory")
+os.environ.setdefault("OWNER_ID", "0")
+
+from extensions.members.member_util import KnownMembers, merge_sorted_runs
+
+SNOWFLAKE_BASE = 100_000_000_000_000_000
+
+
+def build_known_members(ids: list[int]) -> KnownMembers:
+    known = KnownMembers()
+    known._sorted = merge_sorted_runs(sorted(ids))
+    return known
+
+
+def measure_memory(build, ids: list[int]) -> tuple[object, int]:
+    tracemalloc.start()
+    structure = build(ids)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return structure, current
+
+
+def measure_lookups(structure, probes: list) -> float:
+    start = time.perf_counter()
+    for probe in probes:
+        probe in structure
+    return (time.perf_counter() - start) / len(probes) * 1_000_000_000
+
+
+async def measure_merge(known: KnownMembers, new_ids: list[int]) -> tuple[float, float, float]:
+    """
+    Add enough new IDs to start a merge.
+
+    Returns the time the adds held the loop, the merge time, and the longest loop stall while merging, in ms.
+    """
+    stalls = []
+    merging_since = float("inf")
+    done = asyncio.Event()
+
+    async def probe() -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            if start >= merging_since:
+                stalls.append(time.perf_counter() - start - 0.001)
+
+    # The bot's warm-up has long since started the default executor's threads when a merge runs
+    await asyncio.to_thread(int)
+    probe_task = asyncio.create_task(probe())
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    for user_id in new_ids:
+        known.add(user_id)
+    merging_since = time.perf_counter()
+    await known._merge_task
+    done.set()
+    await probe_task
+    return (merging_since - start) * 1000, (time.perf_counter() - merging_since) * 1000, max(stalls, default=0) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ids", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    ids = rng.sample(range(SNOWFLAKE_BASE, SNOWFLAKE_BASE + args.ids * 50), args.ids)
+    hits = [rng.choice(ids) for _ in range(args.lookups)]
+    misses = [SNOWFLAKE_BASE - 1 - i for i in range(args.lookups)]
+
+    cases = {
+        "set[str]": (lambda values: {str(value) for value in values}, str),
+        "set[int]": (lambda values: set(values), int),
+        "KnownMembers": (build_known_members, int),
+    }
+
+    print(f"{args.ids:,} member IDs, {args.lookups:,} lookups")
+    for label, (build, convert) in cases.items():
+        structure, size = measure_memory(build, ids)
+        hit_ns = measure_lookups(structure, [convert(value) for value in hits])
+        miss_ns = measure_lookups(structure, [convert(value) for value in misses])
+        print(f"  {label:<13} {size / 1024 / 1024:>8.1f} MiB  hit {hit_ns:>7.0f} ns  miss {miss_ns:>7.0f} ns")
+        del structure
+
+    known = build_known_members(ids)
+    # Garbage collection passes over this script's lists of a million IDs would otherwise show up as loop stalls
+    gc.collect()
+    gc.freeze()
+    new_ids = [SNOWFLAKE_BASE - 1 - i for i in range(known.merge_threshold)]
+    add_ms, merge_ms, stall_ms = asyncio.run(measure_merge(known, new_ids))
+    print(
+        f"  {len(new_ids):,} new IDs: adds {add_ms:.1f} ms on the loop, merge {merge_ms:.0f} ms in a worker thread, "
+        f"longest loop stall while merging {stall_ms:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
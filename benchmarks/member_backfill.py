@@ -0,0 +1,126 @@
+"""
+Measure a member backfill of a large guild, and how much it delays other events while it runs.
+
+A fake gateway answers the backfill's member request with chunks of 1000 members, the way Discord does,
+while a probe task stands in for other event handlers and records how late it wakes up. Then a second run
+over the same guild shows the restart path, where the watermark skips members that were already written.
+Runs offline against the memory storage backend, with a simulated round trip per call. The memory backend
+applies every write on the event loop, yielding every few requests of a bulk write, so its lag includes
+work that the mongo driver hands to the server. Its documents also live in this process, so the
+garbage collector's full passes over them show up in the maximum lag.
+
+Usage:
+    python -m benchmarks.member_backfill [--members 100000] [--latency-ms 1] [--chunk-interval-ms 5]
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timezone, timedelta
+from types import SimpleNamespace
+
+SNOWFLAKE_BASE = 100_000_000_000_000_000
+CHUNK_SIZE = 1000
+GUILD_ID = 4242
+
+
+def fake_member(user_id: int, joined_at: datetime) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=user_id,
+        username=f"member{user_id}",
+        display_name=f"Member {user_id}",
+        is_bot=False,
+        joined_at=joined_at,
+        created_at=joined_at
+    )
+
+
+class FakeGateway:
+    """Answers request_guild_members by dispatching member chunks to the backfill."""
+
+    def __init__(self, backfill, guild: list[SimpleNamespace], chunk_interval: float) -> None:
+        self.backfill = backfill
+        self.guild = guild
+        self.chunk_interval = chunk_interval
+
+    async def request_guild_members(self, guild_id: int, *, nonce: str) -> None:
+        asyncio.create_task(self._send_chunks(guild_id, nonce))
+
+    async def _send_chunks(self, guild_id: int, nonce: str) -> None:
+        chunk_count = -(-len(self.guild) // CHUNK_SIZE)
+        for index in range(chunk_count):
+            chunk = self.guild[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE]
+            self.backfill.on_chunk(SimpleNamespace(
+                guild_id=guild_id,
+                nonce=nonce,
+                chunk_index=index,
+                chunk_count=chunk_count,
+                members={member.id: member for member in chunk}
+            ))
+            await asyncio.sleep(self.chunk_interval)
+
+
+async def probe_lag(samples: list[float], stop: asyncio.Event, interval: float = 0.005) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def backfill_guild(backfill, gateway: FakeGateway, label: str) -> None:
+    lag: list[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_lag(lag, stop))
+
+    start = time.perf_counter()
+    await backfill.start(gateway, GUILD_ID)
+    await asyncio.gather(*backfill._tasks)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe
+    lag.sort()
+    p99 = lag[min(len(lag) - 1, int(len(lag) * 0.99))] if lag else 0.0
+    print(f"  {label:<9} {elapsed * 1000:>9.1f} ms  loop lag p99 {p99:>6.2f} ms  max {lag[-1] if lag else 0.0:>6.2f} ms")
+
+
+async def run(args: argparse.Namespace) -> None:
+    os.environ["DB_BACKEND"] = "memory"
+    os.environ["DB_MEMORY_LATENCY_MS"] = str(args.latency_ms)
+
+    from database import members, guilds
+    from indexes import ensure_indexes
+    from extensions.members.backfill import MemberBackfill
+    from extensions.members.member_util import known_members
+
+    await ensure_indexes()
+
+    joined_at = datetime.now(timezone.utc) - timedelta(days=30)
+    guild = [fake_member(SNOWFLAKE_BASE + i, joined_at) for i in range(args.members)]
+    # min_interval=0 so the second run is not skipped as recently completed
+    backfill = MemberBackfill(min_interval=0)
+    gateway = FakeGateway(backfill, guild, args.chunk_interval_ms / 1000)
+
+    print(f"{args.members:,} members in chunks of {CHUNK_SIZE}, {args.latency_ms} ms simulated round trip")
+    await backfill_guild(backfill, gateway, "first")
+    print(f"  registered {await members.count_documents({}):,}")
+
+    # Forget the in-memory set, as a restarted process would, so only the watermark avoids the writes
+    known_members._recent.clear()
+    del known_members._sorted[:]
+    await backfill_guild(backfill, gateway, "restart")
+
+    state = (await guilds.find_one({"guild_id": str(GUILD_ID)}))["member_backfill"]
+    print(f"  watermark {state['watermark'].isoformat()}, created on restart {state['members_created']:,}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--latency-ms", type=float, default=1.0)
+    parser.add_argument("--chunk-interval-ms", type=float, default=5.0, help="Delay between chunks sent by the fake gateway")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compare bytes on the wire and BSON decode time for whole member documents against the
+projected accessors in economy_util, for members with large emote and debt arrays.
+The arrays model members that have not been through migrations.emote_counters and migrations.loans yet.
+
+Runs offline: documents are encoded and decoded with the bson package that ships with pymongo,
+which is the same work the driver does for a find_one reply.
+
+Usage:
+    python -m benchmarks.member_projection [--entries 500] [--iterations 2000]
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timezone
+
+import bson
+
+# Importing economy_util opens no connection, but database.py and hooks.py still read these at import
+os.environ["DB_BACKEND"] = "memory"
+os.environ.setdefault("OWNER_ID", "0")
+
+from extensions.economy.economy_util import CASH_FIELDS, BALANCE_FIELDS
+
+
+def build_member(entries: int) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "id": "123456789012345678",
+        "username": "benchmark_user",
+        "display_name": "Benchmark User",
+        "cash": 1000.0,
+        "bank": 2500.0,
+        "debts": [
+            {
+                "loan_id": f"{i:08x}",
+                "principal": 500.0,
+                "remaining_balance": 250.0,
+                "apr": 15.0,
+                "weekly_payment": 45.5,
+                "num_weeks": 12,
+                "weeks_remaining": 6,
+                "total_interest": 46.0,
+                "created_at": now,
+                "last_accrual": now,
+                "status": "paid_off" if i % 4 else "active"
+            } for i in range(entries)
+        ],
+        "total_debt": 1250.0,
+        "credit_score": 640,
+        "wins": 12,
+        "losses": 30,
+        "trophies": [],
+        "emote_count": [{"guild_id": str(i % 20), "emoji_id": 1_000_000 + i, "count": i} for i in range(entries)],
+        "emote_rank": [{"guild_id": str(i % 20), "emoji_id": 1_000_000 + i, "rank_title": "Expert", "rank_threshold": 100} for i in range(entries)],
+        "joined_at": now,
+        "created_at": now
+    }
+
+
+def project(document: dict, fields: tuple[str, ...]) -> dict:
+    return {"id": document["id"], **{name: document[name] for name in fields if name in document}}
+
+
+def measure(document: dict, iterations: int) -> tuple[int, float]:
+    encoded = bson.encode(document)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        bson.decode(encoded)
+    return len(encoded), (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=500, help="Entries in each of the debts/emote arrays")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    member = build_member(args.entries)
+    cases = {
+        "whole document": member,
+        "cash only": project(member, CASH_FIELDS),
+        "balances": project(member, BALANCE_FIELDS),
+    }
+
+    print(f"Member with {args.entries} debt and emote entries")
+    for label, document in cases.items():
+        size, decode_us = measure(document, args.iterations)
+        print(f"  {label:<16} {size:>9,} bytes  decode {decode_us:>9.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Measure how fast a burst of new members is registered, as in a raid or mass-join event.
+
+"find+insert" is the old handler (find_one, then insert_one, per member), "upsert" is one
+`$setOnInsert` upsert per member, and "provisioner" is MemberProvisioner coalescing the burst into bulk writes.
+Every join is dispatched as its own task, the same way hikari runs listeners.
+Runs offline against the memory storage backend, with a simulated round trip per call. At most
+`--pool-size` round trips are in flight at once, like the connections of the mongo driver's pool.
+
+Usage:
+    python -m benchmarks.member_provisioning [--members 10000] [--latency-ms 1] [--pool-size DB_MAX_POOL_SIZE]
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+SNOWFLAKE_BASE = 100_000_000_000_000_000
+
+
+def fake_member(user_id: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=user_id,
+        username=f"member{user_id}",
+        display_name=f"Member {user_id}",
+        created_at=datetime.now(timezone.utc)
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    os.environ["DB_BACKEND"] = "memory"
+    os.environ["DB_MEMORY_LATENCY_MS"] = str(args.latency_ms)
+
+    from database import DB_MAX_POOL_SIZE, members
+    from indexes import ensure_indexes
+    from extensions.members.provisioning import MemberProvisioner, new_member_document
+    from storage.memory import MemoryCollection
+
+    pool_size = args.pool_size or DB_MAX_POOL_SIZE
+    pool = asyncio.Semaphore(pool_size)
+    round_trip = MemoryCollection._round_trip
+
+    async def pooled_round_trip(self) -> None:
+        async with pool:
+            await round_trip(self)
+    MemoryCollection._round_trip = pooled_round_trip
+
+    await ensure_indexes()
+
+    async def find_then_insert(member: SimpleNamespace) -> None:
+        if await members.find_one({"id": str(member.id)}, {"_id": 1}):
+            return
+        await members.insert_one({"id": str(member.id), **new_member_document(member)})
+
+    async def single_upsert(member: SimpleNamespace) -> None:
+        await members.update_one({"id": str(member.id)}, {"$setOnInsert": new_member_document(member)}, upsert=True)
+
+    provisioner = MemberProvisioner()
+
+    cases = {
+        "find+insert": find_then_insert,
+        "upsert": single_upsert,
+        "provisioner": provisioner.ensure,
+    }
+
+    print(f"{args.members:,} joins, {args.latency_ms} ms simulated round trip, {pool_size} pooled connections")
+    for offset, (label, handler) in enumerate(cases.items()):
+        # Every case registers its own fresh IDs, so none of them find members created by another case
+        base = SNOWFLAKE_BASE + offset * args.members * 10
+        burst = [fake_member(base + i) for i in range(args.members)]
+
+        start = time.perf_counter()
+        await asyncio.gather(*(asyncio.create_task(handler(member)) for member in burst))
+        elapsed = time.perf_counter() - start
+
+        registered = await members.count_documents({"id": {"$gte": str(base), "$lt": str(base + args.members)}})
+        print(f"  {label:<12} {args.members / elapsed:>10,.0f} joins/s  {elapsed * 1000:>9.1f} ms  registered {registered:,}")
+
+    print(f"  provisioner  {provisioner.stats()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=10_000)
+    parser.add_argument("--latency-ms", type=float, default=1.0)
+    parser.add_argument("--pool-size", type=int, help="Round trips in flight at once (default: DB_MAX_POOL_SIZE)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
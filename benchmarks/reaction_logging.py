@@ -0,0 +1,182 @@
+"""
+Measure reaction handling in the emote leaderboard with logging on, writing to a slow stdout.
+
+Each run is a fresh interpreter that sends reactions with the tracked emoji through `emote_counter`, with
+a stand-in for Discord and the memory storage backend. The stand-in answers REST calls after a simulated
+round trip and serves reacted messages from its cache. The log sink sleeps on every write, the way stdout
+does when the pipe to a log collector is full. Two handler setups are compared at INFO and at DEBUG:
+
+    direct  a StreamHandler called on the event loop, which is what print() did
+    queue   logs.setup_logging(), which hands records to a writer thread
+
+A probe task records how late the event loop wakes it, which is the delay every other handler sees.
+
+Usage:
+    python -m benchmarks.reaction_logging [--reactions 5000] [--concurrency 50] [--write-ms 0.2]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+SNOWFLAKE_BASE = 100_000_000_000_000_000
+GUILD_ID = 4242
+CHANNEL_ID = 4343
+TRACKED_EMOJI = "👍"
+
+
+class SlowSink:
+    """A stream that blocks for a fixed time on every write and discards the text."""
+
+    def __init__(self, write_ms: float) -> None:
+        self.delay = write_ms / 1000
+        self.writes = 0
+
+    def write(self, text: str) -> int:
+        time.sleep(self.delay)
+        self.writes += 1
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+
+class FakeDiscord:
+    """Answers the REST calls and cache lookups emote_counter makes."""
+
+    def __init__(self, latency: float, authors: list[int]) -> None:
+        self.latency = latency
+        self.authors = authors
+        self.rest = SimpleNamespace(add_reaction=self._call, create_message=self._call)
+        self.cache = SimpleNamespace(get_message=self.get_message, get_emoji=lambda _: None, get_user=lambda _: None)
+
+    async def _call(self, *args, **kwargs) -> None:
+        await asyncio.sleep(self.latency)
+
+    def get_message(self, message_id: int) -> SimpleNamespace:
+        author_id = self.authors[message_id % len(self.authors)]
+        return SimpleNamespace(
+            id=message_id,
+            author=SimpleNamespace(
+                id=author_id, is_bot=False, username=f"member{author_id}", mention=f"<@{author_id}>",
+                display_avatar_url="https://cdn.discordapp.com/embed/avatars/0.png"
+            )
+        )
+
+
+async def probe_lag(samples: list[float], stop: asyncio.Event, interval: float = 0.005) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - start - interval) * 1000)
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else 0.0
+
+
+async def measure(args: argparse.Namespace) -> dict:
+    os.environ["DB_BACKEND"] = "memory"
+    os.environ["DB_MEMORY_LATENCY_MS"] = str(args.latency_ms)
+    os.environ.setdefault("OWNER_ID", "0")
+    os.environ["LOG_LEVEL"] = args.level
+
+    sink = SlowSink(args.write_ms)
+    if args.mode == "queue":
+        import logs
+        stdout, sys.stdout = sys.stdout, sink
+        logs.setup_logging()
+        sys.stdout = stdout
+    else:
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        logging.basicConfig(level=args.level, handlers=[handler])
+
+    from database import guilds
+    from indexes import ensure_indexes
+    from extensions.emote_leaderboard.leaderboard import emote_counter
+
+    await ensure_indexes()
+    await guilds.insert_one({"guild_id": str(GUILD_ID), "tracked_emoji": TRACKED_EMOJI})
+    app = FakeDiscord(args.latency_ms / 1000, [SNOWFLAKE_BASE + i for i in range(args.members)])
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+
+    async def react(index: int) -> None:
+        event = SimpleNamespace(
+            app=app,
+            guild_id=GUILD_ID,
+            channel_id=CHANNEL_ID,
+            message_id=SNOWFLAKE_BASE * 2 + index,
+            emoji_id=None,
+            emoji_name=TRACKED_EMOJI,
+            member=SimpleNamespace(id=SNOWFLAKE_BASE - 1, is_bot=False)
+        )
+        async with semaphore:
+            start = time.perf_counter()
+            await emote_counter(event)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    lag: list[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_lag(lag, stop))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(react(i) for i in range(args.reactions)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe
+    if args.mode == "queue":
+        # Count the lines still queued for the writer thread too
+        logs.stop_logging()
+    latencies.sort()
+    lag.sort()
+    return {
+        "reactions_per_second": args.reactions / elapsed,
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "lag_p99": percentile(lag, 0.99),
+        "lag_max": lag[-1] if lag else 0.0,
+        "lines": sink.writes
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reactions", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--members", type=int, default=500, help="Distinct message authors credited")
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="Simulated database and REST round trip")
+    parser.add_argument("--write-ms", type=float, default=0.2, help="Time each write to the log sink blocks")
+    parser.add_argument("--mode", help=argparse.SUPPRESS)  # Set for the child run of a single setup
+    parser.add_argument("--level", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(asyncio.run(measure(args))))
+        return
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    print(f"{args.reactions:,} reactions, concurrency {args.concurrency}, {args.latency_ms} ms round trips, {args.write_ms} ms per log write")
+    for level in ("INFO", "DEBUG"):
+        for mode in ("direct", "queue"):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.reaction_logging", *sys.argv[1:], "--mode", mode, "--level", level],
+                cwd=root, capture_output=True, text=True, check=True
+            ).stdout.strip().splitlines()
+            result = json.loads(output[-1])
+            print(
+                f"  {level:<5} {mode:<6} {result['reactions_per_second']:>8,.0f} reactions/s  "
+                f"handler p50 {result['p50']:>6.2f} ms  p99 {result['p99']:>7.2f} ms  "
+                f"loop lag p99 {result['lag_p99']:>6.2f} ms  max {result['lag_max']:>6.2f} ms  ({result['lines']:,} lines)"
+            )
+
+
+if __name__ == "__main__":
+    main()
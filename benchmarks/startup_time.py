@@ -0,0 +1,108 @@
+"""
+Measure start-up: importing the database layer, compared with the old import-time ping, and the cold
+start up to the point where the bot would connect to Discord.
+
+Each measurement runs in a fresh interpreter so module caches do not skew the numbers.
+Point DB_URI at a slow or unreachable server to see the database difference most clearly, e.g.
+DB_URI="mongodb://10.255.255.1:27017/?serverSelectionTimeoutMS=5000".
+
+The cold start imports the entry point's dependencies and loads every extension through StartupProfile,
+against the memory storage backend, then prints the median import and registration time of each module.
+The gateway handshake is not included, since it depends on Discord. The exit status is non-zero when the
+median cold start is over --budget, so this can guard start-up time in CI.
+
+Usage:
+    python -m benchmarks.startup_time [--runs 5] [--budget 3]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# The database module as it is today: client construction only, no network I/O
+LAZY_IMPORT = """
+import time
+start = time.perf_counter()
+import database
+print(time.perf_counter() - start)
+"""
+
+# What importing the database module used to do: a blocking ping before anything else could run
+EAGER_IMPORT = """
+import os, time
+start = time.perf_counter()
+from dotenv import main
+from pymongo import MongoClient
+main.load_dotenv()
+try:
+    MongoClient(os.environ["DB_URI"]).admin.command("ping")
+except Exception:
+    pass
+print(time.perf_counter() - start)
+"""
+
+# Everything main.py does before connecting: imports, then loading every extension
+EXTENSION_LOAD = """
+import asyncio, json
+import hikari
+import lightbulb
+
+import extensions
+from startup import startup_profile
+
+async def main():
+    client = lightbulb.client_from_app(hikari.RESTBot("startup-benchmark", "Bot", banner=None))
+    await startup_profile.load_extensions(client, extensions)
+    print(json.dumps({
+        "modules": {t.name: [t.import_seconds, t.register_seconds] for t in startup_profile.extensions},
+        "ready": startup_profile.elapsed()
+    }))
+
+asyncio.run(main())
+"""
+
+
+def run_snippet(snippet: str, env: dict[str, str] | None = None) -> str:
+    result = subprocess.run(
+        [sys.executable, "-c", snippet],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env
+    )
+    return result.stdout.strip().splitlines()[-1]
+
+
+def time_snippet(snippet: str) -> float:
+    return float(run_snippet(snippet))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=3.0, help="Seconds the median cold start may take")
+    args = parser.parse_args()
+
+    for label, snippet in (("import-time ping (before)", EAGER_IMPORT), ("lazy connection (after)", LAZY_IMPORT)):
+        samples = [time_snippet(snippet) for _ in range(args.runs)]
+        print(f"{label:<28} median={statistics.median(samples) * 1000:9.1f} ms  max={max(samples) * 1000:9.1f} ms")
+
+    env = {**os.environ, "DB_BACKEND": "memory"}
+    env.setdefault("OWNER_ID", "0")
+    results = [json.loads(run_snippet(EXTENSION_LOAD, env)) for _ in range(args.runs)]
+    samples = [result["ready"] for result in results]
+    median = statistics.median(samples)
+    print(f"{'cold start to connect':<28} median={median * 1000:9.1f} ms  max={max(samples) * 1000:9.1f} ms  budget={args.budget * 1000:9.1f} ms")
+    for name in results[0]["modules"]:
+        import_ms = statistics.median(result["modules"][name][0] for result in results) * 1000
+        register_ms = statistics.median(result["modules"][name][1] for result in results) * 1000
+        print(f"  {name:<45} import {import_ms:>7.1f} ms  register {register_ms:>6.1f} ms")
+
+    sys.exit(0 if median <= args.budget else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+#region Imports
+import os
+
+import hikari
+from hikari.api.config import CacheComponents
+#endregion
+
+#region Configuration
+CACHE_PROFILE = os.getenv("CACHE_PROFILE", "lean").lower()  # "lean", "full" (hikari's defaults) or "none"
+CACHE_MAX_MESSAGES = int(os.getenv("CACHE_MAX_MESSAGES", "1000"))  # Most recent messages kept for the reaction path
+#endregion
+
+#region Cache Profiles
+
+# Only what the extensions read: the bot's own user, guild emojis and recent messages for the
+# emote leaderboard's reaction listener. Everything else the extensions need arrives in event and
+# interaction payloads, so members, presences, roles and channels are not kept.
+LEAN_COMPONENTS = CacheComponents.ME | CacheComponents.EMOJIS | CacheComponents.MESSAGES
+
+PROFILES: dict[str, CacheComponents] = {
+    "lean": LEAN_COMPONENTS,
+    "full": CacheComponents.ALL,
+    "none": CacheComponents.NONE
+}
+
+def cache_settings(profile: str = CACHE_PROFILE, max_messages: int = CACHE_MAX_MESSAGES) -> hikari.impl.CacheSettings:
+    """
+    Build hikari's cache settings for a profile.
+
+    Args:
+        profile (str): One of the PROFILES names.
+        max_messages (int): How many of the most recent messages the message cache keeps.
+
+    Returns:
+        hikari.impl.CacheSettings: The settings to pass to the GatewayBot.
+    """
+    if profile not in PROFILES:
+        raise RuntimeError(f"Unknown CACHE_PROFILE {profile!r}, expected one of {', '.join(PROFILES)}.")
+
+    if profile == "full":
+        return hikari.impl.CacheSettings()
+    # No component reads DM channel IDs, so keep that mapping as small as hikari allows
+    return hikari.impl.CacheSettings(components=PROFILES[profile], max_messages=max_messages, max_dm_channel_ids=1)
+
+#endregion
@@ -1,33 +1,109 @@
+import asyncio
+import logging
 import os
+import time
 from dotenv import main
 
-from pymongo import MongoClient
+from metrics import query_metrics, register_gauge, track_db
+from storage import BACKENDS, create_backend
+from storage.timed import TimedBackend
+
+logger = logging.getLogger(__name__)
 
 main.load_dotenv()
 
+# "mongo" for production, "sqlite" for small single-node deployments, "memory" to run benchmarks and offline checks without a server
+DB_BACKEND = os.getenv("DB_BACKEND", "mongo").lower()
+
+if DB_BACKEND not in BACKENDS:
+    raise ValueError(f"DB_BACKEND must be one of {BACKENDS}, got {DB_BACKEND!r}.")
+
 DB_URI = os.getenv("DB_URI")
 
-if not DB_URI:
+if DB_BACKEND == "mongo" and not DB_URI:
     raise ValueError("DB_URI environment variable is not set.")
 
-mongoClient = MongoClient(DB_URI)
+# Connection pool and timeout settings, all overridable from the environment
+DB_MAX_POOL_SIZE = int(os.getenv("DB_MAX_POOL_SIZE", "50"))
+DB_MIN_POOL_SIZE = int(os.getenv("DB_MIN_POOL_SIZE", "0"))
+DB_CONNECT_TIMEOUT_MS = int(os.getenv("DB_CONNECT_TIMEOUT_MS", "5000"))
+DB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("DB_SERVER_SELECTION_TIMEOUT_MS", "10000"))
+DB_SOCKET_TIMEOUT_MS = int(os.getenv("DB_SOCKET_TIMEOUT_MS", "0")) or None  # 0 = no socket timeout
+DB_MEMORY_LATENCY_MS = float(os.getenv("DB_MEMORY_LATENCY_MS", "0"))  # Simulated round trip for the memory backend
+DB_SQLITE_PATH = os.getenv("DB_SQLITE_PATH", "idiot.sqlite3")
+DB_SQLITE_BATCH_SIZE = int(os.getenv("DB_SQLITE_BATCH_SIZE", "256"))  # Most writes the SQLite writer commits in one transaction
+
+# All collections below are async; every call must be awaited so a slow round trip never blocks the event loop.
+# Building the backend does no network I/O, the pool is only opened by connect() or the first operation.
+if DB_BACKEND == "mongo":
+    from slow_queries import SLOW_QUERY_MS, SLOW_QUERY_REPORT, SlowQueryLog
+    from storage.mongo import CommandMonitor
+    # Queries over SLOW_QUERY_MS are explained once per shape, with index advice written to SLOW_QUERY_REPORT
+    slow_query_log = SlowQueryLog(SLOW_QUERY_MS / 1000, SLOW_QUERY_REPORT, lambda name, command: backend.client[name].command(command))
+    backend = create_backend(
+        "mongo",
+        uri=DB_URI,
+        maxPoolSize=DB_MAX_POOL_SIZE,
+        minPoolSize=DB_MIN_POOL_SIZE,
+        connectTimeoutMS=DB_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=DB_SERVER_SELECTION_TIMEOUT_MS,
+        socketTimeoutMS=DB_SOCKET_TIMEOUT_MS,
+        # Latency and document counts per collection, operation and origin, see metrics.QueryMetrics
+        event_listeners=[CommandMonitor(
+            query_metrics.record,
+            on_slow=slow_query_log.record if SLOW_QUERY_MS > 0 else None,
+            slow_threshold=slow_query_log.threshold
+        )]
+    )
+elif DB_BACKEND == "sqlite":
+    backend = create_backend("sqlite", path=DB_SQLITE_PATH, batch_size=DB_SQLITE_BATCH_SIZE)
+else:
+    backend = create_backend("memory", latency=DB_MEMORY_LATENCY_MS / 1000)
+
+# Every call's time is added to the slash command that made it, see metrics.py
+backend = TimedBackend(backend, track_db)
+
+# The mongo connection pool and the SQLite writer keep counters; show them on the metrics endpoint
+if hasattr(backend, "stats"):
+    register_gauge("bot_database", f"Counters of the {DB_BACKEND} storage backend.", backend.stats, label="stat")
+
+members = backend.collection("memberData", "members")
+transactions = backend.collection("memberData", "transactions")
+emote_counters = backend.collection("memberData", "emote_counters")
+loans = backend.collection("memberData", "loans")
+
+guilds = backend.collection("guildData", "guilds")
+
+bot_messages = backend.collection("botContent", "bot_messages")
+
+gambling_history = backend.collection("gamblingData", "gambling_history")
 
-try:
-    mongoClient.admin.command("ping")  # Check if the connection is successful
-    print("MongoDB connection successful.")
-except Exception as e:
-    print(f"Failed to connect to MongoDB: {e}")
-    raise
+async def ping() -> float:
+    """
+    Run a health check against the database.
 
-dbMembers = mongoClient["memberData"]
-members = dbMembers["members"]
-transactions = dbMembers["transactions"]
+    Returns:
+        float: The round trip time of the ping in milliseconds.
+    """
+    start = time.perf_counter()
+    await backend.ping()
+    return (time.perf_counter() - start) * 1000
 
-dbGuilds = mongoClient["guildData"]
-guilds = dbGuilds["guilds"]
+async def connect(timeout: float = DB_SERVER_SELECTION_TIMEOUT_MS / 1000) -> None:
+    """
+    Open the connection pool and verify the database is reachable.
+    Meant to be awaited from the bot's StartingEvent so importing this module never touches the network.
 
-dbBotContent = mongoClient["botContent"]
-bot_messages = dbBotContent["bot_messages"]
+    Args:
+        timeout (float): Seconds to wait for the health check before giving up.
+    """
+    try:
+        latency = await asyncio.wait_for(ping(), timeout)
+        logger.info("Database connection successful (%s).", backend.name, extra={"latency_ms": round(latency, 1)})
+    except Exception as e:
+        logger.error("Failed to connect to the database (%s): %s", backend.name, e)
+        raise
 
-dbGambling = mongoClient["gamblingData"]
-gambling_history = dbGambling["gambling_history"]
\ No newline at end of file
+async def close() -> None:
+    """Close every pooled connection."""
+    await backend.close()
@@ -0,0 +1,218 @@
+#region Imports
+import hikari
+import lightbulb
+
+import sharding
+from hooks import fail_if_not_admin_or_owner
+from loop_watchdog import LOOP_LAG_THRESHOLD_MS, CallSiteStats, loop_watchdog
+from metrics import command_metrics, loop_lag, query_metrics
+from profiling import profile_cpu, profile_lock, profile_memory
+#endregion
+
+#region Loader and Command Group Setup
+loader = lightbulb.Loader(should_load_hook=sharding.serves_commands)
+diagnostics = lightbulb.Group("diagnostics", "Bot health and performance")
+#endregion
+
+#region Configuration
+DIAGNOSTICS_TOP_COMMANDS = 15  # Commands listed by /diagnostics commands, slowest p99 first
+DIAGNOSTICS_TOP_QUERIES = 15  # Collection operations listed by /diagnostics queries, most total time first
+DIAGNOSTICS_TOP_CALL_SITES = 8  # Call sites listed by /diagnostics lag, most blocked time first
+DIAGNOSTICS_RECENT_STALLS = 5  # Latest stalls listed by /diagnostics lag
+DIAGNOSTICS_PROFILE_MAX_SECONDS = 60  # Longest /diagnostics profile allowed
+#endregion
+
+#region Commands - Diagnostics
+
+def format_command_report(rows: list[dict]) -> str:
+    """
+    Lay out the command metrics as a fixed-width table.
+
+    Args:
+        rows (list[dict]): The rows of CommandMetrics.report().
+
+    Returns:
+        str: The table, one line per command, in milliseconds.
+    """
+    lines = [f"{'command':<24} {'n':>6} {'err':>4} {'p50':>7} {'p95':>7} {'p99':>7} {'db95':>6} {'rest95':>6} {'db/rest':>9}"]
+    for row in rows:
+        wall = row["wall"]
+        lines.append(
+            f"{row['command'][:24]:<24} {row['invocations']:>6} {row['errors']:>4} "
+            f"{wall['p50']:>7.1f} {wall['p95']:>7.1f} {wall['p99']:>7.1f} "
+            f"{row['db']['p95']:>6.1f} {row['rest']['p95']:>6.1f} {row['db_calls']:>4.1f}/{row['rest_calls']:<4.1f}"
+        )
+    return "\n".join(lines)
+
+@diagnostics.register()
+class CommandLatency(
+    lightbulb.SlashCommand,
+    name="commands",
+    description="Show per-command latency percentiles, database and REST time, and errors.",
+    hooks=[fail_if_not_admin_or_owner]
+):
+    @lightbulb.invoke
+    async def invoke(self, ctx: lightbulb.Context) -> None:
+        """
+        Show the slowest commands since this process started, with where their time went.
+        """
+        rows = command_metrics.report()[:DIAGNOSTICS_TOP_COMMANDS]
+        if not rows:
+            await ctx.respond("No commands have been recorded yet.", ephemeral=True)
+            return
+
+        embed = hikari.Embed(
+            title="Command Latency",
+            description=f"```\n{format_command_report(rows)}\n```",
+            color=0x5865F2
+        )
+        embed.set_footer("Milliseconds since this process started. db95 and rest95 are p95 time in each, db/rest the average calls.")
+        await ctx.respond(embed=embed, ephemeral=True)
+
+def format_query_report(rows: list[dict], by_origin: bool) -> str:
+    """
+    Lay out the database command metrics as a fixed-width table.
+
+    Args:
+        rows (list[dict]): The rows of QueryMetrics.report().
+        by_origin (bool): Whether to show the origin of each row, when the rows come from several.
+
+    Returns:
+        str: The table, one line per collection operation, in milliseconds.
+    """
+    header = f"{'operation':<26} {'n':>6} {'p50':>6} {'p99':>7} {'total':>8} {'docs50':>6} {'docsmax':>7}"
+    lines = [header + ("  origin" if by_origin else "")]
+    for row in rows:
+        latency, documents = row["latency"], row["documents"]
+        line = (
+            f"{(row['collection'] + '.' + row['operation'])[:26]:<26} {latency['count']:>6} "
+            f"{latency['p50']:>6.1f} {latency['p99']:>7.1f} {row['total_ms']:>8.1f} "
+            f"{documents['p50']:>6.0f} {documents['max']:>7.0f}"
+        )
+        if by_origin:
+            line += f"  {row['origin']}"
+        lines.append(line)
+    return "\n".join(lines)
+
+@diagnostics.register()
+class QueryLatency(
+    lightbulb.SlashCommand,
+    name="queries",
+    description="Show MongoDB command latency and document counts per collection and origin.",
+    hooks=[fail_if_not_admin_or_owner]
+):
+    origin = lightbulb.string("origin", "Only the queries of this command or listener, e.g. \"gambling slots\"", default=None)
+
+    @lightbulb.invoke
+    async def invoke(self, ctx: lightbulb.Context) -> None:
+        """
+        Show which collection operations take the most database time, overall or for one command or listener.
+        """
+        rows = query_metrics.report(self.origin)[:DIAGNOSTICS_TOP_QUERIES]
+        if not rows:
+            await ctx.respond("No database commands have been recorded yet." if self.origin is None else f"No database commands recorded for `{self.origin}`.", ephemeral=True)
+            return
+
+        embed = hikari.Embed(
+            title="Database Commands" if self.origin is None else f"Database Commands: {self.origin}",
+            description=f"```\n{format_query_report(rows, by_origin=self.origin is None)[:4000]}\n```",
+            color=0x5865F2
+        )
+        embed.set_footer("Milliseconds since this process started, most total time first. docs are documents returned or matched per command.")
+        await ctx.respond(embed=embed, ephemeral=True)
+
+def format_call_site_report(call_sites: list[CallSiteStats]) -> str:
+    """
+    Lay out the call sites that blocked the event loop.
+
+    Args:
+        call_sites (list[CallSiteStats]): The call sites of LoopWatchdog.top_call_sites().
+
+    Returns:
+        str: Each call site with its stall count, total and max milliseconds, and where it blocked.
+    """
+    lines = []
+    for stats in call_sites:
+        lines.append(f"{stats.stalls:>4}x  total {stats.total * 1000:>7.0f} ms  max {stats.max * 1000:>6.0f} ms")
+        lines.append(f"  in   {stats.handler}")
+        if stats.call_site != stats.handler:
+            lines.append(f"  at   {stats.call_site}")
+        if stats.blocked_in != stats.call_site:
+            lines.append(f"  on   {stats.blocked_in}")
+    return "\n".join(lines)
+
+@diagnostics.register()
+class LoopLag(
+    lightbulb.SlashCommand,
+    name="lag",
+    description="Show event loop lag and the code that blocked the loop.",
+    hooks=[fail_if_not_admin_or_owner]
+):
+    @lightbulb.invoke
+    async def invoke(self, ctx: lightbulb.Context) -> None:
+        """
+        Show the event loop lag over the last minute, the call sites that blocked it the longest and
+        the latest stalls.
+        """
+        lag = loop_lag.stats()
+        embed = hikari.Embed(
+            title="Event Loop Lag",
+            description=(
+                f"Last **{lag['last'] * 1000:.1f} ms**, p99 **{lag['p99'] * 1000:.1f} ms**, max **{lag['max'] * 1000:.1f} ms** over the last minute.\n"
+                f"{loop_watchdog.stalls_total} stalls over {LOOP_LAG_THRESHOLD_MS:.0f} ms, {loop_watchdog.blocked_seconds_total:.1f} s blocked in total."
+            ),
+            color=0x5865F2
+        )
+
+        call_sites = loop_watchdog.top_call_sites(DIAGNOSTICS_TOP_CALL_SITES)
+        if call_sites:
+            embed.add_field(name="Blocking Call Sites", value=f"```\n{format_call_site_report(call_sites)[:1000]}\n```")
+
+        recent = list(loop_watchdog.recent)[-DIAGNOSTICS_RECENT_STALLS:]
+        if recent:
+            embed.add_field(
+                name="Latest Stalls",
+                value="\n".join(
+                    f"<t:{int(stall.started)}:R> **{stall.duration * 1000:.0f} ms** at `{stall.call_site}`"
+                    for stall in reversed(recent)
+                )[:1024]
+            )
+
+        embed.set_footer("Since this process started. Stacks are sampled while the loop is blocked past the threshold.")
+        await ctx.respond(embed=embed, ephemeral=True)
+
+@diagnostics.register()
+class Profile(
+    lightbulb.SlashCommand,
+    name="profile",
+    description="Profile the bot's CPU time or memory allocations for a few seconds.",
+    hooks=[fail_if_not_admin_or_owner]
+):
+    kind = lightbulb.string(
+        "kind", "What to profile",
+        choices=[lightbulb.Choice("CPU (collapsed stacks)", "cpu"), lightbulb.Choice("Memory (top allocations)", "memory")]
+    )
+    seconds = lightbulb.integer("seconds", "How long to profile for", min_value=1, max_value=DIAGNOSTICS_PROFILE_MAX_SECONDS, default=10)
+
+    @lightbulb.invoke
+    async def invoke(self, ctx: lightbulb.Context) -> None:
+        """
+        Profile the running process while it serves its usual traffic, then send the report as an attachment.
+        """
+        if profile_lock.locked():
+            await ctx.respond("A profile is already running. Try again when it finishes.", ephemeral=True)
+            return
+
+        await ctx.defer(ephemeral=True)
+        async with profile_lock:
+            report = await (profile_cpu if self.kind == "cpu" else profile_memory)(self.seconds)
+
+        await ctx.respond(
+            report.summary,
+            attachment=hikari.Bytes(report.text.encode(), report.filename),
+            ephemeral=True
+        )
+
+#endregion
+
+loader.command(diagnostics)
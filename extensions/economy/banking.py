@@ -1,17 +1,22 @@
 #region Imports
 from datetime import datetime, timezone, timedelta
 import asyncio
+import logging
 
 import hikari
 import lightbulb
+from pymongo.errors import PyMongoError
 
-from database import members, transactions
+import sharding
+from database import members, loans, transactions
 import extensions.economy.economy_util as eu
+from extensions.economy.member_cache import member_cache
 from hooks import fail_if_not_admin_or_owner
 #endregion
 
 #region Loader Setup
-loader = lightbulb.Loader()
+loader = lightbulb.Loader(should_load_hook=sharding.serves_commands)
+logger = logging.getLogger(__name__)
 banking = lightbulb.Group("bank", "Banking related commands")
 loan = banking.subgroup("loan", "Loan related commands",)
 #endregion
@@ -51,31 +56,11 @@ def calculate_credit_score_modifier(credit_score: int) -> float:
     else:
         return 2.0  # 100% increase for very poor credit
 
-def adjust_credit_score(user_id: str, delta: int) -> None:
-    """
-    Adjust the user's credit score by a given delta. Clamped between 300 and 850.
-
-    Args:
-        user_id (str): The ID of the user.
-        delta (int): The amount to adjust the credit score by.
-    """
-    user_data = eu.get_user_data(user_id)
-    if not user_data:
-        return
-
-    current_score = user_data.get("credit_score", 500)
-    new_score = max(300, min(850, current_score + delta))
-
-    members.update_one(
-        {"id": user_id},
-        {"$set": {"credit_score": new_score}}
-    )
-
 #endregion
 
 #region Loan Calculations
 
-def calculate_apr_for_user(user_id: str, base_apr: float = LOAN_BASE_APR) -> float:
+async def calculate_apr_for_user(user_id: str, base_apr: float = LOAN_BASE_APR) -> float:
     """
     Calculate the APR for a user based on their credit score.
 
@@ -86,7 +71,7 @@ def calculate_apr_for_user(user_id: str, base_apr: float = LOAN_BASE_APR) -> flo
     Returns:
         float: The adjusted APR based on the user's credit score as a percentage.
     """
-    user_data = eu.get_user_data(user_id)
+    user_data = await eu.get_user_balances(user_id)
     if not user_data:
         return base_apr
 
@@ -130,7 +115,7 @@ def calculate_total_interest(principal: float, weekly_payment: float, num_weeks:
     total_interest = total_paid - principal
     return total_interest
 
-def can_take_loan(user_id: str, amount: float) -> tuple[bool, str]:
+async def can_take_loan(user_id: str, amount: float) -> tuple[bool, str]:
     """
     Check if a user can take a loan based on their current debts and total debt.
 
@@ -142,7 +127,7 @@ def can_take_loan(user_id: str, amount: float) -> tuple[bool, str]:
         tuple[bool, str]: A tuple containing a boolean indicating if the user can take the loan,
                           and a message explaining the reason.
     """
-    user_data = eu.get_user_data(user_id)
+    user_data = await eu.get_user_balances(user_id)
     if not user_data:
         return False, "User not found."
 
@@ -164,7 +149,7 @@ def can_take_loan(user_id: str, amount: float) -> tuple[bool, str]:
 
 #region Loan Management
 
-def create_loan(user_id: str, principal: float, apr: float, num_weeks: int) -> str:
+async def create_loan(user_id: str, principal: float, apr: float, num_weeks: int) -> str:
     """
     Create a loan record for a user.
 
@@ -183,6 +168,7 @@ def create_loan(user_id: str, principal: float, apr: float, num_weeks: int) -> s
 
     loan_record = {
         "loan_id": loan_id,
+        "user_id": user_id,
         "principal": principal,
         "remaining_balance": principal,
         "apr": apr,
@@ -195,19 +181,17 @@ def create_loan(user_id: str, principal: float, apr: float, num_weeks: int) -> s
         "status": "active"  # Status of the loan
     }
 
-    members.update_one(
+    await loans.insert_one(loan_record)
+
+    await members.update_one(
         {"id": user_id},
-        {
-            "$push": {"debts": loan_record},
-            "$inc": {"total_debt": principal}
-        }
+        {"$inc": {"total_debt": principal, "cash": principal}}
     )
+    member_cache.invalidate(user_id)
 
-    eu.update_user_balance(user_id, cash_delta=principal)
+    await eu.adjust_credit_score(user_id, -5)
 
-    adjust_credit_score(user_id, -5)
-
-    eu.create_transaction_record(
+    await eu.create_transaction_record(
         user_id_from=BANK_ID,  # Bank's user ID
         user_id_to=user_id,
         amount=principal,
@@ -219,7 +203,7 @@ def create_loan(user_id: str, principal: float, apr: float, num_weeks: int) -> s
 
     return loan_id
 
-def make_loan_payment(user_id: str, loan_id: str, amount: float) -> tuple[bool, str]:
+async def make_loan_payment(user_id: str, loan_id: str, amount: float) -> tuple[bool, str]:
     """
     Make a payment towards a specific loan.
 
@@ -232,49 +216,41 @@ def make_loan_payment(user_id: str, loan_id: str, amount: float) -> tuple[bool,
         tuple[bool, str]: A tuple containing a boolean indicating if the payment was successful,
                           and a message explaining the result.
     """
-    user_data = eu.get_user_data(user_id)
-    if not user_data:
-        return False, "User not found."
-
-    cash = user_data.get("cash", 0)
-    if cash < amount:
-        return False, "Insufficient funds to make the payment."
-
-    debts = user_data.get("debts", [])
-    loan_found = False
-
-    for loan in debts:
-        if loan["loan_id"] == loan_id:
-            loan_found = True
-            remaining = loan["remaining_balance"]
-
-            if amount > remaining:
-                return False, f"Payment exceeds remaining loan balance of {remaining:.2f}."
-
-            loan["remaining_balance"] -= amount
-            loan["weeks_remaining"] -= max(0, loan["weeks_remaining"] - 1)
-
-            if loan["remaining_balance"] <= 0.01:
-                loan["status"] = "paid_off"
-                loan["remaining_balance"] = 0.0
-                adjust_credit_score(user_id, 20)
-
-            break
-
-    if not loan_found:
+    loan = await eu.get_user_loan(user_id, loan_id)
+    if not loan:
         return False, "Loan not found."
 
-    eu.update_user_balance(user_id, cash_delta=-amount)
+    remaining = loan["remaining_balance"]
+    if amount > remaining:
+        return False, f"Payment exceeds remaining loan balance of {remaining:.2f}."
 
-    members.update_one(
-        {"id": user_id},
-        {
-            "$set": {"debts": debts},
-            "$inc": {"total_debt": -amount}
-        }
-    )
+    # Take the cash first, so two payments at once cannot both spend it
+    if await eu.debit_if_sufficient(user_id, amount, "cash") is None:
+        if await eu.get_user_cash(user_id) is None:
+            return False, "User not found."
+        return False, "Insufficient funds to make the payment."
 
-    eu.create_transaction_record(
+    loan = None
+    try:
+        loan = await eu.pay_down_loan(user_id, loan_id, amount)
+    finally:
+        if loan is None:
+            # The loan changed since it was read, or the write failed: nothing was paid, so give the cash back
+            try:
+                await eu.update_user_balance(user_id, cash_delta=amount)
+            except PyMongoError:
+                logger.exception("Could not refund %.2f to %s after a failed payment on loan %s.", amount, user_id, loan_id)
+                raise
+    if loan is None:
+        return False, "The loan changed while processing the payment. Please try again."
+
+    await members.update_one({"id": user_id}, {"$inc": {"total_debt": -amount}})
+    member_cache.invalidate(user_id)
+
+    if loan["status"] == "paid_off":
+        await eu.adjust_credit_score(user_id, 20)
+
+    await eu.create_transaction_record(
         user_id_from=user_id,
         user_id_to=BANK_ID,  # Bank's user ID
         amount=amount,
@@ -302,7 +278,7 @@ class Balance(
         Display the user's cash balance, bank balance, total debt, and credit score.
         """
         user_id = str(ctx.user.id)
-        user_data = eu.get_user_data(str(ctx.user.id))
+        user_data = await eu.get_user_balances(user_id)
         if not user_data:
             await ctx.respond("User data not found.")
             return
@@ -340,21 +316,18 @@ class Deposit(
         Deposit a specified amount of cash into the user's bank account.
         """
         user_id = str(ctx.user.id)
-        user_data = eu.get_user_data(user_id)
-        if not user_data:
-            await ctx.respond("User data not found.")
-            return
-
-        cash = user_data.get("cash", 0.0)
         amount = self.amount
 
-        if cash < amount:
-            await ctx.respond(f"Insufficient cash to deposit that amount. You have {cash:.2f} available.")
+        balances = await eu.transfer_balance(user_id, amount, "cash", "bank")
+        if balances is None:
+            cash = await eu.get_user_cash(user_id)
+            if cash is None:
+                await ctx.respond("User data not found.")
+            else:
+                await ctx.respond(f"Insufficient cash to deposit that amount. You have {cash:.2f} available.")
             return
 
-        eu.update_user_balance(user_id, cash_delta=-amount, bank_delta=amount)
-
-        eu.create_transaction_record(
+        await eu.create_transaction_record(
             user_id_from=user_id,
             user_id_to=BANK_ID,  # Bank's user ID
             amount=amount,
@@ -362,7 +335,7 @@ class Deposit(
             transaction_type="deposit"
         )
 
-        await ctx.respond(f"✅ Successfully deposited ${amount:.2f} into your bank account.")
+        await ctx.respond(f"✅ Successfully deposited ${amount:.2f} into your bank account. Bank balance: ${balances['bank']:.2f}")
 
 @banking.register()
 class Withdraw(
@@ -378,21 +351,18 @@ class Withdraw(
         Withdraw a specified amount of cash from the user's bank account.
         """
         user_id = str(ctx.user.id)
-        user_data = eu.get_user_data(user_id)
-        if not user_data:
-            await ctx.respond("User data not found.")
-            return
-
-        bank_balance = user_data.get("bank", 0.0)
         amount = self.amount
 
-        if bank_balance < amount:
-            await ctx.respond(f"Insufficient funds in bank to withdraw that amount. You have {bank_balance:.2f} available.")
+        balances = await eu.transfer_balance(user_id, amount, "bank", "cash")
+        if balances is None:
+            user_data = await eu.get_user_balances(user_id)
+            if not user_data:
+                await ctx.respond("User data not found.")
+            else:
+                await ctx.respond(f"Insufficient funds in bank to withdraw that amount. You have {user_data.get('bank', 0.0):.2f} available.")
             return
 
-        eu.update_user_balance(user_id, cash_delta=amount, bank_delta=-amount)
-
-        eu.create_transaction_record(
+        await eu.create_transaction_record(
             user_id_from=BANK_ID,  # Bank's user ID
             user_id_to=user_id,
             amount=amount,
@@ -400,7 +370,7 @@ class Withdraw(
             transaction_type="withdrawal"
         )
 
-        await ctx.respond(f"✅ Successfully withdrew ${amount:.2f} from your bank account.")
+        await ctx.respond(f"✅ Successfully withdrew ${amount:.2f} from your bank account. Cash: ${balances['cash']:.2f}")
 
 #endregion
 
@@ -424,17 +394,17 @@ class LoanRequest(
         amount = self.principal
         weeks = self.weeks
 
-        can_loan, message = can_take_loan(user_id, amount)
+        can_loan, message = await can_take_loan(user_id, amount)
         if not can_loan:
             await ctx.respond(f"❌ Loan request denied: {message}")
             return
 
-        apr = calculate_apr_for_user(user_id)
+        apr = await calculate_apr_for_user(user_id)
         weekly_payment = calculate_weekly_payment(amount, apr, weeks)
         total_interest = calculate_total_interest(amount, weekly_payment, weeks)
         total_repayment = amount + total_interest
 
-        loan_id = create_loan(user_id, amount, apr, weeks)
+        loan_id = await create_loan(user_id, amount, apr, weeks)
 
         embed = hikari.Embed(
             title="🏦 Loan Approved!",
@@ -464,14 +434,13 @@ class LoanView(
         Display the user's current loans and their statuses.
         """
         user_id = str(ctx.user.id)
-        user_data = eu.get_user_data(user_id)
+        user_data = await eu.get_user_balances(user_id)
 
         if not user_data:
             await ctx.respond("User data not found.")
             return
 
-        debts = user_data.get("debts", [])
-        active_loans = [loan for loan in debts if loan["status"] == "active"]
+        active_loans = await eu.get_user_loans(user_id)
 
         if not active_loans:
             await ctx.respond("You have no active loans.")
@@ -515,19 +484,7 @@ class LoanPay(
         loan_id = self.loan_id
         amount = self.amount
 
-        user_data = eu.get_user_data(user_id)
-        if not user_data:
-            await ctx.respond("User data not found.")
-            return
-
-        debts = user_data.get("debts", [])
-        matching_loan = None
-
-        for loan in debts:
-            if loan["loan_id"] == loan_id and loan["status"] == "active":
-                matching_loan = loan
-                break
-
+        matching_loan = await eu.get_user_loan(user_id, loan_id)
         if not matching_loan:
             await ctx.respond("❌ Loan not found or already paid off.")
             return
@@ -535,7 +492,7 @@ class LoanPay(
         if amount == 0:
             amount = matching_loan["weekly_payment"]
 
-        success, message = make_loan_payment(user_id, loan_id, amount)
+        success, message = await make_loan_payment(user_id, loan_id, amount)
         if success:
             remaining = matching_loan["remaining_balance"] - amount
 
@@ -570,14 +527,13 @@ class AdminAdjust(
         cash_delta = self.cash_amount
         bank_delta = self.bank_amount
 
-        user_data = eu.get_user_data(target_user_id)
-        if not user_data:
+        if await eu.get_user_cash(target_user_id) is None:
             await ctx.respond("User data not found.", ephemeral=True)
             return
 
-        eu.update_user_balance(target_user_id, cash_delta=cash_delta, bank_delta=bank_delta)
+        await eu.update_user_balance(target_user_id, cash_delta=cash_delta, bank_delta=bank_delta)
 
-        eu.create_transaction_record(
+        await eu.create_transaction_record(
             user_id_from=str(ctx.user.id),
             user_id_to=target_user_id,
             amount=abs(cash_delta) + abs(bank_delta),
@@ -1,11 +1,15 @@
 #region Imports
 from datetime import datetime, timezone, timedelta
+from typing import Iterable, TypedDict
 import asyncio
 
 import hikari
 import lightbulb
+from pymongo import ReturnDocument
 
-from database import members, transactions
+from database import members, loans
+from extensions.economy.ledger import transaction_ledger
+from extensions.economy.member_cache import member_cache
 from hooks import fail_if_not_admin_or_owner
 #endregion
 
@@ -33,19 +37,151 @@ def generate_short_id() -> str:
     import uuid
     return str(uuid.uuid4())[:8]
 
-def get_user_data(user_id: str) -> dict | None:
+#endregion
+
+#region Projected Member Accessors
+
+CASH_FIELDS = ("cash",)
+BALANCE_FIELDS = ("cash", "bank", "total_debt", "credit_score")
+RECORD_FIELDS = ("wins", "losses")
+BALANCE_PROJECTION = {"_id": 0, "id": 1, **{name: 1 for name in BALANCE_FIELDS}}
+
+CREDIT_SCORE_MIN = 300
+CREDIT_SCORE_MAX = 850
+CREDIT_SCORE_DEFAULT = 500  # Members created before credit scores existed
+LOAN_PAID_OFF_BELOW = 0.01  # A remaining balance this small counts as paid off
+
+class Balances(TypedDict, total=False):
+    id: str
+    cash: float
+    bank: float
+    total_debt: float
+    credit_score: int
+
+class Loan(TypedDict, total=False):
+    loan_id: str
+    user_id: str
+    principal: float
+    remaining_balance: float
+    apr: float
+    weekly_payment: float
+    num_weeks: int
+    weeks_remaining: int
+    total_interest: float
+    created_at: datetime
+    last_accrual: datetime
+    status: str
+
+async def get_user_fields(user_id: str, fields: Iterable[str]) -> dict | None:
+    """
+    Retrieve only the given fields of a member document.
+    Projected fetches are cached too, and a cached entry that already holds the fields is reused.
+
+    Args:
+        user_id (str): The ID of the user.
+        fields (Iterable[str]): The fields to fetch. "id" is always included.
+
+    Returns:
+        dict | None: The projected document if the member exists, otherwise None.
+    """
+    fields = tuple(fields)
+    projection = {"_id": 0, "id": 1, **{name: 1 for name in fields}}
+    return await member_cache.get_or_load(
+        user_id,
+        lambda: members.find_one({"id": user_id}, projection),
+        fields
+    )
+
+async def get_user_cash(user_id: str) -> float | None:
+    """
+    Retrieve the user's cash balance.
+
+    Args:
+        user_id (str): The ID of the user.
+
+    Returns:
+        float | None: The cash balance, or None if the user does not exist.
     """
-    Retrieve user data from the database.
+    user_data = await get_user_fields(user_id, CASH_FIELDS)
+    if not user_data:
+        return None
+    return user_data.get("cash", 0.0)
+
+async def get_user_balances(user_id: str) -> Balances | None:
+    """
+    Retrieve the user's cash, bank balance, total debt and credit score.
+
+    Args:
+        user_id (str): The ID of the user.
+
+    Returns:
+        Balances | None: The balances, or None if the user does not exist.
+    """
+    return await get_user_fields(user_id, BALANCE_FIELDS)
+
+#endregion
+
+#region Loan Accessors
+
+async def get_user_loans(user_id: str, status: str = "active") -> list[Loan]:
+    """
+    Retrieve the user's loans with the given status from the loans collection.
 
     Args:
         user_id (str): The ID of the user.
+        status (str): The loan status to filter on.
 
     Returns:
-        dict | None: The user data if found, otherwise None.
+        list[Loan]: The matching loans, oldest first.
     """
-    return members.find_one({"id": user_id})
+    cursor = loans.find({"user_id": user_id, "status": status}, {"_id": 0}).sort("created_at", 1)
+    return await cursor.to_list(length=None)
 
-def update_user_balance(user_id: str, cash_delta: float = 0.0, bank_delta: float = 0.0) -> None:
+async def get_user_loan(user_id: str, loan_id: str, status: str = "active") -> Loan | None:
+    """
+    Retrieve a single loan belonging to the user.
+
+    Args:
+        user_id (str): The ID of the user.
+        loan_id (str): The ID of the loan.
+        status (str): The loan status to filter on.
+
+    Returns:
+        Loan | None: The loan if found, otherwise None.
+    """
+    return await loans.find_one({"user_id": user_id, "loan_id": loan_id, "status": status}, {"_id": 0})
+
+async def pay_down_loan(user_id: str, loan_id: str, amount: float) -> Loan | None:
+    """
+    Take a payment off an active loan in one round trip, only if it does not exceed the remaining balance.
+    A loan left with less than LOAN_PAID_OFF_BELOW is closed as paid off in the same write.
+
+    Args:
+        user_id (str): The ID of the user.
+        loan_id (str): The ID of the loan.
+        amount (float): The payment.
+
+    Returns:
+        Loan | None: The loan after the payment, or None if there is no such active loan or the payment exceeds its balance.
+    """
+    remaining = {"$subtract": ["$remaining_balance", amount]}
+    paid_off = {"$lte": [remaining, LOAN_PAID_OFF_BELOW]}
+    return await loans.find_one_and_update(
+        {"user_id": user_id, "loan_id": loan_id, "status": "active", "remaining_balance": {"$gte": amount}},
+        [{"$set": {
+            "remaining_balance": {"$cond": [paid_off, 0.0, remaining]},
+            "weeks_remaining": {"$max": [0, {"$subtract": ["$weeks_remaining", 1]}]},
+            "status": {"$cond": [paid_off, "paid_off", "$status"]}
+        }}],
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+#endregion
+
+#region Balance Updates
+
+async def update_user_balance(user_id: str, cash_delta: float = 0.0, bank_delta: float = 0.0) -> None:
     """
     Update the user's cash and bank balances.
 
@@ -54,7 +190,7 @@ def update_user_balance(user_id: str, cash_delta: float = 0.0, bank_delta: float
         cash_delta (float): The amount to change the cash balance by.
         bank_delta (float): The amount to change the bank balance by.
     """
-    members.update_one(
+    await members.update_one(
         {"id": user_id},
         {
             "$inc": {
@@ -63,12 +199,86 @@ def update_user_balance(user_id: str, cash_delta: float = 0.0, bank_delta: float
             }
         }
     )
+    member_cache.invalidate(user_id)
+
+#endregion
+
+#region Atomic Balance Updates
+
+# Each update below checks and writes in a single round trip, so two commands running at once can never
+# both spend the same cash. They return the balances after the write, for the response.
+
+async def debit_if_sufficient(
+    user_id: str,
+    amount: float,
+    field: str = "cash",
+    credits: dict[str, float] | None = None
+) -> Balances | None:
+    """
+    Take an amount from one of the user's balances, only if that balance covers it.
+
+    Args:
+        user_id (str): The ID of the user.
+        amount (float): The amount to take.
+        field (str): The balance to take it from, "cash" or "bank".
+        credits (dict[str, float] | None): Amounts to add to other fields in the same write, e.g. {"bank": amount}.
+
+    Returns:
+        Balances | None: The balances after the debit, or None if the user does not exist or the balance is short.
+    """
+    balances = await members.find_one_and_update(
+        {"id": user_id, field: {"$gte": amount}},
+        {"$inc": {field: -amount, **(credits or {})}},
+        projection=BALANCE_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if balances is not None:
+        member_cache.invalidate(user_id)
+    return balances
+
+async def transfer_balance(user_id: str, amount: float, source: str, target: str) -> Balances | None:
+    """
+    Move an amount between the user's cash and bank, only if the source covers it.
+
+    Args:
+        user_id (str): The ID of the user.
+        amount (float): The amount to move.
+        source (str): The balance to take it from, "cash" or "bank".
+        target (str): The balance to add it to.
+
+    Returns:
+        Balances | None: The balances after the transfer, or None if the user does not exist or the source is short.
+    """
+    return await debit_if_sufficient(user_id, amount, source, {target: amount})
+
+async def adjust_credit_score(user_id: str, delta: int) -> int | None:
+    """
+    Adjust the user's credit score, clamped between CREDIT_SCORE_MIN and CREDIT_SCORE_MAX.
+
+    Args:
+        user_id (str): The ID of the user.
+        delta (int): The amount to adjust the credit score by.
+
+    Returns:
+        int | None: The new credit score, or None if the user does not exist.
+    """
+    score = {"$add": [{"$ifNull": ["$credit_score", CREDIT_SCORE_DEFAULT]}, delta]}
+    balances = await members.find_one_and_update(
+        {"id": user_id},
+        [{"$set": {"credit_score": {"$min": [CREDIT_SCORE_MAX, {"$max": [CREDIT_SCORE_MIN, score]}]}}}],
+        projection={"_id": 0, "credit_score": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if balances is None:
+        return None
+    member_cache.invalidate(user_id)
+    return balances["credit_score"]
 
 #endregion
 
 #region Transaction Recording
 
-def create_transaction_record(
+async def create_transaction_record(
     user_id_from: str,
     user_id_to: str,
     amount: float,
@@ -79,6 +289,7 @@ def create_transaction_record(
 ) -> str:
     """
     Create a transaction record for a user.
+    The record goes through the ledger queue, so it may be written shortly after this returns.
 
     Args:
         user_id_from (str): The ID of the user sending the money.
@@ -105,7 +316,7 @@ def create_transaction_record(
         "fees_charged": 0.0,  # Fees can be added later if applicable
         "status": transaction_status  # Status of the transaction
     }
-    transactions.insert_one(transaction_record)
+    await transaction_ledger.append(transaction_record)
     return transaction_id
 
 #endregion
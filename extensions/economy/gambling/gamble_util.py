@@ -5,14 +5,16 @@ import hikari
 import lightbulb
 
 from database import members, gambling_history
-from extensions.economy.economy_util import create_transaction_record, generate_short_id
+from extensions.economy.economy_util import create_transaction_record, debit_if_sufficient, generate_short_id, get_user_cash, get_user_fields, RECORD_FIELDS
+from extensions.economy.ledger import gambling_ledger
+from extensions.economy.member_cache import member_cache
 #endregion
 
 loader = lightbulb.Loader()
 BANK_ID = "1399230814679601172"  # Bot's bank ID
 
 #region Gambling Record
-def create_gambling_history_record(
+async def create_gambling_history_record(
         player_id: str,
         guild_id: str,
         game_type: str,
@@ -23,6 +25,7 @@ def create_gambling_history_record(
 ) -> str:
     """
     Create a gambling history record in the database.
+    The record goes through the ledger queue, so it may be written shortly after this returns.
 
     Args:
         player_id (str): The ID of the player.
@@ -48,61 +51,43 @@ def create_gambling_history_record(
         "timestamp": datetime.now(timezone.utc),
         "game_data": game_data or {}
     }
-    gambling_history.insert_one(record)
+    await gambling_ledger.append(record)
     return record_id
 #endregion
 
-#region Bet Validation
-def validate_bet(user_id: str, bet_amount: float) -> tuple[bool, str]:
+#region Placing Bets
+async def place_bet(user_id: str, bet_amount: float, bet_type: str, game_type: str) -> tuple[bool, str]:
     """
-    Check if user can place this bet.
-
-    Args:
-        user_id (str): The ID of the user placing the bet.
-        bet_amount (float): The amount the user wants to bet.
-
-    Returns:
-        tuple[bool, str]: A tuple where the first element is True if the bet is valid,
-                          and False otherwise. The second element is an error message if invalid.
-    """
-
-    user_data = members.find_one({"id": user_id})
-    if not user_data:
-        return False, "User not found."
-
-    current_cash = user_data.get("cash", 0)
-
-    if current_cash < bet_amount:
-        return False, "Insufficient funds to place this bet."
-
-    return True, ""
-#endregion
-
-#region Racing Result Processing
-def deduct_bet(user_id: str, bet_amount: float, bet_type: str, game_type: str) -> None:
-    """
-    Deduct the bet amount from the user's cash and create a transaction record.
+    Take the bet from the user's cash, only if they have enough, and create a transaction record.
+    The check and the deduction are one write, so the same cash cannot be bet twice.
 
     Args:
         user_id (str): The ID of the user placing the bet.
         bet_amount (float): The amount of the bet.
         bet_type (str): The type of bet placed.
         game_type (str): The type of gambling game played.
+
+    Returns:
+        tuple[bool, str]: A tuple where the first element is True if the bet was placed,
+                          and False otherwise. The second element is an error message if not.
     """
-    members.update_one(
-        {"id": user_id},
-        {"$inc": {"cash": -bet_amount}}
-    )
+    if await debit_if_sufficient(user_id, bet_amount) is None:
+        if await get_user_cash(user_id) is None:
+            return False, "User not found."
+        return False, "Insufficient funds to place this bet."
 
-    create_transaction_record(
+    await create_transaction_record(
         user_id_from=user_id,
         user_id_to=BANK_ID,
         amount=bet_amount,
         description=f"Bet on {game_type} ({bet_type})",
         transaction_type="gambling bet"
     )
+    return True, ""
+#endregion
 
-def process_racing_payout(
+#region Racing Result Processing
+async def process_racing_payout(
     user_id: str,
     guild_id: str,
     payment_amount: float,
@@ -127,7 +112,7 @@ def process_racing_payout(
         str: A reference id for the history of the gambling game.
     """
     if result == "win":
-        members.update_one(
+        await members.update_one(
             {"id": user_id},
             {
                 "$inc": {
@@ -136,7 +121,8 @@ def process_racing_payout(
                 }
             }
         )
-        create_transaction_record(
+        member_cache.invalidate(user_id)
+        await create_transaction_record(
             user_id_from=BANK_ID,
             user_id_to=user_id,
             amount=payment_amount,
@@ -144,7 +130,7 @@ def process_racing_payout(
             transaction_type="gambling payout"
         )
     elif result == "loss":
-        members.update_one(
+        await members.update_one(
             {"id": user_id},
             {
                 "$inc": {
@@ -152,8 +138,9 @@ def process_racing_payout(
                 }
             }
         )
+        member_cache.invalidate(user_id)
 
-    return create_gambling_history_record(
+    return await create_gambling_history_record(
         player_id=user_id,
         guild_id=guild_id,
         game_type=game_type,
@@ -165,7 +152,7 @@ def process_racing_payout(
 #endregion
 
 #region Atomic Gambling Result Processing
-def process_gambling_result(
+async def process_gambling_result(
         user_id: str,
         guild_id: str,
         game_type: str, # "slots", "racing", "blackjack"
@@ -175,7 +162,7 @@ def process_gambling_result(
         game_data: dict = None
 ) -> str:
     """
-    Handle all database updates for a completed game.
+    Handle all database updates for a completed game. The bet must already have been taken with place_bet.
 
     Args:
         user_id (str): The ID of the user who played.
@@ -189,27 +176,9 @@ def process_gambling_result(
     Returns:
         str: A reference id for the history of the gambling game.
     """
-    user_data = members.find_one({"id": user_id})
-    if not user_data:
-        return "User not found."
-
-    if game_type is not "blackjack":
-        members.update_one(
-            {"id": user_id},
-            {"$inc": {"cash": -bet_amount}}
-        )
-
-    create_transaction_record(
-        user_id_from=user_id,
-        user_id_to=BANK_ID,
-        amount=bet_amount,
-        description=f"Bet on {game_type}",
-        transaction_type="gambling bet"
-    )
-
     # Update user's cash based on result
     if result == "win":
-        members.update_one(
+        await members.update_one(
             {"id": user_id},
             {
                 "$inc": {
@@ -218,7 +187,8 @@ def process_gambling_result(
                 }
             }
         )
-        create_transaction_record(
+        member_cache.invalidate(user_id)
+        await create_transaction_record(
             user_id_from=BANK_ID,
             user_id_to=user_id,
             amount=payout_amount,
@@ -226,7 +196,7 @@ def process_gambling_result(
             transaction_type="gambling payout"
         )
     elif result == "loss":
-        members.update_one(
+        await members.update_one(
             {"id": user_id},
             {
                 "$inc": {
@@ -234,15 +204,17 @@ def process_gambling_result(
                 }
             }
         )
-    # For "push", no cash change
+        member_cache.invalidate(user_id)
+    # For "push", the bet is given back
     else:
-        members.update_one(
+        await members.update_one(
             {"id": user_id},
             {"$inc": {"cash": bet_amount}}
         )
+        member_cache.invalidate(user_id)
 
     # Record the gambling history
-    record_id = create_gambling_history_record(
+    record_id = await create_gambling_history_record(
         player_id=user_id,
         guild_id=guild_id,
         game_type=game_type,
@@ -255,7 +227,7 @@ def process_gambling_result(
     return record_id
 #endregion
 
-def get_user_gambling_stats(user_id: str) -> dict:
+async def get_user_gambling_stats(user_id: str) -> dict:
     """
     Retrieve overall gambling statistics for a user.
 
@@ -265,14 +237,16 @@ def get_user_gambling_stats(user_id: str) -> dict:
     Returns:
         dict: A dictionary containing total bets, wins, losses, and net profit/loss.
     """
-    user_data = members.find_one({"id": user_id})
+    user_data = await get_user_fields(user_id, RECORD_FIELDS)
     if not user_data:
         return {}
 
     total_wins = user_data.get("wins", 0)
     total_losses = user_data.get("losses", 0)
 
-    all_bets = list(gambling_history.find({"player_id": user_id}))
+    # Make sure games still sitting in the write-behind queue are counted
+    await gambling_ledger.flush()
+    all_bets = await gambling_history.find({"player_id": user_id}).to_list(length=None)
 
     total_wagered = sum(bet["bet_amount"] for bet in all_bets)
     total_won = sum(bet["payout_amount"] for bet in all_bets if bet["result"] == "win")
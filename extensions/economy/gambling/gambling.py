@@ -1,22 +1,30 @@
 #region Imports
 from datetime import datetime, timezone, timedelta
 import asyncio
+import logging
 import random
-from typing import Any
+from typing import Any, TYPE_CHECKING
 
 import hikari
 import lightbulb
 from attr import dataclass
 
+import sharding
 from database import members, transactions
 from hooks import fail_if_not_admin_or_owner
+from metrics import register_gauge
 import extensions.economy.gambling.gamble_util as gu
 import extensions.economy.economy_util as eu
-from anydeck import AnyDeck, anydeck
+from extensions.economy.member_cache import member_cache
+
+# anydeck is imported when the first blackjack deck is built, so loading the extension does not pay for it
+if TYPE_CHECKING:
+    from anydeck import AnyDeck, anydeck
 
 #endregion
 
-loader = lightbulb.Loader()
+loader = lightbulb.Loader(should_load_hook=sharding.serves_commands)
+logger = logging.getLogger(__name__)
 gambling = lightbulb.Group("gambling", "Gambling related commands and features.")
 slots = gambling.subgroup("slots", "Slot machine commands.")
 racing = gambling.subgroup("racing", "Horse racing commands.")
@@ -94,7 +102,7 @@ class SlotMachine(
     @lightbulb.invoke
     async def invoke(self, ctx: lightbulb.Context) -> None:
 
-        can_bet, reason = gu.validate_bet(str(ctx.member.id), self.bet)
+        can_bet, reason = await gu.place_bet(str(ctx.member.id), self.bet, "spin", "slots")
 
         if not can_bet:
             await ctx.respond(f"❌ You cannot place that bet: {reason}")
@@ -161,7 +169,7 @@ class SlotMachine(
             result_message = "😢 **Better luck next time!**\nNo matching symbols found."
 
         # Add payout to user's account if they won
-        gu.process_gambling_result(
+        await gu.process_gambling_result(
             user_id=str(ctx.member.id),
             guild_id=str(ctx.guild_id),
             game_type="slots",
@@ -220,8 +228,9 @@ class SlotsHelp(
 #region Horse Racing
 
 #region Variables and Data Classes
-active_races = {}
-pending_bets = {}
+# Both are keyed by guild, so a process only ever holds state for guilds on its own shards
+active_races = {}  # guild_id -> RaceSession
+pending_bets = {}  # (guild_id, user_id) -> bet being built through the betting menus
 
 HORSE_NAMES = [
     "Lightning Hooves", "Skibidi Rizz", "Debt Collector", "Who", "What", "I Don't Know",
@@ -271,13 +280,12 @@ def get_unique_horses() -> list[Horse]:
     """Get a random set of 8 horses, ensuring unique names."""
     horses = random.sample(HORSE_NAMES, 8)
     unique_horses = [Horse(i + 1, name) for i, name in enumerate(horses)]
-    # DEBUG: checks each horse's speed and stamina
-    print(
-        "\n".join([
-            f"Horse #{h.number} - {h.name}: Speed={h.speed}, Stamina={h.stamina}"
-            for h in unique_horses
-        ])
-    )
+    # Each horse's speed and stamina, for checking the odds; the lines are only built when DEBUG is on
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Race horses:\n%s",
+            "\n".join(f"Horse #{h.number} - {h.name}: Speed={h.speed}, Stamina={h.stamina}" for h in unique_horses)
+        )
     return unique_horses
 
 class RaceSession:
@@ -296,7 +304,7 @@ class RaceSession:
         self.winner = None
         self.podium = []
 
-    def add_bet(self, user_id: str, username: str, bet_type: str, horse_list: list[int], amount: float) -> tuple[bool, str]:
+    async def add_bet(self, user_id: str, username: str, bet_type: str, horse_list: list[int], amount: float) -> tuple[bool, str]:
         """Add a bet. Bets are locked once placed. Returns (success, message)."""
         if self.status != "betting":
             return False, "Betting is closed for this race."
@@ -304,15 +312,12 @@ class RaceSession:
         if user_id in self.bets:
             return False, f"You already bet ${self.bets[user_id].amount:.2f} on horse #{self.bets[user_id].horse_number}. No changes allowed!"
 
-        can_bet, error = gu.validate_bet(user_id, amount)
-        if not can_bet:
-            return False, f"Cannot place bet: {error}"
-
-
         horse_objs = [horse for horse in self.horses if horse.number in horse_list]
         bet_on_text = ", ".join([f"#{h.number} ({h.name})" for h in horse_objs])
 
-        gu.deduct_bet(user_id, amount, f"Bet on Horses {bet_on_text}", "horse_racing")
+        can_bet, error = await gu.place_bet(user_id, amount, f"Bet on Horses {bet_on_text}", "horse_racing")
+        if not can_bet:
+            return False, f"Cannot place bet: {error}"
 
         self.bets[user_id] = Bet(user_id, username, amount, bet_type, horse_list)
         self.total_pool += amount
@@ -422,12 +427,12 @@ class BetModal(lightbulb.components.Modal):
             await ctx.respond("❌ Minimum bet amount is $10.", ephemeral=True)
             return
 
-        pending = pending_bets.get(ctx.user.id)
+        pending = pending_bets.get((self.race_session.guild_id, ctx.user.id))
         if not pending:
             await ctx.respond("❌ No pending bet found. Please start again.", ephemeral=True)
             return
 
-        success, message = self.race_session.add_bet(
+        success, message = await self.race_session.add_bet(
             str(ctx.user.id),
             ctx.user.username,
             pending["bet_type"],
@@ -436,7 +441,7 @@ class BetModal(lightbulb.components.Modal):
         )
 
         if success:
-            del pending_bets[ctx.user.id]
+            del pending_bets[(self.race_session.guild_id, ctx.user.id)]
 
         await ctx.respond(message, ephemeral=True)
 #endregion
@@ -471,7 +476,7 @@ class HorseRaceMenu(lightbulb.components.Menu):
             )
             return
 
-        pending_bets[ctx.user.id] = {
+        pending_bets[(guild_id, ctx.user.id)] = {
             "race_id": race_session.race_id,
             "bet_type": None,
             "horses": [],
@@ -516,7 +521,7 @@ class BetTypeMenu(lightbulb.components.Menu):
     async def on_bet_type_selected(self, ctx: lightbulb.components.MenuContext) -> None:
         bet_selected = ctx.selected_values_for(self.select)[0]
 
-        pending = pending_bets.get(ctx.user.id)
+        pending = pending_bets.get((self.race_session.guild_id, ctx.user.id))
         if pending["bet_type"]:
             await ctx.respond("You have already selected a bet type.", flags=hikari.MessageFlag.EPHEMERAL)
             return
@@ -586,7 +591,7 @@ class HorseSelectionMenu(lightbulb.components.Menu):
         horse_selected = int(ctx.selected_values_for(self.select)[0])
         self.selected_horses.append(horse_selected)
 
-        pending = pending_bets.get(ctx.user.id)
+        pending = pending_bets.get((self.race_session.guild_id, ctx.user.id))
         pending["horses"].append(horse_selected)
 
         bet_type = pending["bet_type"]
@@ -688,7 +693,7 @@ async def run_race(client: lightbulb.Client, message: hikari.Message, race_sessi
 
     for user_id, payout_amount in payouts.items():
         bet = race_session.bets[user_id]
-        gu.process_racing_payout(
+        await gu.process_racing_payout(
             user_id,
             str(race_session.guild_id),
             payout_amount,
@@ -705,7 +710,7 @@ async def run_race(client: lightbulb.Client, message: hikari.Message, race_sessi
 
     for user_id, bet in race_session.bets.items():
         if user_id not in payouts:
-            gu.process_racing_payout(
+            await gu.process_racing_payout(
                 user_id=user_id,
                 guild_id=str(race_session.guild_id),
                 payment_amount=0,
@@ -760,7 +765,13 @@ async def run_race(client: lightbulb.Client, message: hikari.Message, race_sessi
     await client.rest.create_message(race_session.channel_id, embed=results_embed)
 
     # Clean up
-    del active_races[race_session.guild_id]
+    end_race(race_session)
+
+def end_race(race_session: RaceSession) -> None:
+    """Forget a finished or cancelled race, along with any bets still being built for it."""
+    active_races.pop(race_session.guild_id, None)
+    for key in [key for key, pending in pending_bets.items() if pending["race_id"] == race_session.race_id]:
+        del pending_bets[key]
 
 async def countdown_and_race(client: lightbulb.Client, channel: int, race_session: RaceSession, message: hikari.Message) -> None:
     """Handle countdown and start race"""
@@ -771,10 +782,11 @@ async def countdown_and_race(client: lightbulb.Client, channel: int, race_sessio
     if len(race_session.bets) < MIN_BETTORS:
         # Refund all bets
         for bet in race_session.bets.values():
-            members.update_one(
+            await members.update_one(
                 {"id": bet.user_id},
                 {"$inc": {"cash": bet.amount}}
             )
+            member_cache.invalidate(bet.user_id)
 
         embed = hikari.Embed(
             title="❌ Race Cancelled",
@@ -790,7 +802,7 @@ async def countdown_and_race(client: lightbulb.Client, channel: int, race_sessio
             components=[]
         )
 
-        del active_races[race_session.guild_id]
+        end_race(race_session)
         return
 
     # Update message - betting closed
@@ -942,6 +954,8 @@ OUTCOME_PAYOUTS = {
     "loss": 0.0        # Lose entire bet
 }
 
+active_blackjack_menus: set["BlackjackMenu"] = set()  # Games waiting on the player's buttons
+
 #endregion
 
 #region Hand Class
@@ -949,11 +963,11 @@ OUTCOME_PAYOUTS = {
 class Hand:
     """Represents a blackjack hand with cards and methods to evaluate its value."""
 
-    def __init__(self, cards: list[anydeck.Card] = None):
+    def __init__(self, cards: list["anydeck.Card"] = None):
         """Initialize a hand with optional starting cards."""
         self.cards = cards or []
 
-    def add_card(self, card: anydeck.Card) -> None:
+    def add_card(self, card: "anydeck.Card") -> None:
         """Add a card to the hand."""
         self.cards.append(card)
 
@@ -1043,8 +1057,10 @@ class BlackjackGame:
         # Deal initial cards
         self._deal_initial_cards()
 
-    def _create_deck(self) -> AnyDeck:
+    def _create_deck(self) -> "AnyDeck":
         """Create and shuffle a standard 52-card deck with blackjack values."""
+        from anydeck import AnyDeck
+
         deck = AnyDeck(
             shuffled=True,
             suits=('♣', '♦', '♥', '♠'),
@@ -1073,7 +1089,7 @@ class BlackjackGame:
         if player_blackjack or dealer_blackjack:
             self.is_complete = True
 
-    def hit(self) -> anydeck.Card:
+    def hit(self) -> "anydeck.Card":
         """
         Add a card to the current hand.
 
@@ -1104,7 +1120,7 @@ class BlackjackGame:
             self._play_dealer_hand()
             self.is_complete = True
 
-    def double_down(self) -> anydeck.Card:
+    def double_down(self) -> "anydeck.Card":
         """
         Double the bet on the current hand and draw exactly one card.
 
@@ -1695,7 +1711,7 @@ class BlackjackMenu(lightbulb.components.Menu):
         net_change = amount - bet
 
         # Update user's balance
-        gu.process_gambling_result(
+        await gu.process_gambling_result(
             str(user_id),
             str(ctx.guild_id),
             "blackjack",
@@ -1726,18 +1742,13 @@ class BlackjackCommand(
         """Handle the blackjack command invocation."""
         await ctx.defer()  # Defer the response to avoid timeout issues
 
-        # Check if user has enough
-        can_bet, reason = gu.validate_bet(str(ctx.user.id), self.bet)
+        # Take the bet, if the user has enough
+        can_bet, reason = await gu.place_bet(str(ctx.user.id), self.bet, "hand", "blackjack")
 
         if not can_bet:
             await ctx.respond(f"❌ {reason}", flags=hikari.MessageFlag.EPHEMERAL)
             return
 
-        members.update_one(
-            {"user_id": str(ctx.user.id)},
-            {"$inc": {"cash": -self.bet}}
-        )
-
         msg = await ctx.interaction.fetch_initial_response()
         # Create game instance
         game = BlackjackGame(ctx.user.id, self.bet, msg.id)
@@ -1786,6 +1797,7 @@ class BlackjackCommand(
         )
 
         # Wait for player interactions
+        active_blackjack_menus.add(menu)
         try:
             await menu.attach(cl, timeout=120)
         except asyncio.TimeoutError:
@@ -1802,6 +1814,8 @@ class BlackjackCommand(
             except (hikari.NotFoundError, hikari.ForbiddenError):
                 # Handle case where message cannot be edited
                 pass
+        finally:
+            active_blackjack_menus.discard(menu)
 
     async def _process_payout(
             self,
@@ -1825,7 +1839,7 @@ class BlackjackCommand(
         net_change = amount - bet
 
         # Update user's balance
-        gu.process_gambling_result(
+        await gu.process_gambling_result(
             str(user_id),
             str(ctx.guild_id),
             "blackjack",
@@ -1913,4 +1927,12 @@ class BlackjackHelp(
 
 #endregion
 
+#region Metrics
+
+register_gauge("bot_active_races", "Horse races in progress.", lambda: len(active_races))
+register_gauge("bot_pending_bets", "Horse race bets being built through the betting menus.", lambda: len(pending_bets))
+register_gauge("bot_active_blackjack_menus", "Blackjack games waiting on the player.", lambda: len(active_blackjack_menus))
+
+#endregion
+
 loader.command(gambling)
\ No newline at end of file
@@ -0,0 +1,222 @@
+#region Imports
+import asyncio
+import logging
+import os
+import time
+
+import hikari
+import lightbulb
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from database import transactions, gambling_history
+from metrics import register_gauge, set_origin
+#endregion
+
+loader = lightbulb.Loader()
+logger = logging.getLogger(__name__)
+
+#region Configuration
+LEDGER_DURABILITY = os.getenv("LEDGER_DURABILITY", "batched").lower()  # "sync" writes each record immediately
+LEDGER_BATCH_SIZE = int(os.getenv("LEDGER_BATCH_SIZE", "100"))  # Flush as soon as this many records are queued
+LEDGER_FLUSH_INTERVAL = float(os.getenv("LEDGER_FLUSH_INTERVAL", "1.0"))  # Seconds a record may wait before flushing
+LEDGER_MAX_QUEUE = int(os.getenv("LEDGER_MAX_QUEUE", "5000"))  # Appends wait for a flush once the queue is this deep
+
+DURABILITY_MODES = ("sync", "batched")
+
+if LEDGER_DURABILITY not in DURABILITY_MODES:
+    raise ValueError(f"LEDGER_DURABILITY must be one of {DURABILITY_MODES}, got {LEDGER_DURABILITY!r}.")
+#endregion
+
+#region Ledger Queue
+
+class LedgerQueue:
+    """
+    A bounded, in-process append queue for ledger documents.
+
+    Records are written with `insert_many(ordered=False)` once `batch_size` records are queued
+    or `flush_interval` seconds have passed, whichever comes first. When the queue reaches
+    `max_size` the caller waits for a flush instead of growing the queue further. A failed flush
+    puts its batch back for the background flusher to retry, keeping at most `max_size` records;
+    the overflow is logged and counted in `failed`.
+    In "sync" durability mode every append is written with its own `insert_one`.
+    """
+
+    def __init__(
+            self,
+            collection,
+            batch_size: int = LEDGER_BATCH_SIZE,
+            flush_interval: float = LEDGER_FLUSH_INTERVAL,
+            max_size: int = LEDGER_MAX_QUEUE,
+            durability: str = LEDGER_DURABILITY
+    ) -> None:
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_size = max(max_size, batch_size)
+        self.durability = durability
+
+        self._buffer: list[dict] = []
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._flusher: asyncio.Task | None = None
+        self._stopping = False
+
+        # Counters
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    @property
+    def depth(self) -> int:
+        """The number of records waiting to be written."""
+        return len(self._buffer)
+
+    async def append(self, document: dict) -> None:
+        """
+        Queue a document for writing, or write it straight away in sync mode.
+
+        Args:
+            document (dict): The ledger document to insert.
+        """
+        self.enqueued += 1
+
+        if self.durability == "sync":
+            start = time.perf_counter()
+            await self.collection.insert_one(document)
+            self._record_flush(start, 1)
+            return
+
+        self._buffer.append(document)
+        self._ensure_flusher()
+
+        if len(self._buffer) >= self.max_size:
+            try:
+                await self.flush()
+            except PyMongoError:
+                # The record is queued and the failure logged; the background flusher retries, and
+                # the caller has already moved the money, so it must not see an error
+                pass
+        elif len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    async def flush(self) -> None:
+        """Write every queued document in a single unordered batch."""
+        async with self._lock:
+            if not self._buffer:
+                return
+
+            batch, self._buffer = self._buffer, []
+            start = time.perf_counter()
+
+            try:
+                await self.collection.insert_many(batch, ordered=False)
+                self._record_flush(start, len(batch))
+            except BulkWriteError as e:
+                # Unordered inserts keep going past bad documents; only count the ones that were rejected
+                rejected = len(e.details.get("writeErrors", []))
+                self.failed += rejected
+                self._record_flush(start, len(batch) - rejected)
+                logger.error("%d record(s) rejected by %s: %s", rejected, self.collection.name, e)
+            except PyMongoError as e:
+                # Nothing was confirmed written, put the batch back in front so it is retried on the next flush
+                self._requeue(batch)
+                logger.warning("Flush to %s failed, %d record(s) requeued: %s", self.collection.name, len(batch), e)
+                raise
+            except asyncio.CancelledError:
+                # Cancelled mid-insert, e.g. at shutdown; the batch may not have been written, so keep it
+                self._requeue(batch)
+                raise
+
+    async def drain(self) -> None:
+        """Stop the background flusher and write everything still queued."""
+        if self._flusher:
+            # Let the flusher finish the flush it may be in the middle of, then exit
+            self._stopping = True
+            self._wake.set()
+            await self._flusher
+            self._flusher = None
+        await self.flush()
+
+    def stats(self) -> dict[str, float]:
+        """
+        Get the queue's counters.
+
+        Returns:
+            dict[str, float]: Queue depth, record counts and flush latencies.
+        """
+        return {
+            "depth": self.depth,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+            "avg_flush_ms": self.total_flush_ms / self.flushes if self.flushes else 0.0
+        }
+
+    def _record_flush(self, start: float, written: int) -> None:
+        elapsed = (time.perf_counter() - start) * 1000
+        self.flushes += 1
+        self.written += written
+        self.last_flush_ms = elapsed
+        self.max_flush_ms = max(self.max_flush_ms, elapsed)
+        self.total_flush_ms += elapsed
+
+    def _requeue(self, batch: list[dict]) -> None:
+        self._buffer[:0] = batch
+        overflow = len(self._buffer) - self.max_size
+        if overflow > 0:
+            # Keep the oldest records; the newest ones past the cap are lost
+            del self._buffer[self.max_size:]
+            self.failed += overflow
+            logger.error("%s queue is full while flushes fail, %d record(s) dropped.", self.collection.name, overflow)
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._stopping = False
+            self._flusher = asyncio.create_task(self._run_flusher())
+
+    async def _run_flusher(self) -> None:
+        set_origin("ledger flush")
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            try:
+                await self.flush()
+            except PyMongoError:
+                # Already requeued and logged; try again on the next tick
+                pass
+
+transaction_ledger = LedgerQueue(transactions)
+gambling_ledger = LedgerQueue(gambling_history)
+
+register_gauge("bot_transaction_ledger", "Counters of the transaction ledger queue, including its depth and flush latency.", transaction_ledger.stats, label="stat")
+register_gauge("bot_gambling_ledger", "Counters of the gambling history ledger queue, including its depth and flush latency.", gambling_ledger.stats, label="stat")
+
+#endregion
+
+#region Shutdown
+
+async def drain_all() -> None:
+    """Write out every queued ledger record. Called on shutdown by both the gateway bot and the HTTP server."""
+    for ledger in (transaction_ledger, gambling_ledger):
+        try:
+            await ledger.drain()
+        except PyMongoError as e:
+            logger.error("Could not drain %s, %d record(s) lost: %s", ledger.collection.name, ledger.depth, e)
+
+@loader.listener(hikari.StoppingEvent)
+async def drain_ledgers(_: hikari.StoppingEvent) -> None:
+    """Write out every queued ledger record before the bot disconnects."""
+    await drain_all()
+
+#endregion
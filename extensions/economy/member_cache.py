@@ -0,0 +1,203 @@
+"""
+A per-process read-through cache of member documents.
+
+The cache lives in one process's memory, and `invalidate` only drops that process's entry. When the bot
+runs as several processes (shard workers from launcher.py, or gateway and HTTP interaction servers), a
+write in one process is not seen by the others until their entry expires, so balances would be stale for
+up to the TTL. MEMBER_CACHE_TTL therefore defaults to 0 in that case, which turns the cache off; setting it
+explicitly accepts that staleness in exchange for fewer reads.
+"""
+#region Imports
+import copy
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable
+
+import lightbulb
+
+import sharding
+from metrics import register_gauge
+#endregion
+
+loader = lightbulb.Loader()
+
+#region Configuration
+MEMBER_CACHE_SIZE = int(os.getenv("MEMBER_CACHE_SIZE", "10000"))  # Maximum number of cached member documents
+MEMBER_CACHE_TTL = float(os.getenv("MEMBER_CACHE_TTL", "0" if sharding.is_multi_process() else "30"))  # Seconds a cached document stays valid, 0 to turn the cache off
+#endregion
+
+#region Member Cache
+
+class MemberCache:
+    """
+    A read-through TTL/LRU cache of member documents keyed by user ID.
+
+    Entries may hold a whole document or only the fields of projected fetches; a lookup
+    for a set of fields hits when the entry already holds all of them, and loading more
+    fields merges them into the entry.
+
+    Every helper that writes to a member document must call `invalidate` afterwards.
+    A per-user generation counter stops a read that started before a write from
+    putting the pre-write document back into the cache. Callers always get their own
+    deep copy, so mutating a returned document never changes the cached one.
+    """
+
+    def __init__(self, max_entries: int = MEMBER_CACHE_SIZE, ttl: float = MEMBER_CACHE_TTL) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        # user_id -> (expires_at, cached fields or None for a whole document, document)
+        self._entries: OrderedDict[str, tuple[float, frozenset[str] | None, dict]] = OrderedDict()
+        self._generations: dict[str, int] = {}
+        self._epoch = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: str, fields: Iterable[str] | None = None) -> dict | None:
+        """
+        Get a cached member document if it is present, fresh and holds the requested fields.
+
+        Args:
+            user_id (str): The ID of the user.
+            fields (Iterable[str] | None): The fields the caller needs, or None for the whole document.
+
+        Returns:
+            dict | None: A copy of the cached document, or None on a miss.
+        """
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, cached_fields, document = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            self.misses += 1
+            return None
+
+        if cached_fields is not None and (fields is None or not cached_fields.issuperset(fields)):
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return copy.deepcopy(document)
+
+    def put(self, user_id: str, document: dict, fields: Iterable[str] | None = None) -> None:
+        """
+        Store a member document, evicting the least recently used entry if the cache is full.
+
+        Args:
+            user_id (str): The ID of the user.
+            document (dict): The member document, or the projected part of it.
+            fields (Iterable[str] | None): The fields the document was projected to, or None if it is whole.
+        """
+        if self.ttl <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl
+        fields = frozenset(fields) if fields is not None else None
+
+        existing = self._entries.get(user_id)
+        if fields is not None and existing is not None and existing[0] >= time.monotonic():
+            # Merge with what is already cached; keep the older expiry so no field outlives the TTL
+            old_expires_at, old_fields, old_document = existing
+            expires_at = min(expires_at, old_expires_at)
+            document = {**old_document, **document}
+            fields = None if old_fields is None else old_fields | fields
+
+        self._entries[user_id] = (expires_at, fields, document)
+        self._entries.move_to_end(user_id)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: str) -> None:
+        """
+        Drop a member's cached document after a write.
+
+        Args:
+            user_id (str): The ID of the user.
+        """
+        self._entries.pop(user_id, None)
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        self.invalidations += 1
+
+        # Generations only matter while a read is in flight, keep the map from growing without bound.
+        # Bumping the epoch makes every in-flight read discard its result, as after clear().
+        if len(self._generations) > self.max_entries * 2:
+            self._generations.clear()
+            self._epoch += 1
+
+    def clear(self) -> None:
+        """Drop every cached document, e.g. after a bulk update touching many members."""
+        self._entries.clear()
+        self._generations.clear()
+        self._epoch += 1
+        self.invalidations += 1
+
+    async def get_or_load(
+            self,
+            user_id: str,
+            load: Callable[[], Awaitable[dict | None]],
+            fields: Iterable[str] | None = None
+    ) -> dict | None:
+        """
+        Get a member document from the cache, loading and caching it on a miss.
+
+        Args:
+            user_id (str): The ID of the user.
+            load (Callable[[], Awaitable[dict | None]]): Fetches the document (projected to `fields`) from the database.
+            fields (Iterable[str] | None): The fields the caller needs, or None for the whole document.
+
+        Returns:
+            dict | None: The member document, or None if the member does not exist.
+        """
+        if self.ttl <= 0:
+            return await load()
+
+        document = self.get(user_id, fields)
+        if document is not None:
+            return document
+
+        generation = (self._epoch, self._generations.get(user_id, 0))
+        document = await load()
+
+        if document is not None and (self._epoch, self._generations.get(user_id, 0)) == generation:
+            self.put(user_id, document, fields)
+            return copy.deepcopy(document)
+
+        return document
+
+    def stats(self) -> dict[str, float]:
+        """
+        Get the cache's counters.
+
+        Returns:
+            dict[str, float]: Size, hit/miss counts and hit rate.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+member_cache = MemberCache()
+
+register_gauge("bot_member_cache", "Counters of the member balance cache, including its hit rate.", member_cache.stats, label="stat")
+
+#endregion
@@ -1,16 +1,24 @@
 #region Imports
+import logging
 import os
+import time
+from collections import Counter
+from datetime import datetime, timezone
 from functools import total_ordering
 
 import hikari
 import lightbulb
+from pymongo import DESCENDING, ReturnDocument
 
-from database import members, guilds, bot_messages
+import sharding
+from database import emote_counters, guilds, bot_messages
 from hooks import fail_if_not_admin_or_owner
+from metrics import register_gauge
 #endregion
 
 #region Loader and Command Group Setup
 loader = lightbulb.Loader()
+logger = logging.getLogger(__name__)
 leaderboard = lightbulb.Group("leaderboard", "Emote leaderboard group")
 emoji = leaderboard.subgroup("emoji", "Emoji related commands")
 #endregion
@@ -65,51 +73,6 @@ def check_milestone(old_count: int, new_count: int) -> tuple[str, int] | None:
             return title, milestone
     return None
 
-async def update_user_rank(user_id: str, guild_id: int, emoji_id: int | str, count: int) -> None:
-    """
-    Update the user's rank based on their emoji count.
-
-    Args:
-        user_id (str): The ID of the user.
-        guild_id (int): The ID of the guild.
-        emoji_id (int | str): The ID or name of the emoji.
-        count (int): The emoji count.
-    """
-    account = members.find_one({"id": user_id})
-    if not account:
-        return
-
-    emote_rank = account.get("emote_rank", [])
-
-    if not isinstance(emote_rank, list):
-        emote_rank = []
-
-    rank_info = get_rank_for_count(count)
-
-    found = False
-    for entry in emote_rank:
-        if entry.get('guild_id') == str(guild_id) and entry.get("emoji_id") == emoji_id:
-            if rank_info:
-                entry["rank_title"] = rank_info[0]
-                entry["rank_threshold"] = rank_info[1]
-            else:
-                entry["rank_title"] = "Unranked"
-                entry["rank_threshold"] = 0
-            found = True
-            break
-
-    if not found:
-        emote_rank.append({
-            "guild_id": str(guild_id),
-            "emoji_id": emoji_id,
-            "rank_title": rank_info[0] if rank_info else "Unranked",
-            "rank_threshold": rank_info[1] if rank_info else 0
-        })
-
-    members.update_one(
-        {"id": user_id},
-        {"$set": {"emote_rank": emote_rank}}
-    )
 #endregion
 
 #region Tracked Emoji Utility Functions
@@ -123,7 +86,7 @@ async def get_guild_tracked_emoji(guild_id: int) -> int | str | None:
     Returns:
         int | str | None: The emoji ID (custom) or name (unicode), OR None if not set.
     """
-    guild_config = guilds.find_one({"guild_id": str(guild_id)})
+    guild_config = await guilds.find_one({"guild_id": str(guild_id)})
 
     if not guild_config:
         return None
@@ -140,63 +103,112 @@ async def set_guild_tracked_emoji(guild_id: int, emoji: int | str) -> None:
         guild_id (int): The ID of the guild to set.
         emoji (int | str): The emoji ID (custom) or name (unicode) to set.
     """
-    guilds.update_one(
+    await guilds.update_one(
         {"guild_id": str(guild_id)},
         {"$set": {"tracked_emoji": emoji}},
         upsert=True
     )
 #endregion
 
-#region Emoji Count Functions
+#region Cache Lookups
+
+# The reaction listener runs for every reaction in every guild, so it reads hikari's cache first. With
+# the lean cache profile (cache_profile.py) guild emojis and the most recent messages are cached.
+cache_lookups: Counter[str] = Counter()  # e.g. "message_hit", "message_miss"
+
+# Only gateway processes receive reactions
+if sharding.serves_events():
+    register_gauge(
+        "bot_reaction_cache_lookups_total", "hikari cache lookups made by the emote leaderboard's reaction listener.",
+        lambda: dict(cache_lookups), label="lookup", type="counter"
+    )
 
-async def increment_emoji_count(guild_id: int, emoji_id: int, user_to_increment: hikari.User) -> tuple[int, int]:
+async def get_guild_emoji(app: hikari.GatewayBot, guild_id: int, emoji_id: int) -> hikari.KnownCustomEmoji:
     """
-    Increment the count of an emoji in the database.
+    Get a custom emoji of a guild from the cache, or from Discord on a cache miss, which raises
+    hikari.NotFoundError if the emoji is not one of the guild's.
 
     Args:
-        guild_id (int): The ID of the guild where the emoji was used.
-        emoji_id (int): The ID of the emoji to increment.
-        user_to_increment (hikari.User): The user whose emoji count is being incremented.
-    """
+        app (hikari.GatewayBot): The bot.
+        guild_id (int): The ID of the guild the emoji must belong to.
+        emoji_id (int): The ID of the emoji.
 
-    account = members.find_one({"id": str(user_to_increment.id)})
+    Returns:
+        hikari.KnownCustomEmoji: The emoji.
+    """
+    emoji = app.cache.get_emoji(emoji_id)
+    if emoji is None or emoji.guild_id != guild_id:
+        cache_lookups["emoji_miss"] += 1
+        return await app.rest.fetch_emoji(guild_id, emoji_id)
+    cache_lookups["emoji_hit"] += 1
+    return emoji
+
+async def get_message(app: hikari.GatewayBot, channel_id: int, message_id: int) -> hikari.Message:
+    """
+    Get a message from the cache, or from Discord if it is older than the cached messages.
 
-    if not account:
-        raise ValueError("User not found in the database despite getting an emote.")
+    Args:
+        app (hikari.GatewayBot): The bot.
+        channel_id (int): The ID of the channel the message is in.
+        message_id (int): The ID of the message.
 
-    # Increment the emoji count for the user in the database
-    emote_count = account.get("emote_count", [])
+    Returns:
+        hikari.Message: The message.
+    """
+    message = app.cache.get_message(message_id)
+    if message is None:
+        cache_lookups["message_miss"] += 1
+        return await app.rest.fetch_message(channel_id, message_id)
+    cache_lookups["message_hit"] += 1
+    return message
+
+async def get_user(app: hikari.GatewayBot, user_id: int) -> hikari.User:
+    """
+    Get a user from the cache, or from Discord on a cache miss.
 
-    if not isinstance(emote_count, list):
-        emote_count = []
+    Args:
+        app (hikari.GatewayBot): The bot.
+        user_id (int): The ID of the user.
 
-    old_count = 0
+    Returns:
+        hikari.User: The user.
+    """
+    user = app.cache.get_user(user_id)
+    if user is None:
+        cache_lookups["user_miss"] += 1
+        return await app.rest.fetch_user(user_id)
+    cache_lookups["user_hit"] += 1
+    return user
 
-    found = False
-    for entry in emote_count:
-        if entry["emoji_id"] == emoji_id:
-            old_count = entry["count"]
-            entry["count"] += 1
-            found = True
-            break
+#endregion
 
-    if not found:
-        emote_count.append({
-            "guild_id": str(guild_id),
-            "emoji_id": emoji_id,
-            "count": 1
-        })
+#region Emoji Count Functions
 
-    members.update_one(
-        {"id": str(user_to_increment.id)},
-        {"$set": {"emote_count": emote_count}}
-    )
+async def increment_emoji_count(guild_id: int, emoji_id: int | str, user_to_increment: hikari.User) -> tuple[int, int]:
+    """
+    Increment a user's count of an emoji in a guild with a single atomic upsert.
 
-    new_count = old_count + 1
+    Args:
+        guild_id (int): The ID of the guild where the emoji was used.
+        emoji_id (int | str): The ID (custom) or name (unicode) of the emoji to increment.
+        user_to_increment (hikari.User): The user whose emoji count is being incremented.
 
-    await update_user_rank(str(user_to_increment.id), guild_id, emoji_id, new_count)
+    Returns:
+        tuple[int, int]: The count before and after the increment.
+    """
+    counter = await emote_counters.find_one_and_update(
+        {"guild_id": str(guild_id), "emoji_id": emoji_id, "user_id": str(user_to_increment.id)},
+        {
+            "$inc": {"count": 1},
+            "$set": {"updated_at": datetime.now(timezone.utc)}
+        },
+        projection={"_id": 0, "count": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
 
-    return old_count, new_count
+    new_count = counter["count"]
+    return new_count - 1, new_count
 
 # Emote counter
 @loader.listener(hikari.GuildReactionAddEvent)
@@ -206,6 +218,7 @@ async def emote_counter(event: hikari.GuildReactionAddEvent) -> None:
     if event.member.is_bot:
         return
 
+    start = time.perf_counter()
     try:
         tracked_emoji = await get_guild_tracked_emoji(event.guild_id)
 
@@ -216,22 +229,22 @@ async def emote_counter(event: hikari.GuildReactionAddEvent) -> None:
         emoji_display = None
 
         if event.emoji_id:
-            emoji = await event.app.rest.fetch_emoji(event.guild_id, event.emoji_id)
+            emoji = await get_guild_emoji(event.app, event.guild_id, event.emoji_id)
             emoji_identifier = emoji.id
             emoji_display = f"<:{emoji.name}:{emoji.id}>"
             await event.app.rest.add_reaction(event.channel_id, event.message_id, emoji=emoji.name, emoji_id=emoji_identifier)
-            print(f"Custom Emoji: {emoji.name} (ID: {emoji.id})")
+            logger.debug("Custom emoji %s (ID: %s)", emoji.name, emoji.id, extra={"guild": event.guild_id})
 
         else:
             emoji_identifier = event.emoji_name
             emoji_display = emoji_identifier
             await event.app.rest.add_reaction(event.channel_id, event.message_id, emoji_identifier)
-            print(f"Unicode Emoji: {emoji_identifier}")
+            logger.debug("Unicode emoji %s", emoji_identifier, extra={"guild": event.guild_id})
 
         if emoji_identifier != tracked_emoji:
             return
 
-        message = await event.app.rest.fetch_message(event.channel_id, event.message_id)
+        message = await get_message(event.app, event.channel_id, event.message_id)
 
         if message.author.id == event.member.id:
             return
@@ -239,7 +252,7 @@ async def emote_counter(event: hikari.GuildReactionAddEvent) -> None:
         user_to_credit = None
 
         if message.author.is_bot:
-            bot_content = bot_messages.find_one({
+            bot_content = await bot_messages.find_one({
                 "message_id": str(message.id),
                 "guild_id": str(event.guild_id)
             })
@@ -247,8 +260,8 @@ async def emote_counter(event: hikari.GuildReactionAddEvent) -> None:
             if bot_content:
                 creator_id = bot_content["creator_id"]
                 try:
-                    user_to_credit = await event.app.rest.fetch_user(int(creator_id))
-                    print(f"Attributing emote to bot command creator: {user_to_credit.username}")
+                    user_to_credit = await get_user(event.app, int(creator_id))
+                    logger.debug("Attributing emote to bot command creator %s", user_to_credit.username, extra={"guild": event.guild_id, "user": user_to_credit.id})
                 except hikari.NotFoundError:
                     return
             else:
@@ -257,7 +270,10 @@ async def emote_counter(event: hikari.GuildReactionAddEvent) -> None:
             user_to_credit = message.author
 
         old_count, new_count = await increment_emoji_count(event.guild_id, emoji_identifier, user_to_credit)
-        print(f"Incremented {emoji_identifier} for user {user_to_credit.username} in guild {event.guild_id}")
+        logger.debug(
+            "Incremented %s to %d", emoji_identifier, new_count,
+            extra={"guild": event.guild_id, "user": user_to_credit.id, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+        )
 
         milestone = check_milestone(old_count, new_count)
 
@@ -298,14 +314,14 @@ async def emote_counter(event: hikari.GuildReactionAddEvent) -> None:
                 channel=event.channel_id,
                 embed=embed
             )
-            print(f"Milestone notification sent: {rank_title} for {user_to_credit.username}")
+            logger.info("Milestone notification sent: %s for %s", rank_title, user_to_credit.username, extra={"guild": event.guild_id, "user": user_to_credit.id})
 
     except hikari.NotFoundError:
-        print("Emoji not found.")
+        logger.debug("Emoji or message not found", extra={"guild": event.guild_id})
         return
 
-    except Exception as e:
-        print(f"Error in emote_counter: {e}")
+    except Exception:
+        logger.exception("Error in emote_counter", extra={"guild": event.guild_id})
         return
 
 #endregion
@@ -389,40 +405,30 @@ class ViewLeaderboard(
 
         user_counts = []
 
-        for member_doc in members.find({"emote_count": {"$exists": True, "$ne": []}}):
-            emote_counts = member_doc.get("emote_count", [])
-            emote_rank = member_doc.get("emote_rank", [])
-
-            for entry in emote_counts:
-                if entry.get("guild_id") == str(ctx.guild_id) and entry.get("emoji_id") == tracked_emoji:
-                    rank_title = "Unranked"
-                    for rank_entry in emote_rank:
-                        if rank_entry.get("guild_id") == str(ctx.guild_id) and rank_entry.get("emoji_id") == tracked_emoji:
-                            rank_title = rank_entry.get("rank_title", "Member")
-                            break
-
-                    user_counts.append({
-                        "user_id": member_doc["id"],
-                        "username": member_doc.get("username", "Unknown"),
-                        "count": entry["count"],
-                        "rank_title": rank_title
-                    })
-                    break
+        top_counters = emote_counters.find(
+            {"guild_id": str(ctx.guild_id), "emoji_id": tracked_emoji},
+            {"_id": 0, "user_id": 1, "count": 1}
+        ).sort("count", DESCENDING).limit(10)
+
+        async for counter in top_counters:
+            rank_info = get_rank_for_count(counter["count"])
+            user_counts.append({
+                "user_id": counter["user_id"],
+                "count": counter["count"],
+                "rank_title": rank_info[0] if rank_info else "Unranked"
+            })
 
         if not user_counts:
             await ctx.respond("No emote data found for the tracked emoji.")
             return
 
-        user_counts.sort(key=lambda x: x["count"], reverse=True)
-        top_users = user_counts[:10]
-
         if isinstance(tracked_emoji, int):
             emoji_display = f"<:emoji:{tracked_emoji}>"
         else:
             emoji_display = tracked_emoji
 
         description_lines = []
-        for idx, user_data in enumerate(top_users, 1):
+        for idx, user_data in enumerate(user_counts, 1):
             medal = "🥇" if idx == 1 else "🥈" if idx == 2 else "🥉" if idx == 3 else f"**{idx}.**"
             description_lines.append(
                 f"{medal} <@{user_data['user_id']}> - {user_data['count']} reactions\n"
@@ -458,34 +464,20 @@ class CheckRank(
             await ctx.respond("No emoji is currently being tracked for the leaderboard in this server. An admin can set one with `/leaderboard setemoji`.", ephemeral=True)
             return
 
-        user_account = members.find_one({"id": str(ctx.user.id)})
+        counter_filter = {"guild_id": str(ctx.guild_id), "emoji_id": tracked_emoji}
 
-        if not user_account or "emote_count" not in user_account:
-            await ctx.respond("You don't have any emote data yet!", ephemeral=True)
-            return
-
-        user_count = 0
-        for entry in user_account.get("emote_count", []):
-            if entry.get("guild_id") == str(ctx.guild_id) and entry.get("emoji_id") == tracked_emoji:
-                user_count = entry["count"]
-                break
+        user_counter = await emote_counters.find_one(
+            {**counter_filter, "user_id": str(ctx.user.id)},
+            {"_id": 0, "count": 1}
+        )
+        user_count = user_counter["count"] if user_counter else 0
 
         if user_count == 0:
             await ctx.respond("You don't have any emote data yet!", ephemeral=True)
             return
 
-        higher_count = 0
-        total_users = 0
-
-        for member_doc in members.find({"emote_count": {"$exists": True, "$ne": []}}):
-            emote_counts = member_doc.get("emote_count", [])
-
-            for entry in emote_counts:
-                if entry.get("guild_id") == str(ctx.guild_id) and entry.get("emoji_id") == tracked_emoji:
-                    total_users += 1
-                    if entry["count"] > user_count:
-                        higher_count += 1
-                    break
+        higher_count = await emote_counters.count_documents({**counter_filter, "count": {"$gt": user_count}})
+        total_users = await emote_counters.count_documents(counter_filter)
 
         rank = higher_count + 1
 
@@ -0,0 +1,106 @@
+#region Imports
+import logging
+import os
+import time
+from collections import Counter
+
+import hikari
+import lightbulb
+
+import sharding
+from metrics import register_gauge
+#endregion
+
+loader = lightbulb.Loader(should_load_hook=sharding.serves_events)
+logger = logging.getLogger(__name__)
+
+#region Configuration
+THROUGHPUT_REPORT_INTERVAL = int(os.getenv("THROUGHPUT_REPORT_INTERVAL", "60"))  # Seconds between throughput reports, 0 to disable
+THROUGHPUT_TOP_EVENTS = 5  # Event types listed in each report
+#endregion
+
+#region Event Throughput
+
+class EventThroughput:
+    """
+    Counts the gateway dispatches this process receives, by event name and by shard.
+
+    It listens for `ShardPayloadEvent`, which hikari raises for every dispatch before building
+    the event models, so counting does not make hikari build events nothing else listens for.
+    """
+
+    def __init__(self) -> None:
+        self.started_at = time.monotonic()
+        self.total = 0
+        self.by_event: Counter[str] = Counter()
+        self.by_shard: Counter[int] = Counter()
+
+        # Totals at the last report, to work out the rate since then
+        self._window_start = self.started_at
+        self._window_total = 0
+        self._window_events: Counter[str] = Counter()
+
+    def record(self, event: hikari.ShardPayloadEvent) -> None:
+        """
+        Count one gateway dispatch.
+
+        Args:
+            event (hikari.ShardPayloadEvent): The raw dispatch.
+        """
+        self.total += 1
+        self.by_event[event.name] += 1
+        self.by_shard[event.shard.id] += 1
+
+    def report(self) -> str:
+        """
+        Summarise the events received since the last report and start a new window.
+
+        Returns:
+            str: The report line.
+        """
+        now = time.monotonic()
+        elapsed = max(now - self._window_start, 1e-9)
+        count = self.total - self._window_total
+        top = (self.by_event - self._window_events).most_common(THROUGHPUT_TOP_EVENTS)
+
+        self._window_start = now
+        self._window_total = self.total
+        self._window_events = self.by_event.copy()
+
+        events = ", ".join(f"{name} {n:,}" for name, n in top) or "none"
+        return f"[Throughput] {sharding.worker_label()}: {count:,} events in {elapsed:.0f}s ({count / elapsed:,.1f}/s); {events}"
+
+    def stats(self) -> dict[str, float]:
+        """
+        Get the counters since the process started.
+
+        Returns:
+            dict[str, float]: Total events, the average rate and the events received by each shard.
+        """
+        uptime = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            "events": self.total,
+            "events_per_second": round(self.total / uptime, 2),
+            **{f"shard_{shard_id}": n for shard_id, n in sorted(self.by_shard.items())}
+        }
+
+event_throughput = EventThroughput()
+
+# The HTTP interaction server imports this module without loading it
+if sharding.serves_events():
+    register_gauge("bot_gateway_events", "Gateway dispatches received since start, in total, per second and per shard.", event_throughput.stats, label="stat")
+
+#endregion
+
+#region Listeners
+
+@loader.listener(hikari.ShardPayloadEvent)
+async def on_shard_payload(event: hikari.ShardPayloadEvent) -> None:
+    event_throughput.record(event)
+
+if THROUGHPUT_REPORT_INTERVAL > 0:
+    @loader.task(lightbulb.uniformtrigger(seconds=THROUGHPUT_REPORT_INTERVAL, wait_first=True))
+    async def report_throughput() -> None:
+        logger.info(event_throughput.report())
+
+#endregion
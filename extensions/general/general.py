@@ -0,0 +1,97 @@
+#region Imports
+import asyncio
+import uuid
+from datetime import datetime
+
+import hikari
+import lightbulb
+
+import database
+import sharding
+from hooks import fail_if_not_admin_or_owner
+#endregion
+
+#region Loader Setup
+loader = lightbulb.Loader(should_load_hook=sharding.serves_commands)
+#endregion
+
+#region Commands - General
+
+@loader.command
+class Ping(
+    lightbulb.SlashCommand,
+    name = "ping",
+    description = "Check the bot's latency."
+):
+    @lightbulb.invoke
+    async def invoke(self, ctx: lightbulb.Context) -> None:
+        database_latency = await database.ping()
+
+        # Only a gateway connection has a heartbeat; over HTTP interactions, report the database round trip alone
+        if isinstance(ctx.client.app, hikari.GatewayBot):
+            latency = ctx.client.app.heartbeat_latency * 1000
+            await ctx.respond(f"Pong! Latency: {latency:.2f} ms (database {database_latency:.2f} ms)")
+        else:
+            await ctx.respond(f"Pong! Served over HTTP (database {database_latency:.2f} ms)")
+
+@loader.command
+class Announcement(
+    lightbulb.SlashCommand,
+    name = "announcement",
+    description = "Send an announcement to a specific channel.",
+    hooks = [fail_if_not_admin_or_owner]
+):
+
+    message = lightbulb.string("message", "Announcement message")
+    channel = lightbulb.channel("channel", "Channel to send the announcement to")
+    attachment = lightbulb.attachment("attachment", "Optional attachment for the announcement", default=None)
+
+    @lightbulb.invoke
+    async def invoke(self, ctx: lightbulb.Context) -> None:
+        channel = self.channel
+        message = self.message
+
+        embed = hikari.Embed(
+            title="Announcement!",
+            description=message,
+            color=0x00FF00,  # Green color
+            timestamp=datetime.now().astimezone()
+        )
+
+        try:
+            await ctx.client.rest.create_message(
+                channel=channel.id,
+                embed=embed
+            )
+            await ctx.respond(f"Announcement sent to {channel.mention}!", ephemeral= True)
+        except Exception as e:
+            await ctx.respond(f"Failed to send announcement: {str(e)}", ephemeral= True)
+
+#endregion
+
+#region Commands - Test
+
+class TestModal(lightbulb.components.Modal):
+    def __init__(self) -> None:
+        self.text = self.add_short_text_input("Enter text here")
+
+    async def on_submit(self, ctx: lightbulb.components.ModalContext) -> None:
+        await ctx.respond(f"You entered: {ctx.value_for(self.text)}", ephemeral=True)
+
+@loader.command
+class TestModalCommand(
+    lightbulb.SlashCommand,
+    name="testmodal",
+    description="Test modal command"
+):
+    @lightbulb.invoke
+    async def invoke(self, ctx: lightbulb.Context, client: lightbulb.Client) -> None:
+        modal = TestModal()
+
+        await ctx.respond_with_modal("test modal", c_id := str(uuid.uuid4()), components=modal)
+        try:
+            await modal.attach(client, c_id)
+        except asyncio.TimeoutError:
+            await ctx.respond("Modal timed out.", ephemeral=True)
+
+#endregion
@@ -0,0 +1,252 @@
+#region Imports
+import asyncio
+import logging
+import os
+import secrets
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone, timedelta
+
+import hikari
+import lightbulb
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+import sharding
+from database import members, guilds
+from extensions.members.member_util import known_members
+from extensions.members.provisioning import new_member_document
+from metrics import set_origin
+#endregion
+
+loader = lightbulb.Loader(should_load_hook=sharding.serves_events)
+logger = logging.getLogger(__name__)
+
+#region Configuration
+MEMBER_BACKFILL_BATCH = int(os.getenv("MEMBER_BACKFILL_BATCH", "1000"))  # Upserts per bulk_write
+MEMBER_BACKFILL_CONCURRENCY = int(os.getenv("MEMBER_BACKFILL_CONCURRENCY", "2"))  # Bulk writes in flight across all guilds
+MEMBER_BACKFILL_CHUNK_TIMEOUT = float(os.getenv("MEMBER_BACKFILL_CHUNK_TIMEOUT", "60"))  # Seconds to wait for the next chunk
+MEMBER_BACKFILL_MIN_INTERVAL = float(os.getenv("MEMBER_BACKFILL_MIN_INTERVAL", "3600"))  # Seconds before a finished guild is backfilled again
+MEMBER_BACKFILL_YIELD_EVERY = int(os.getenv("MEMBER_BACKFILL_YIELD_EVERY", "250"))  # Members turned into upserts between yields to the event loop
+#endregion
+
+#region Member Backfill
+
+@dataclass
+class BackfillRun:
+    """The progress of one guild's backfill."""
+    guild_id: int
+    nonce: str
+    watermark: datetime | None
+    started_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    chunks: asyncio.Queue = field(default_factory=asyncio.Queue)
+    chunk_count: int | None = None
+    chunks_received: int = 0
+    members_seen: int = 0
+    members_skipped: int = 0
+    members_created: int = 0
+    members_failed: int = 0
+
+class MemberBackfill:
+    """
+    Registers every member of a guild when it becomes available, using gateway member chunks.
+
+    Chunk events only queue their members, so the gateway listener returns immediately. A task per guild
+    turns them into `$setOnInsert` upserts written in batches of `batch_size`, with at most `concurrency`
+    bulk writes in flight across all guilds. It yields to the event loop every `yield_every` members while
+    building upserts, and after each batch, whose IDs are added to the known members in one call.
+
+    Each finished run stores its start time in the guild document as a watermark. The next run, after a
+    restart, only writes members who joined the guild after that watermark. A run that did not finish
+    leaves the watermark alone, so the next run covers everything again; upserts make that safe. So does a
+    run in which any member failed to be written.
+    """
+
+    def __init__(
+            self,
+            batch_size: int = MEMBER_BACKFILL_BATCH,
+            concurrency: int = MEMBER_BACKFILL_CONCURRENCY,
+            chunk_timeout: float = MEMBER_BACKFILL_CHUNK_TIMEOUT,
+            min_interval: float = MEMBER_BACKFILL_MIN_INTERVAL,
+            yield_every: int = MEMBER_BACKFILL_YIELD_EVERY
+    ) -> None:
+        self.batch_size = batch_size
+        self.yield_every = yield_every
+        self.chunk_timeout = chunk_timeout
+        self.min_interval = min_interval
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._runs: dict[str, BackfillRun] = {}
+        self._active_guilds: set[int] = set()
+        self._tasks: set[asyncio.Task] = set()
+
+    async def start(self, app: hikari.GatewayBotAware, guild_id: int) -> bool:
+        """
+        Start backfilling a guild unless it is already running or finished recently.
+
+        Args:
+            app (hikari.GatewayBotAware): The bot, used to request member chunks.
+            guild_id (int): The ID of the guild.
+
+        Returns:
+            bool: Whether a backfill was started.
+        """
+        if guild_id in self._active_guilds:
+            return False
+
+        guild_doc = await guilds.find_one({"guild_id": str(guild_id)}, {"_id": 0, "member_backfill": 1}) or {}
+        state = guild_doc.get("member_backfill") or {}
+
+        watermark = _as_utc(state.get("watermark"))
+        completed_at = _as_utc(state.get("completed_at"))
+        if completed_at and datetime.now(timezone.utc) - completed_at < timedelta(seconds=self.min_interval):
+            return False
+
+        run = BackfillRun(guild_id=guild_id, nonce=secrets.token_hex(8), watermark=watermark)
+        self._runs[run.nonce] = run
+        self._active_guilds.add(guild_id)
+
+        task = asyncio.create_task(self._run(app, run))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    def on_chunk(self, event: hikari.MemberChunkEvent) -> None:
+        """
+        Queue a member chunk for the run that requested it. Chunks requested by anything else are ignored.
+
+        Args:
+            event (hikari.MemberChunkEvent): The chunk event.
+        """
+        run = self._runs.get(event.nonce or "")
+        if run is not None:
+            run.chunk_count = event.chunk_count
+            run.chunks.put_nowait(list(event.members.values()))
+
+    async def _run(self, app: hikari.GatewayBotAware, run: BackfillRun) -> None:
+        set_origin("member backfill")
+        start = time.perf_counter()
+        resumed = f", members who joined after {run.watermark.isoformat()}" if run.watermark else ""
+        logger.info("Requesting members%s.", resumed, extra={"guild": run.guild_id})
+
+        try:
+            await app.request_guild_members(run.guild_id, nonce=run.nonce)
+
+            while run.chunk_count is None or run.chunks_received < run.chunk_count:
+                chunk = await asyncio.wait_for(run.chunks.get(), self.chunk_timeout)
+                run.chunks_received += 1
+                await self._process_chunk(run, chunk)
+
+            if run.members_failed:
+                logger.warning(
+                    "%d of %d members failed to register, will retry next time.", run.members_failed, run.members_seen,
+                    extra={"guild": run.guild_id}
+                )
+                return
+
+            await guilds.update_one(
+                {"guild_id": str(run.guild_id)},
+                {"$set": {"member_backfill": {
+                    "watermark": run.started_at,
+                    "completed_at": datetime.now(timezone.utc),
+                    "members_seen": run.members_seen,
+                    "members_created": run.members_created
+                }}},
+                upsert=True
+            )
+            logger.info(
+                "%d members in %d chunks, %d registered, %d skipped.",
+                run.members_seen, run.chunks_received, run.members_created, run.members_skipped,
+                extra={"guild": run.guild_id, "latency_ms": round((time.perf_counter() - start) * 1000)}
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Gave up after %d/%s chunks, will retry next time.", run.chunks_received, run.chunk_count, extra={"guild": run.guild_id})
+        except (hikari.HikariError, PyMongoError) as e:
+            logger.error("Failed after %d chunks: %s", run.chunks_received, e, extra={"guild": run.guild_id})
+        finally:
+            self._runs.pop(run.nonce, None)
+            self._active_guilds.discard(run.guild_id)
+
+    async def _process_chunk(self, run: BackfillRun, chunk: list[hikari.Member]) -> None:
+        user_ids = []
+        requests = []
+
+        for index, member in enumerate(chunk, 1):
+            run.members_seen += 1
+            joined_at = _as_utc(member.joined_at)
+            if member.is_bot or member.id in known_members or (run.watermark and joined_at and joined_at <= run.watermark):
+                run.members_skipped += 1
+            else:
+                user_ids.append(member.id)
+                requests.append(UpdateOne({"id": str(member.id)}, {"$setOnInsert": new_member_document(member)}, upsert=True))
+
+            if len(requests) >= self.batch_size:
+                await self._write_batch(run, user_ids, requests)
+                user_ids, requests = [], []
+            elif index % self.yield_every == 0:
+                # Let gateway events through while a large chunk is turned into upserts
+                await asyncio.sleep(0)
+
+        if requests:
+            await self._write_batch(run, user_ids, requests)
+
+    async def _write_batch(self, run: BackfillRun, user_ids: list[int], requests: list[UpdateOne]) -> None:
+        failed: set[int] = set()
+        async with self._semaphore:
+            try:
+                result = await members.bulk_write(requests, ordered=False)
+                run.members_created += len(result.upserted_ids)
+            except BulkWriteError as e:
+                run.members_created += len(e.details.get("upserted", []))
+                for error in e.details.get("writeErrors", []):
+                    # Duplicate keys mean another process registered the member first, which is fine
+                    if error.get("code") != 11000:
+                        failed.add(error["index"])
+                        logger.error(
+                            "Failed to register %s: %s", user_ids[error["index"]], error.get("errmsg"),
+                            extra={"guild": run.guild_id, "user": user_ids[error["index"]]}
+                        )
+
+        run.members_failed += len(failed)
+        known_members.add_many(user_id for index, user_id in enumerate(user_ids) if index not in failed)
+
+        # Let gateway events through between batches of a large guild
+        await asyncio.sleep(0)
+
+    def stats(self) -> dict[str, dict]:
+        """
+        Get the progress of every running backfill.
+
+        Returns:
+            dict[str, dict]: Per guild, the chunks received out of the total and the members registered so far.
+        """
+        return {
+            str(run.guild_id): {
+                "chunks": f"{run.chunks_received}/{run.chunk_count if run.chunk_count is not None else '?'}",
+                "members_seen": run.members_seen,
+                "members_created": run.members_created,
+                "members_failed": run.members_failed
+            } for run in self._runs.values()
+        }
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    # MongoDB hands back naive UTC datetimes
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+member_backfill = MemberBackfill()
+
+#endregion
+
+#region Listeners
+
+@loader.listener(hikari.GuildAvailableEvent)
+async def on_guild_available(event: hikari.GuildAvailableEvent) -> None:
+    await member_backfill.start(event.app, event.guild_id)
+
+@loader.listener(hikari.MemberChunkEvent)
+async def on_member_chunk(event: hikari.MemberChunkEvent) -> None:
+    member_backfill.on_chunk(event)
+
+#endregion
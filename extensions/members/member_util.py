@@ -0,0 +1,268 @@
+#region Imports
+import asyncio
+import heapq
+import logging
+import os
+import time
+from array import array
+from bisect import bisect_left
+from typing import Iterable
+
+import hikari
+import lightbulb
+
+import sharding
+from database import members
+from metrics import register_gauge, set_origin
+#endregion
+
+loader = lightbulb.Loader(should_load_hook=sharding.serves_events)
+logger = logging.getLogger(__name__)
+
+#region Configuration
+KNOWN_MEMBERS_MERGE_THRESHOLD = int(os.getenv("KNOWN_MEMBERS_MERGE_THRESHOLD", "4096"))  # Recent ids kept in a set before merging
+KNOWN_MEMBERS_WARM_BATCH = int(os.getenv("KNOWN_MEMBERS_WARM_BATCH", "10000"))  # Ids fetched per cursor batch while warming
+#endregion
+
+#region Known Members
+
+def merge_sorted_runs(*runs: Iterable[int]) -> array:
+    """
+    Merge sorted runs of IDs into one sorted array without duplicates.
+
+    Used to warm up, where every run is large. Runs in a worker thread: the merge is plain Python,
+    so the thread gives up the GIL every few milliseconds and the event loop keeps running.
+
+    Args:
+        *runs (Iterable[int]): Sorted runs of IDs.
+
+    Returns:
+        array: The merged IDs.
+    """
+    merged = array("Q")
+    append = merged.append
+    previous = None
+    for user_id in heapq.merge(*runs):
+        if user_id != previous:
+            append(user_id)
+            previous = user_id
+    return merged
+
+def insert_sorted(sorted_ids: array, new_ids: list[int]) -> array:
+    """
+    Insert a few sorted IDs into a large sorted array, skipping IDs it already holds.
+
+    Each new ID costs one binary search, and the spans of the array between them are copied as slices,
+    so the work done in Python grows with the number of new IDs rather than the size of the array.
+
+    Args:
+        sorted_ids (array): The sorted IDs.
+        new_ids (list[int]): Sorted IDs to insert.
+
+    Returns:
+        array: A new array holding both.
+    """
+    merged = array("Q")
+    start = 0
+    for user_id in new_ids:
+        index = bisect_left(sorted_ids, user_id, start)
+        merged += sorted_ids[start:index]
+        if index == len(sorted_ids) or sorted_ids[index] != user_id:
+            merged.append(user_id)
+        start = index
+    merged += sorted_ids[start:]
+    return merged
+
+class KnownMembers:
+    """
+    An exact, compact set of the user IDs that already have a member document.
+
+    Warmed once at startup from a streamed `id` projection. IDs are kept as a sorted array of
+    unsigned 64-bit integers (8 bytes each, looked up by binary search), plus a small set of
+    IDs added since the last merge. Unlike a bloom filter it never reports a member that is not
+    registered, so a positive lookup can always skip the database.
+
+    Merging the recent IDs into the array touches the whole array, so it is done in a worker thread
+    and the new array swapped in when it is ready. IDs being merged stay in their own set until then,
+    and IDs added meanwhile wait for the next merge. Outside a running event loop the merge is inline.
+    """
+
+    def __init__(self, merge_threshold: int = KNOWN_MEMBERS_MERGE_THRESHOLD) -> None:
+        self.merge_threshold = merge_threshold
+        self.warmed = False
+
+        self._sorted = array("Q")
+        self._recent: set[int] = set()
+        self._merging: set[int] = set()  # IDs a worker thread is merging into _sorted
+        self._merge_lock = asyncio.Lock()  # Held while _sorted is rebuilt, by a merge or a warm-up
+        self._merge_task: asyncio.Task | None = None
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.merges = 0
+        self.merge_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._sorted) + len(self._merging) + len(self._recent)
+
+    def _lookup(self, user_id: int) -> bool:
+        if user_id in self._recent or user_id in self._merging:
+            return True
+        index = bisect_left(self._sorted, user_id)
+        return index < len(self._sorted) and self._sorted[index] == user_id
+
+    def __contains__(self, user_id: int | str) -> bool:
+        found = self._lookup(int(user_id))
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found
+
+    def add(self, user_id: int | str) -> None:
+        """
+        Record that a user has a member document.
+
+        Args:
+            user_id (int | str): The ID of the user.
+        """
+        user_id = int(user_id)
+        if self._lookup(user_id):
+            return
+        self._recent.add(user_id)
+        if len(self._recent) >= self.merge_threshold:
+            self._start_merge()
+
+    def add_many(self, user_ids: Iterable[int | str]) -> None:
+        """
+        Record that several users have member documents, starting at most one merge.
+
+        Args:
+            user_ids (Iterable[int | str]): The IDs of the users.
+        """
+        for user_id in user_ids:
+            user_id = int(user_id)
+            if not self._lookup(user_id):
+                self._recent.add(user_id)
+        if len(self._recent) >= self.merge_threshold:
+            self._start_merge()
+
+    def _start_merge(self) -> None:
+        if self._merge_task is not None and not self._merge_task.done():
+            return  # The running merge starts another when it finishes if enough IDs have piled up
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._sorted = insert_sorted(self._sorted, sorted(self._recent))
+            self._recent = set()
+            self.merges += 1
+            return
+        self._merge_task = loop.create_task(self._merge())
+
+    async def _merge(self) -> None:
+        async with self._merge_lock:
+            if not self._recent:
+                return
+            start = time.perf_counter()
+            self._merging, self._recent = self._recent, set()
+            try:
+                merged = await asyncio.to_thread(insert_sorted, self._sorted, sorted(self._merging))
+            except BaseException:
+                # Nothing is lost; the IDs wait for the next merge
+                self._recent |= self._merging
+                self._merging = set()
+                raise
+            self._sorted, self._merging = merged, set()
+            self.merges += 1
+            self.merge_seconds += time.perf_counter() - start
+
+        if len(self._recent) >= self.merge_threshold:
+            self._merge_task = asyncio.get_running_loop().create_task(self._merge())
+
+    async def warm(self, batch_size: int = KNOWN_MEMBERS_WARM_BATCH) -> int:
+        """
+        Load every registered member ID, streaming them so only one cursor batch is decoded at a time.
+        Each batch is sorted as it arrives and the sorted runs are merged in a worker thread, so no step
+        holds the event loop for more than one batch. IDs added while warming are kept.
+
+        Args:
+            batch_size (int): The number of IDs fetched per cursor batch.
+
+        Returns:
+            int: The number of IDs loaded from the database.
+        """
+        runs: list[array] = []
+        batch = array("Q")
+        count = 0
+        async for member_doc in members.find({}, {"_id": 0, "id": 1}, batch_size=batch_size):
+            try:
+                batch.append(int(member_doc["id"]))
+            except (KeyError, TypeError, ValueError, OverflowError):
+                continue
+            if len(batch) >= batch_size:
+                runs.append(array("Q", sorted(batch)))
+                count += len(batch)
+                batch = array("Q")
+        runs.append(array("Q", sorted(batch)))
+        count += len(batch)
+
+        async with self._merge_lock:
+            self._merging, self._recent = self._recent, set()
+            try:
+                merged = await asyncio.to_thread(merge_sorted_runs, self._sorted, sorted(self._merging), *runs)
+            except BaseException:
+                self._recent |= self._merging
+                self._merging = set()
+                raise
+            self._sorted, self._merging = merged, set()
+
+        self.warmed = True
+        return count
+
+    def stats(self) -> dict[str, float]:
+        """
+        Get the set's size and lookup counters.
+
+        Returns:
+            dict[str, float]: Size, memory, hits, misses, merge count and seconds spent merging.
+        """
+        return {
+            "size": len(self),
+            "bytes": self._sorted.itemsize * len(self._sorted),
+            "hits": self.hits,
+            "misses": self.misses,
+            "merges": self.merges,
+            "merge_seconds": self.merge_seconds,
+            "warmed": self.warmed
+        }
+
+known_members = KnownMembers()
+
+# The HTTP interaction server imports this module without loading it
+if sharding.serves_events():
+    register_gauge("bot_known_members", "Counters of the known member set used to skip provisioning lookups.", known_members.stats, label="stat")
+
+#endregion
+
+#region Warm-up
+
+_warm_task: asyncio.Task | None = None
+
+async def _warm_known_members() -> None:
+    set_origin("known members warm-up")
+    start = time.perf_counter()
+    try:
+        count = await known_members.warm()
+        logger.info("Known member set warmed with %d ids in %.2fs.", count, time.perf_counter() - start)
+    except Exception as e:
+        # Lookups keep falling back to the database until a warm-up succeeds
+        logger.warning("Failed to warm the known member set: %s", e)
+
+@loader.listener(hikari.StartedEvent)
+async def warm_known_members(_: hikari.StartedEvent) -> None:
+    global _warm_task
+    # Warm in the background so a large members collection does not hold up startup
+    _warm_task = asyncio.create_task(_warm_known_members())
+
+#endregion
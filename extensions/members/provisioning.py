@@ -0,0 +1,206 @@
+#region Imports
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+
+import hikari
+import lightbulb
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+
+import sharding
+from database import members
+from extensions.members.member_util import known_members
+from metrics import set_origin
+#endregion
+
+loader = lightbulb.Loader(should_load_hook=sharding.serves_events)
+logger = logging.getLogger(__name__)
+
+#region Configuration
+MEMBER_PROVISION_BATCH = int(os.getenv("MEMBER_PROVISION_BATCH", "500"))  # Most new members written in one bulk_write
+MEMBER_PROVISION_WINDOW = float(os.getenv("MEMBER_PROVISION_WINDOW", "0.05"))  # Seconds to gather new members before writing
+#endregion
+
+#region Member Documents
+
+def new_member_document(member: hikari.User) -> dict:
+    """
+    Build the fields a new member document starts with. The ID is not included;
+    it comes from the upsert filter.
+
+    Args:
+        member (hikari.User): The user or guild member being registered.
+
+    Returns:
+        dict: The new member's fields.
+    """
+    return {
+        "username": member.username,
+        "display_name": member.display_name,
+        "cash": 1000,  # Default starting cash (cash name customizable)
+        "bank": 0,  # Default starting bank balance
+        "total_debt": 0, # Total debt amount
+        "credit_score": 500, # Credit score
+        "wins": 0, # Wins in gambling
+        "losses": 0, # Losses in gambling
+        "trophies": [], # List of trophies
+        "joined_at": datetime.now(timezone.utc),
+        "created_at": member.created_at
+    }
+
+#endregion
+
+#region Member Provisioner
+
+class MemberProvisioner:
+    """
+    Registers members with idempotent `$setOnInsert` upserts, so a member that already exists is never
+    overwritten and two handlers racing on the same member cannot insert it twice.
+
+    New members that arrive within `window` seconds of each other, as in a raid or mass join,
+    are written together in one unordered `bulk_write` of up to `batch_size` upserts. A lone
+    new member is written with a single `update_one`. Concurrent calls for the same member share one write.
+    """
+
+    def __init__(self, batch_size: int = MEMBER_PROVISION_BATCH, window: float = MEMBER_PROVISION_WINDOW) -> None:
+        self.batch_size = batch_size
+        self.window = window
+
+        # user_id -> (new member fields, future resolved with whether the member was created)
+        self._pending: dict[str, tuple[dict, asyncio.Future]] = {}
+        self._timer: asyncio.Task | None = None
+
+        # Counters
+        self.created = 0
+        self.existing = 0
+        self.writes = 0
+
+    async def ensure(self, member: hikari.User) -> bool:
+        """
+        Make sure a member document exists for the user.
+
+        Args:
+            member (hikari.User): The user or guild member.
+
+        Returns:
+            bool: True if this call created the member document, False if it already existed.
+        """
+        if member.id in known_members:
+            return False
+
+        user_id = str(member.id)
+        if user_id in self._pending:
+            future = self._pending[user_id][1]
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[user_id] = (new_member_document(member), future)
+
+            if len(self._pending) >= self.batch_size:
+                await self.flush()
+            elif self._timer is None:
+                self._timer = asyncio.create_task(self._flush_later())
+
+        # Shielded so a cancelled listener does not cancel the result other callers are waiting on
+        return await asyncio.shield(future)
+
+    async def _flush_later(self) -> None:
+        set_origin("member provisioning")
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            # Even when cancelled, so the next pending member starts a new timer
+            self._timer = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Write every pending member in one round trip."""
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        user_ids = list(batch)
+        created: set[str] = set()
+        failed: set[str] = set()
+
+        try:
+            try:
+                if len(user_ids) == 1:
+                    user_id = user_ids[0]
+                    try:
+                        result = await members.update_one({"id": user_id}, {"$setOnInsert": batch[user_id][0]}, upsert=True)
+                        if result.upserted_id is not None:
+                            created.add(user_id)
+                    except DuplicateKeyError:
+                        # Another process registered the member between our filter match and insert
+                        pass
+                else:
+                    requests = [UpdateOne({"id": user_id}, {"$setOnInsert": batch[user_id][0]}, upsert=True) for user_id in user_ids]
+                    try:
+                        result = await members.bulk_write(requests, ordered=False)
+                        created.update(user_ids[index] for index in result.upserted_ids)
+                    except BulkWriteError as e:
+                        created.update(user_ids[upserted["index"]] for upserted in e.details.get("upserted", []))
+                        for error in e.details.get("writeErrors", []):
+                            if error.get("code") != 11000:
+                                failed.add(user_ids[error["index"]])
+                                logger.error("Failed to register %s: %s", user_ids[error['index']], error.get('errmsg'), extra={"user": user_ids[error['index']]})
+            finally:
+                self.writes += 1
+
+            for user_id, (_, future) in batch.items():
+                if user_id in failed:
+                    if not future.done():
+                        future.set_exception(PyMongoError(f"Failed to register member {user_id}."))
+                    continue
+
+                known_members.add(user_id)
+                if user_id in created:
+                    self.created += 1
+                else:
+                    self.existing += 1
+                if not future.done():
+                    future.set_result(user_id in created)
+        except PyMongoError as e:
+            logger.error("Failed to register %d member(s): %s", len(user_ids), e)
+            _reject(batch, e)
+        except BaseException as e:
+            # Cancelled mid-write, or failed in a way the driver does not report; callers must not wait forever
+            _reject(batch, e if isinstance(e, Exception) else None)
+            raise
+
+    def stats(self) -> dict[str, float]:
+        """
+        Get the provisioner's counters.
+
+        Returns:
+            dict[str, float]: Pending members, members created, members that already existed and writes issued.
+        """
+        return {
+            "pending": len(self._pending),
+            "created": self.created,
+            "existing": self.existing,
+            "writes": self.writes
+        }
+
+def _reject(batch: dict[str, tuple[dict, asyncio.Future]], error: Exception | None = None) -> None:
+    # Fail every caller still waiting on the batch; without an error they see the write cancelled
+    for _, future in batch.values():
+        if not future.done():
+            if error is None:
+                future.cancel()
+            else:
+                future.set_exception(error)
+
+member_provisioner = MemberProvisioner()
+
+#endregion
+
+#region Listeners
+
+@loader.listener(hikari.StoppingEvent)
+async def flush_pending_members(_: hikari.StoppingEvent) -> None:
+    await member_provisioner.flush()
+
+#endregion
@@ -3,19 +3,26 @@ import hikari
 import lightbulb
 
 import io
+import logging
 import aiohttp
+import sharding
 from database import bot_messages
-from PIL import Image, ImageDraw, ImageFont, ImageSequence
 from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+
+# Pillow is imported where images are drawn, so loading the extension does not pay for it
+if TYPE_CHECKING:
+    from PIL import Image, ImageDraw, ImageFont
 #endregion
 
 #region Loader and Group
-loader = lightbulb.Loader()
+loader = lightbulb.Loader(should_load_hook=sharding.serves_commands)
+logger = logging.getLogger(__name__)
 meme = lightbulb.Group("meme", "Joke commands")
 #endregion
 
 #region Text Functions
-def wrap_text(text: str, font: ImageFont.FreeTypeFont, max_width: int) -> list[str]:
+def wrap_text(text: str, font: "ImageFont.FreeTypeFont", max_width: int) -> list[str]:
     """
     Wrap text to fit within a max width.
 
@@ -51,10 +58,10 @@ def wrap_text(text: str, font: ImageFont.FreeTypeFont, max_width: int) -> list[s
     return lines
 
 def draw_text_with_outline(
-        draw: ImageDraw.ImageDraw,
+        draw: "ImageDraw.ImageDraw",
         position: tuple[int, int],
         text: str,
-        font: ImageFont.FreeTypeFont,
+        font: "ImageFont.FreeTypeFont",
         outline_width: int = 2,
 ) -> None:
     """
@@ -84,11 +91,11 @@ def draw_text_with_outline(
     draw.text(position, text, font=font, fill="white")
 
 def add_text_to_frame(
-        frame: Image.Image,
+        frame: "Image.Image",
         top_text: str,
         bottom_text: str,
-        font: ImageFont.FreeTypeFont
-) -> Image.Image:
+        font: "ImageFont.FreeTypeFont"
+) -> "Image.Image":
     """
     Add top and bottom text to a single image frame.
 
@@ -107,6 +114,8 @@ def add_text_to_frame(
     elif frame.mode != 'RGB' and frame.mode != 'RGBA':
         frame = frame.convert('RGB')
 
+    from PIL import ImageDraw
+
     width, height = frame.size
     draw = ImageDraw.ImageDraw(frame)
 
@@ -176,7 +185,7 @@ def add_text_to_frame(
 
     return frame
 
-def get_font(width: int, height: int) -> ImageFont.FreeTypeFont:
+def get_font(width: int, height: int) -> "ImageFont.FreeTypeFont":
     """
     Get an appropriate font based on image height.
 
@@ -186,6 +195,7 @@ def get_font(width: int, height: int) -> ImageFont.FreeTypeFont:
     Returns:
         ImageFont.FreeTypeFont: The loaded font.
     """
+    from PIL import ImageFont
 
     base_size = min(width, height)
 
@@ -257,6 +267,7 @@ def create_meme(
     Returns:
         tuple[io.BytesIO, str]: The generated meme as a BytesIO object and the format ('PNG' or 'GIF').
     """
+    from PIL import Image, ImageSequence
 
     image = Image.open(io.BytesIO(image_data))
 
@@ -361,7 +372,7 @@ class MakeMeme(
 
             message = await ctx.client.app.rest.fetch_message(ctx.channel_id, response)
 
-            bot_messages.insert_one({
+            await bot_messages.insert_one({
                 "message_id": str(message.id),
                 "channel_id": str(ctx.channel_id),
                 "guild_id": str(ctx.guild_id),
@@ -370,13 +381,13 @@ class MakeMeme(
                 "created_at": datetime.now(timezone.utc).isoformat()
             })
 
-            print(f"Meme created by user {ctx.user.id} in guild {ctx.guild_id}, message ID: {message.id}")
+            logger.info("Meme created, message ID: %s", message.id, extra={"guild": ctx.guild_id, "user": ctx.user.id, "command": "meme make"})
 
         except ValueError as e:
             await ctx.respond(f"An error occurred while creating the meme: {str(e)}")
         except Exception as e:
             await ctx.respond(f"An unexpected error occurred: {str(e)}")
-            print(f"Error creating meme: {str(e)}")
+            logger.exception("Error creating meme", extra={"guild": ctx.guild_id, "user": ctx.user.id, "command": "meme make"})
 
 #endregion
 
@@ -1,19 +1,26 @@
 #region Imports
 import asyncio
+import logging
 from datetime import datetime, timezone, timedelta
 
 import hikari
 import lightbulb
+from pymongo import UpdateOne
 
-from database import members
+import sharding
+from database import members, loans
+from extensions.economy.member_cache import member_cache
+from metrics import set_origin
 
 #endregion
 
-loader = lightbulb.Loader()
+loader = lightbulb.Loader(should_load_hook=sharding.serves_events)
+logger = logging.getLogger(__name__)
 
 #region Constants
 BANK_INTEREST_RATE = 0.005 # Weekly interest rate
 LOAN_WEEKLY_RATE_CHANGE = 0.0029 # Weekly rate change (~15% APR)
+ACCRUAL_BATCH_SIZE = 500 # Loans updated per bulk write
 #endregion
 
 #region Banking Schedules
@@ -23,95 +30,101 @@ async def process_bank_interest():
     Process weekly bank interest for all members.
     Runs automatically at Monday, midnight UTC.
     """
-    print(f"[{datetime.now(timezone.utc)}] Starting bank interest processing...")
+    logger.info("Starting bank interest processing...")
     count = 0
     total_interest = 0
 
-    for user_doc in members.find({"bank": {"$gt": 0}}):
+    async for user_doc in members.find({"bank": {"$gt": 0}}, {"_id": 0, "id": 1, "bank": 1}):
         bank_amount = user_doc.get("bank", 0)
         interest = bank_amount * BANK_INTEREST_RATE
 
-        members.update_one(
+        await members.update_one(
             {"id": user_doc["id"]},
             {"$inc": {"bank": interest}}
         )
         count += 1
         total_interest += interest
 
-    print(f"[{datetime.now(timezone.utc)}] Bank interest processed for {count} members. Total interest added: {total_interest:.2f}")
+    member_cache.clear()
+    logger.info("Bank interest processed for %d members. Total interest added: %.2f", count, total_interest)
 
 async def process_loan_accrual():
     """
-    Process weekly loan accrual for all members.
+    Process weekly loan accrual for every active loan that is at least a week past its last accrual.
     Penalizes credit scores for unpaid loans.
     Runs automatically at Monday, midnight UTC.
     """
-    print(f"[{datetime.now(timezone.utc)}] Starting loan accrual processing...")
+    logger.info("Starting loan accrual processing...")
     count = 0
     total_interest = 0
+    now = datetime.now(timezone.utc)
+    loan_updates = []
+    member_updates = []
+
+    due_loans = loans.find(
+        {"status": "active", "last_accrual": {"$lte": now - timedelta(weeks=1)}},
+        {"_id": 0, "user_id": 1, "loan_id": 1, "apr": 1, "remaining_balance": 1, "last_accrual": 1}
+    )
+
+    async for loan in due_loans:
+        user_id = loan["user_id"]
+        last_accrual = loan["last_accrual"]
+        if last_accrual.tzinfo is None:
+            last_accrual = last_accrual.replace(tzinfo=timezone.utc)
+
+        weeks_passed = int((now - last_accrual).days / 7)
+        if weeks_passed < 1:
+            continue
+
+        weekly_rate = loan['apr'] / 100 / 52
+        interest = loan['remaining_balance'] * weekly_rate * weeks_passed
+        penalty = min(5, weeks_passed * 2)
+
+        loan_updates.append(UpdateOne(
+            {"user_id": user_id, "loan_id": loan["loan_id"], "status": "active"},
+            {"$inc": {"remaining_balance": interest}, "$set": {"last_accrual": now}}
+        ))
+        member_updates.append(UpdateOne({"id": user_id}, {"$inc": {"total_debt": interest}}))
+        member_updates.append(UpdateOne(
+            {"id": user_id, "credit_score": {"$gt": 300}},
+            {"$inc": {"credit_score": -penalty}}
+        ))
 
-    for user_doc in members.find({"debts": {"$exists": True, "$ne": []}}):
-        user_id = user_doc["id"]
-        debts = user_doc.get("debts", [])
-        updated = False
-
-        for loan in debts:
-            if loan["status"] != "active":
-                continue
-
-            last_accrual = loan.get("last_accrual")
-            if not last_accrual:
-                last_accrual = loan.get("created_at")
-
-            if not last_accrual:
-                continue
-
-            time_diff = datetime.now(timezone.utc) - last_accrual
-            weeks_passed = time_diff.days / 7
-
-            if weeks_passed >= 1:
-                apr = loan['apr']
-                weekly_rate = apr / 100 / 52
-                balance = loan['remaining_balance']
-                interest = balance * weekly_rate * int(weeks_passed)
-
-                loan['remaining_balance'] += interest
-                loan['last_accrual'] = datetime.now(timezone.utc)
-                total_interest += interest
+        total_interest += interest
+        count += 1
 
-                user_credit_score = user_doc.get("credit_score", 500)
-                if user_credit_score > 300:
-                    penalty = min(5, int(weeks_passed) * 2)
-                    members.update_one(
-                        {"id": user_id},
-                        {"$inc": {"credit_score": -penalty}}
-                    )
-                    print(f"[Loan Accrual] User {user_id} credit score decreased by {penalty} points due to unpaid loan.")
+        if len(loan_updates) >= ACCRUAL_BATCH_SIZE:
+            await loans.bulk_write(loan_updates, ordered=False)
+            await members.bulk_write(member_updates, ordered=False)
+            loan_updates, member_updates = [], []
 
-                updated = True
-                count += 1
+    if loan_updates:
+        await loans.bulk_write(loan_updates, ordered=False)
+        await members.bulk_write(member_updates, ordered=False)
 
-        if updated:
-            total_debt = sum(loan['remaining_balance'] for loan in debts if loan['status'] == 'active')
-            members.update_one(
-                {"id": user_id},
-                {"$set": {"debts": debts, "total_debt": total_debt}}
-            )
+    member_cache.clear()
 
-    print(f"[{datetime.now(timezone.utc)}] Loan accrual processed for {count} members. Total interest added: {total_interest:.2f}")
+    logger.info("Loan accrual processed for %d loans. Total interest added: %.2f", count, total_interest)
 
 @loader.task(lightbulb.crontrigger("0 0 * * 1"))  # Every Monday at midnight UTC
 async def weekly_bank_interest() -> None:
+    set_origin("weekly_bank_interest")
+    # Every process loads this extension, but interest must only be paid once
+    if not sharding.is_primary_worker():
+        return
     try:
         await process_bank_interest()
-    except Exception as e:
-        print(f"Error processing bank interest: {e}")
+    except Exception:
+        logger.exception("Error processing bank interest")
 
 @loader.task(lightbulb.crontrigger("0 0 * * 1"))  # Every Monday at midnight UTC
 async def weekly_loan_accrual() -> None:
+    set_origin("weekly_loan_accrual")
+    if not sharding.is_primary_worker():
+        return
     try:
         await process_loan_accrual()
-    except Exception as e:
-        print(f"Error processing loan accrual: {e}")
+    except Exception:
+        logger.exception("Error processing loan accrual")
 
 #endregion
\ No newline at end of file
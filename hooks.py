@@ -3,6 +3,8 @@ import hikari
 import lightbulb
 from lightbulb.prefab import NotOwner
 
+from metrics import command_metrics
+
 owner_id = int(os.getenv("OWNER_ID"))  # Replace with your actual owner ID
 
 def get_admin_roles() -> list[int]:
@@ -23,4 +25,20 @@ admin_roles = get_admin_roles()
 async def fail_if_not_admin_or_owner(_: lightbulb.ExecutionPipeline, ctx: lightbulb.Context) -> None:
     if ctx.user.id != owner_id and not any(role_id in admin_roles for role_id in ctx.member.role_ids):
         await ctx.respond("You do not have permission to use this command.", ephemeral=True)
-        raise NotOwner("You must be an admin or the bot owner to use this command.")
\ No newline at end of file
+        raise NotOwner("You must be an admin or the bot owner to use this command.")
+
+# Applied to every command through the client's hooks, so they run before each step's other hooks
+@lightbulb.hook(lightbulb.ExecutionSteps.MAX_CONCURRENCY)
+async def begin_command_metrics(_: lightbulb.ExecutionPipeline, ctx: lightbulb.Context) -> None:
+    command_metrics.begin(ctx.command_data.qualified_name)
+
+@lightbulb.hook(lightbulb.ExecutionSteps.POST_INVOKE)
+async def record_command_metrics(pl: lightbulb.ExecutionPipeline, _: lightbulb.Context) -> None:
+    if pl.invocation_failed:
+        command_metrics.end("error")
+    elif pl.failed:
+        command_metrics.end("rejected")
+    else:
+        command_metrics.end("ok")
+
+COMMAND_METRICS_HOOKS = [begin_command_metrics, record_command_metrics]
@@ -0,0 +1,98 @@
+"""
+Serve the bot's slash commands, buttons and modals over Discord's HTTP interactions endpoint instead of the gateway.
+
+The application's Interactions Endpoint URL points at this server. Discord then stops sending interactions
+over the gateway, and main.py, started with HTTP_INTERACTIONS=true, keeps only the event listeners.
+
+Commands that only answer once can run on any number of processes behind a load balancer. Commands driven
+by components are not stateless: horse races and blackjack keep their games in process memory
+(`active_races`, `pending_bets`, and the menus and modals they `.attach()` to the client), and every button
+press or modal submit arrives as a new request that only the process which started the game can answer.
+With more than one process, route every interaction of a guild to the same process, for example by the
+`guild_id` in the request body; otherwise run a single process.
+
+Usage:
+    python http_main.py
+"""
+#region Imports
+import asyncio
+import logging
+import os
+
+from dotenv import main
+import hikari
+import lightbulb
+
+import database
+import sharding
+import extensions
+from extensions.economy.ledger import drain_all
+from hooks import COMMAND_METRICS_HOOKS
+from metrics import instrument_rest
+from loop_watchdog import loop_watchdog
+from metrics_server import start_metrics_server, stop_metrics_server
+from logs import setup_logging
+from startup import startup_profile
+#endregion
+
+#region Configuration
+
+main.load_dotenv()
+setup_logging()
+logger = logging.getLogger(__name__)
+
+HTTP_HOST = os.getenv("HTTP_HOST", "0.0.0.0")
+HTTP_PORT = int(os.getenv("HTTP_PORT", "8080"))
+HTTP_REUSE_PORT = os.getenv("HTTP_REUSE_PORT", "").lower() == "true"  # Let several processes on one host share the port; not guild-sticky, see above
+HTTP_SYNC_COMMANDS = os.getenv("HTTP_SYNC_COMMANDS", "true").lower() == "true"  # Only one replica needs to sync commands
+PUBLIC_KEY = os.getenv("PUBLIC_KEY")  # The application's public key; fetched from Discord when unset
+DISCORD_REST_URL = os.getenv("DISCORD_REST_URL") or None  # e.g. a rate limit proxy shared by every replica
+
+#endregion
+
+#region Bot Setup
+
+sharding.role = "http"
+
+bot = hikari.RESTBot(os.getenv("BOT_TOKEN"), "Bot", public_key=PUBLIC_KEY, rest_url=DISCORD_REST_URL, logs=None)
+client = lightbulb.client_from_app(bot, sync_commands=HTTP_SYNC_COMMANDS, hooks=COMMAND_METRICS_HOOKS)
+instrument_rest(bot.rest)
+
+registry = client.di.registry_for(lightbulb.di.Contexts.DEFAULT)
+
+registry.register_factory(hikari.RESTBot, lambda: bot)
+registry.register_factory(lightbulb.RestEnabledClient, lambda: client)
+
+#endregion
+
+#region Startup and Shutdown
+
+async def on_startup(_: hikari.RESTBot) -> None:
+    logger.info("Interaction server is starting on %s:%d...", HTTP_HOST, HTTP_PORT)
+    database_ready = asyncio.create_task(database.connect())
+    logger.info("Loading extensions...")
+    await startup_profile.load_extensions(client, extensions)
+    logger.info("Extensions loaded successfully.")
+    with startup_profile.phase("database"):
+        await database_ready
+    with startup_profile.phase("commands"):
+        await client.start()
+    await start_metrics_server()
+    loop_watchdog.start()
+    logger.info("Interaction server has started successfully!")
+    startup_profile.mark_ready()
+
+async def on_shutdown(_: hikari.RESTBot) -> None:
+    await client.stop()
+    await drain_all()
+    loop_watchdog.stop()
+    await stop_metrics_server()
+    await database.close()
+
+bot.add_startup_callback(on_startup)
+bot.add_shutdown_callback(on_shutdown)
+
+#endregion
+
+if __name__ == "__main__":
+    bot.run(host=HTTP_HOST, port=HTTP_PORT, reuse_port=HTTP_REUSE_PORT)
@@ -0,0 +1,312 @@
+"""
+Create the indexes the bot relies on, and report the ones that are missing, conflicting or redundant.
+
+Runs at start-up from main.py. Run it on its own to see what start-up would change, including the
+duplicate documents that keep a unique index from being built:
+
+    python -m indexes [--dry-run] [--drop-redundant]
+"""
+#region Imports
+import argparse
+import asyncio
+import logging
+from dataclasses import dataclass, field
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+import database
+from database import members, transactions, emote_counters, loans, guilds, bot_messages, gambling_history
+from logs import setup_logging
+#endregion
+
+logger = logging.getLogger(__name__)
+
+#region Configuration
+DUPLICATE_REPORT_LIMIT = 10  # Duplicate keys listed per unique index that cannot be built
+DUPLICATE_KEY_ERROR = 11000
+INDEX_OPTIONS = ("unique", "sparse")  # Options that must match for an existing index to count as the wanted one
+#endregion
+
+#region Index Specifications
+
+# Every index the bot's hot paths rely on, paired with the collection it belongs to.
+# Names are fixed so repeated startups recognise indexes they already created.
+INDEX_SPECS = [
+    (members, [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ]),
+    (transactions, [
+        IndexModel([("transaction_id", ASCENDING)], name="transaction_id_unique", unique=True),
+        IndexModel([("from_account", ASCENDING), ("timestamp", DESCENDING)], name="from_account_timestamp"),
+        IndexModel([("to_account", ASCENDING), ("timestamp", DESCENDING)], name="to_account_timestamp"),
+    ]),
+    (emote_counters, [
+        IndexModel([("guild_id", ASCENDING), ("emoji_id", ASCENDING), ("user_id", ASCENDING)], name="guild_emoji_user_unique", unique=True),
+        IndexModel([("guild_id", ASCENDING), ("emoji_id", ASCENDING), ("count", DESCENDING)], name="guild_emoji_count"),
+    ]),
+    (loans, [
+        IndexModel([("user_id", ASCENDING), ("loan_id", ASCENDING)], name="user_id_loan_id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING)], name="user_id_status"),
+        IndexModel([("status", ASCENDING), ("last_accrual", ASCENDING)], name="status_last_accrual"),
+    ]),
+    (guilds, [
+        IndexModel([("guild_id", ASCENDING)], name="guild_id_unique", unique=True),
+    ]),
+    (bot_messages, [
+        IndexModel([("message_id", ASCENDING), ("guild_id", ASCENDING)], name="message_id_guild_id", unique=True),
+    ]),
+    (gambling_history, [
+        IndexModel([("player_id", ASCENDING), ("timestamp", DESCENDING)], name="player_id_timestamp"),
+    ]),
+]
+
+#endregion
+
+#region Index Report
+
+@dataclass
+class IndexReport:
+    """The outcome of an index bootstrap for a single collection."""
+    collection: str
+    created: list[str] = field(default_factory=list)
+    missing: list[str] = field(default_factory=list)  # Would be created; only filled in by a dry run
+    existing: list[str] = field(default_factory=list)
+    conflicts: list[str] = field(default_factory=list)
+    redundant: list[str] = field(default_factory=list)
+    unmanaged: list[str] = field(default_factory=list)
+    dropped: list[str] = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def failed(self) -> bool:
+        """Whether an index the bot relies on is missing or does not match its spec."""
+        return bool(self.errors or self.conflicts)
+
+    def summary(self) -> str:
+        """
+        Format the report as a single log line.
+
+        Returns:
+            str: A human readable summary of the report.
+        """
+        parts = [f"created={self.created}", f"existing={len(self.existing)}"]
+        if self.missing:
+            parts.append(f"missing={self.missing}")
+        if self.conflicts:
+            parts.append(f"conflicts={self.conflicts}")
+        if self.redundant:
+            parts.append(f"redundant={self.redundant}")
+        if self.unmanaged:
+            parts.append(f"unmanaged={self.unmanaged}")
+        if self.dropped:
+            parts.append(f"dropped={self.dropped}")
+        if self.errors:
+            parts.append(f"errors={self.errors}")
+        return f"[Indexes] {self.collection}: " + ", ".join(parts)
+
+def _key_of(index_info: dict) -> tuple:
+    """
+    Normalise the key of an index so specs and server indexes can be compared.
+
+    Args:
+        index_info (dict): An entry from `index_information()` or an IndexModel document.
+
+    Returns:
+        tuple: The index key as a tuple of (field, direction) pairs.
+    """
+    key = index_info["key"]
+    if isinstance(key, dict):
+        key = key.items()
+    return tuple((name, int(direction) if isinstance(direction, (int, float)) else direction) for name, direction in key)
+
+def _options_of(index_info: dict) -> dict:
+    """
+    Get the options of an index that change what it accepts or holds.
+
+    Args:
+        index_info (dict): An entry from `index_information()` or an IndexModel document.
+
+    Returns:
+        dict: Each option in INDEX_OPTIONS that is set.
+    """
+    return {option: index_info[option] for option in INDEX_OPTIONS if index_info.get(option)}
+
+async def find_duplicates(collection, model: IndexModel, limit: int = DUPLICATE_REPORT_LIMIT) -> list[str]:
+    """
+    Find the documents that share a key of a unique index, which keep the index from being built.
+
+    Args:
+        collection: The collection.
+        model (IndexModel): The unique index.
+        limit (int): The most duplicate keys to list.
+
+    Returns:
+        list[str]: One entry per duplicate key, with how many documents share it and their `_id`s.
+    """
+    fields = list(model.document["key"])
+    match = {name: {"$exists": True} for name in fields} if model.document.get("sparse") else {}
+    cursor = await collection.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": [f"${name}" for name in fields],
+            "count": {"$sum": 1},
+            "ids": {"$push": "$_id"}
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit}
+    ], allowDiskUse=True)
+
+    duplicates = []
+    for group in await cursor.to_list(length=None):
+        key = ", ".join(f"{name}={value!r}" for name, value in zip(fields, group["_id"]))
+        duplicates.append(f"{key} in {group['count']} documents {[str(_id) for _id in group['ids'][:5]]}")
+    return duplicates
+
+def classify_existing_indexes(existing: dict[str, dict], wanted: list[IndexModel]) -> tuple[list[str], list[str]]:
+    """
+    Sort server indexes that no spec names into redundant and unmanaged ones.
+
+    An index is redundant when a wanted index has the same key or starts with its key,
+    since the wanted index already serves every query it could. Anything else is unmanaged
+    and only reported, never dropped.
+
+    Args:
+        existing (dict[str, dict]): The result of `index_information()`.
+        wanted (list[IndexModel]): The indexes the collection should have.
+
+    Returns:
+        tuple[list[str], list[str]]: The redundant and unmanaged index names.
+    """
+    wanted_names = {model.document["name"] for model in wanted}
+    wanted_keys = [_key_of(model.document) for model in wanted]
+
+    redundant = []
+    unmanaged = []
+    for name, info in existing.items():
+        if name == "_id_" or name in wanted_names:
+            continue
+
+        key = _key_of(info)
+        if any(other[:len(key)] == key for other in wanted_keys) and not info.get("unique"):
+            redundant.append(name)
+        else:
+            unmanaged.append(name)
+
+    return redundant, unmanaged
+
+#endregion
+
+#region Index Bootstrap
+
+async def ensure_indexes(drop_redundant: bool = False, dry_run: bool = False) -> list[IndexReport]:
+    """
+    Idempotently create every index in INDEX_SPECS and report missing, conflicting or redundant indexes.
+
+    An existing index with a wanted index's name or key but different options, e.g. not unique,
+    is reported as a conflict and left alone; it has to be dropped by hand before start-up can create
+    the wanted one. A unique index that cannot be built is reported with the duplicate documents in the way.
+
+    Args:
+        drop_redundant (bool): Whether indexes flagged as redundant should also be dropped.
+        dry_run (bool): Report what would be created or dropped, and any duplicates in the way, without changing anything.
+
+    Returns:
+        list[IndexReport]: One report per collection.
+    """
+    reports = []
+
+    for collection, wanted in INDEX_SPECS:
+        report = IndexReport(collection.full_name)
+        existing = await collection.index_information()
+
+        existing_keys = {_key_of(info): name for name, info in existing.items()}
+
+        missing = []
+        for model in wanted:
+            name = model.document["name"]
+            key = _key_of(model.document)
+            # Same key under another name still counts; creating it again would conflict
+            found = name if name in existing else existing_keys.get(key)
+            if found is None:
+                missing.append(model)
+                continue
+
+            info = existing[found]
+            if _key_of(info) != key:
+                report.conflicts.append(f"{found}: key {list(_key_of(info))}, wanted {list(key)}")
+            elif _options_of(info) != _options_of(model.document):
+                report.conflicts.append(f"{found}: options {_options_of(info)}, wanted {_options_of(model.document)}")
+            else:
+                report.existing.append(found)
+
+        for model in missing:
+            name = model.document["name"]
+            if dry_run:
+                report.missing.append(name)
+                if model.document.get("unique"):
+                    report.errors.extend(f"{name} blocked by duplicate {duplicate}" for duplicate in await find_duplicates(collection, model))
+                continue
+            try:
+                await collection.create_indexes([model])
+                report.created.append(name)
+            except OperationFailure as e:
+                # Keep starting up, but name the documents in the way so they can be cleaned up
+                if e.code == DUPLICATE_KEY_ERROR:
+                    duplicates = await find_duplicates(collection, model)
+                    report.errors.extend(f"{name} blocked by duplicate {duplicate}" for duplicate in duplicates)
+                    if duplicates:
+                        continue
+                report.errors.append(f"{name}: {e}")
+
+        report.redundant, report.unmanaged = classify_existing_indexes(existing, wanted)
+        report.redundant = [name for name in report.redundant if name not in report.existing]
+        conflicting = {conflict.split(":", 1)[0] for conflict in report.conflicts}
+        report.redundant = [name for name in report.redundant if name not in conflicting]
+
+        if drop_redundant and not dry_run:
+            for name in report.redundant:
+                await collection.drop_index(name)
+                report.dropped.append(name)
+
+        reports.append(report)
+
+    return reports
+
+def log_report(report: IndexReport) -> None:
+    """
+    Log an index report, as an error when an index the bot relies on is missing or does not match.
+
+    Args:
+        report (IndexReport): The report.
+    """
+    if report.failed:
+        logger.error(report.summary())
+    else:
+        logger.info(report.summary())
+
+#endregion
+
+#region Command Line
+
+async def _run(drop_redundant: bool, dry_run: bool) -> None:
+    await database.connect()
+    try:
+        for report in await ensure_indexes(drop_redundant=drop_redundant, dry_run=dry_run):
+            log_report(report)
+    finally:
+        await database.close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change, and duplicates blocking unique indexes, without writing")
+    parser.add_argument("--drop-redundant", action="store_true", help="Drop indexes a wanted index already covers")
+    args = parser.parse_args()
+
+    setup_logging()
+    asyncio.run(_run(args.drop_redundant, args.dry_run))
+
+if __name__ == "__main__":
+    main()
+
+#endregion
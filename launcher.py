@@ -0,0 +1,193 @@
+"""
+Run the bot's gateway shards across several processes, so events, meme rendering and game loops
+for different guilds are spread over more than one CPU core.
+
+The shard range is split into contiguous blocks, one per worker. Every worker runs main.py with
+SHARD_IDS, SHARD_COUNT and WORKER_INDEX set and loads the same extensions. Per-guild state such as
+races and pending bets stays inside the worker that owns the guild's shard. Bot-wide jobs, such as
+weekly interest, run only in the worker that owns shard 0. Workers are started one after another, so
+together they stay inside Discord's identify rate limit. A worker that crashes is restarted with a
+backoff. Ctrl+C or SIGTERM stops them all.
+
+Without --shards, the recommended shard count is fetched from Discord with BOT_TOKEN.
+
+Usage:
+    python launcher.py [--processes 4] [--shards 16]
+"""
+#region Imports
+import argparse
+import asyncio
+import math
+import os
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+import hikari
+#endregion
+
+#region Configuration
+IDENTIFY_INTERVAL = 5.0  # Seconds Discord requires between identify batches
+RESTART_DELAY = 5.0  # Seconds before restarting a crashed worker, doubled after every crash in a row
+RESTART_DELAY_MAX = 300.0
+STABLE_AFTER = 60.0  # Seconds a worker must run before a crash no longer counts as in a row
+STOP_TIMEOUT = 30.0  # Seconds workers get to close their shards before they are killed
+#endregion
+
+#region Workers
+
+@dataclass
+class Worker:
+    index: int
+    shard_ids: list[int]
+    process: subprocess.Popen | None = None
+    started_at: float = 0.0
+    crashes: int = 0
+    restart_at: float | None = None
+
+    @property
+    def label(self) -> str:
+        return f"worker {self.index} (shards {self.shard_ids[0]}-{self.shard_ids[-1]})"
+
+def split_shards(shard_count: int, processes: int) -> list[list[int]]:
+    """
+    Split the shard range into contiguous blocks whose sizes differ by at most one.
+
+    Args:
+        shard_count (int): The total number of shards.
+        processes (int): The number of worker processes.
+
+    Returns:
+        list[list[int]]: The shard IDs for each worker.
+    """
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    blocks = []
+    start = 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        blocks.append(list(range(start, end)))
+        start = end
+    return blocks
+
+def start_worker(worker: Worker, shard_count: int, env: dict[str, str]) -> None:
+    worker.process = subprocess.Popen(
+        [sys.executable, "main.py"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={
+            **env,
+            "SHARD_IDS": ",".join(map(str, worker.shard_ids)),
+            "SHARD_COUNT": str(shard_count),
+            "WORKER_INDEX": str(worker.index)
+        }
+    )
+    worker.started_at = time.monotonic()
+    worker.restart_at = None
+    print(f"[Launcher] Started {worker.label}, pid {worker.process.pid}.")
+
+def identify_time(worker: Worker, max_concurrency: int) -> float:
+    """The time a worker's shards need to identify before the next worker may start."""
+    return math.ceil(len(worker.shard_ids) / max_concurrency) * IDENTIFY_INTERVAL
+
+#endregion
+
+#region Launcher
+
+async def fetch_gateway_info(token: str) -> hikari.GatewayBotInfo:
+    rest = hikari.RESTApp()
+    await rest.start()
+    try:
+        async with rest.acquire(token, hikari.TokenType.BOT) as client:
+            return await client.fetch_gateway_bot_info()
+    finally:
+        await rest.close()
+
+def run(args: argparse.Namespace) -> int:
+    shard_count = args.shards
+    max_concurrency = args.max_concurrency
+    if shard_count is None or max_concurrency is None:
+        info = asyncio.run(fetch_gateway_info(os.getenv("BOT_TOKEN")))
+        shard_count = shard_count or info.shard_count
+        max_concurrency = max_concurrency or info.session_start_limit.max_concurrency
+        print(f"[Launcher] Discord recommends {info.shard_count} shard(s), identify concurrency {info.session_start_limit.max_concurrency}.")
+
+    workers = [Worker(index, shard_ids) for index, shard_ids in enumerate(split_shards(shard_count, args.processes))]
+    print(f"[Launcher] Running {shard_count} shard(s) in {len(workers)} process(es).")
+
+    env = dict(os.environ)
+
+    stopping = False
+
+    def request_stop(signum: int, _frame) -> None:
+        nonlocal stopping
+        if not stopping:
+            print(f"[Launcher] Received {signal.Signals(signum).name}, stopping workers...")
+        stopping = True
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    # Start workers one at a time so their identifies never overlap
+    for worker in workers:
+        if stopping:
+            break
+        start_worker(worker, shard_count, env)
+        deadline = time.monotonic() + identify_time(worker, max_concurrency)
+        while not stopping and worker is not workers[-1] and time.monotonic() < deadline:
+            time.sleep(0.2)
+
+    while not stopping:
+        now = time.monotonic()
+        for worker in workers:
+            if worker.process is None:
+                continue
+
+            if worker.restart_at is not None:
+                if now >= worker.restart_at:
+                    start_worker(worker, shard_count, env)
+                continue
+
+            code = worker.process.poll()
+            if code is None:
+                continue
+
+            if now - worker.started_at >= STABLE_AFTER:
+                worker.crashes = 0
+            worker.crashes += 1
+            delay = min(RESTART_DELAY * 2 ** (worker.crashes - 1), RESTART_DELAY_MAX)
+            worker.restart_at = now + delay
+            print(f"[Launcher] {worker.label} exited with code {code}, restarting in {delay:.0f}s.")
+        time.sleep(0.5)
+
+    running = [worker for worker in workers if worker.process is not None and worker.process.poll() is None]
+    for worker in running:
+        worker.process.send_signal(signal.SIGTERM)
+
+    deadline = time.monotonic() + STOP_TIMEOUT
+    for worker in running:
+        try:
+            worker.process.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            print(f"[Launcher] {worker.label} did not stop in time, killing it.")
+            worker.process.kill()
+            worker.process.wait()
+
+    print("[Launcher] All workers stopped.")
+    return 0
+
+def main() -> None:
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Worker processes (default: one per CPU core, at most one per shard)")
+    parser.add_argument("--shards", type=int, default=None, help="Total shard count (default: Discord's recommendation)")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="Shards that may identify at once (default: Discord's value)")
+    sys.exit(run(parser.parse_args()))
+
+#endregion
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#region Imports
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from dotenv import main
+#endregion
+
+main.load_dotenv()
+
+#region Configuration
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()  # Level for every logger without its own in LOG_LEVELS
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")  # Per-module levels, e.g. "extensions.emote_leaderboard=DEBUG,hikari=WARNING"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # "text" for key=value lines, "json" for one object per line
+#endregion
+
+#region Structured Fields
+
+# Fields a log call can attach with extra=, e.g. logger.info("Meme created", extra={"guild": guild_id, "user": user_id})
+FIELDS = ("guild", "user", "command", "latency_ms")
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Formats a record as one line, followed by the structured fields it carries.
+
+    Text lines look like `2024-01-01T00:00:00.000Z INFO extensions.memery.memery: Meme created guild=1 user=2`.
+    With `json_lines`, every record is a JSON object with the same keys.
+    """
+
+    def __init__(self, json_lines: bool = False) -> None:
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        timestamp = datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+        message = record.getMessage()
+        exception = record.exc_text or (self.formatException(record.exc_info) if record.exc_info else None)
+        fields = {name: getattr(record, name) for name in FIELDS if getattr(record, name, None) is not None}
+
+        if self.json_lines:
+            entry = {"time": timestamp, "level": record.levelname, "logger": record.name, "message": message, **fields}
+            if exception:
+                entry["exception"] = exception
+            return json.dumps(entry, default=str)
+
+        line = f"{timestamp} {record.levelname:<7} {record.name}: {message}"
+        if fields:
+            line += " " + " ".join(f"{name}={value}" for name, value in fields.items())
+        if exception:
+            line += "\n" + exception
+        return line
+
+class _StructuredQueueHandler(QueueHandler):
+    """
+    Puts records on the queue with only the work that must happen on the calling thread: merging the
+    message arguments, which may change later, and rendering a traceback while it is still current.
+    The structured fields stay on the record for the writer thread to format.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+#endregion
+
+#region Setup
+
+_listener: QueueListener | None = None
+
+def _parse_levels(value: str) -> dict[str, str]:
+    """
+    Parse per-module levels.
+
+    Args:
+        value (str): The value of LOG_LEVELS, e.g. "hikari=WARNING,extensions.memery=DEBUG".
+
+    Returns:
+        dict[str, str]: The level of each logger name.
+    """
+    levels = {}
+    for part in value.split(","):
+        if "=" in part:
+            name, level = part.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def setup_logging() -> None:
+    """
+    Send every log record through a queue to a writer thread, so logging never blocks the event loop
+    on a slow stdout. Call it once, before the bot is built; later calls do nothing.
+
+    The calling thread only puts the record on the queue. Formatting and the write to stdout happen
+    on the writer thread, which is flushed and stopped when the interpreter exits.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(StructuredFormatter(json_lines=LOG_FORMAT == "json"))
+
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [_StructuredQueueHandler(log_queue)]
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging() -> None:
+    """Write out every queued record and stop the writer thread. Records logged afterwards are dropped."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+#endregion
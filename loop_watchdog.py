@@ -0,0 +1,236 @@
+"""
+Name the code that blocks the event loop.
+
+A thread keeps a callback queued on the event loop. When the loop has not run it for longer than
+LOOP_LAG_THRESHOLD_MS, the loop is stuck in something synchronous, so the thread samples the loop
+thread's stack until it moves again. Each stall is attributed to the handler it happened in
+(the first frame of this repo's code in the running task), the call site (the last frame of this repo's
+code) and the function it was blocked in, which is usually in a library. The stalls are logged and kept
+for /diagnostics lag.
+"""
+#region Imports
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from types import FrameType
+
+from metrics import register_gauge
+#endregion
+
+logger = logging.getLogger(__name__)
+
+#region Configuration
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))  # Lag at which the loop thread's stack is sampled, 0 to disable
+LOOP_WATCHDOG_INTERVAL_MS = float(os.getenv("LOOP_WATCHDOG_INTERVAL_MS", "20"))  # How often the watchdog checks, and samples during a stall
+LOOP_STALL_HISTORY = int(os.getenv("LOOP_STALL_HISTORY", "100"))  # Stalls kept for /diagnostics lag
+#endregion
+
+#region Stacks
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__)) + os.sep
+ASYNCIO_ROOT = os.path.dirname(asyncio.__file__) + os.sep
+
+def short_path(filename: str) -> str:
+    """
+    Shorten a source path for reports.
+
+    Args:
+        filename (str): The path of a frame's code.
+
+    Returns:
+        str: The path within this repo, within site-packages, or else the file name.
+    """
+    if filename.startswith(REPO_ROOT):
+        return filename[len(REPO_ROOT):]
+    if "site-packages" + os.sep in filename:
+        return filename.split("site-packages" + os.sep, 1)[1]
+    return os.path.basename(filename)
+
+def frame_label(frame: FrameType) -> str:
+    """
+    Label a frame for reports.
+
+    Args:
+        frame (FrameType): The frame.
+
+    Returns:
+        str: The file, line and function, e.g. "extensions/memery/memery.py:120 create_meme".
+    """
+    return f"{short_path(frame.f_code.co_filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+
+def stack_frames(frame: FrameType | None) -> list[FrameType]:
+    """
+    Get a thread's stack from one of its frames.
+
+    Args:
+        frame (FrameType | None): The innermost frame, e.g. from sys._current_frames().
+
+    Returns:
+        list[FrameType]: The frames, outermost first.
+    """
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+def is_repo_frame(frame: FrameType) -> bool:
+    filename = frame.f_code.co_filename
+    return filename.startswith(REPO_ROOT) and "site-packages" not in filename
+
+#endregion
+
+#region Watchdog
+
+@dataclass
+class Stall:
+    """A time the event loop was blocked."""
+    started: float  # Unix time the stall began
+    duration: float  # Seconds the loop was blocked
+    handler: str  # First frame of this repo's code in the running task
+    call_site: str  # Last frame of this repo's code
+    blocked_in: str  # Innermost frame
+    samples: int  # Stack samples taken during the stall
+
+@dataclass
+class CallSiteStats:
+    """Every stall at one call site."""
+    handler: str
+    call_site: str
+    blocked_in: str
+    stalls: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+class LoopWatchdog:
+    """
+    Samples the event loop thread's stack while the loop is blocked.
+
+    The watchdog thread posts a callback to the loop every `interval` seconds and waits for the loop
+    to run it. Once a callback has waited `threshold` seconds, the loop is stuck, and the thread takes
+    a sample every interval until the callback runs. Sampling only walks the stack, and a healthy loop
+    costs one callback per interval.
+
+    Args:
+        threshold (float): Seconds the loop must be blocked to count as a stall.
+        interval (float): Seconds between checks.
+        history (int): Stalls kept in `recent`.
+    """
+
+    def __init__(self, threshold: float, interval: float, history: int) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self.recent: deque[Stall] = deque(maxlen=history)
+        self.call_sites: dict[tuple[str, str], CallSiteStats] = {}
+        self.stalls_total = 0
+        self.blocked_seconds_total = 0.0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._answered = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start watching the running loop."""
+        if self.threshold <= 0 or self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop watching."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _sample(self) -> tuple[str, str, str] | None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return None
+        frames = stack_frames(frame)
+        del frame
+
+        # Frames up to the last asyncio one are the loop itself; the rest are the task it is running
+        task_start = 0
+        for index, each in enumerate(frames):
+            if each.f_code.co_filename.startswith(ASYNCIO_ROOT):
+                task_start = index + 1
+        task = frames[task_start:] or frames
+        repo = [each for each in task if is_repo_frame(each)]
+
+        blocked_in = frame_label(task[-1])
+        if not repo:
+            return frame_label(task[0]), blocked_in, blocked_in
+        return frame_label(repo[0]), frame_label(repo[-1]), blocked_in
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._answered.clear()
+            sent = time.monotonic()
+            try:
+                self._loop.call_soon_threadsafe(self._answered.set)
+            except RuntimeError:
+                return  # The loop is closed
+            if self._answered.wait(self.threshold):
+                self._stop.wait(self.interval)
+                continue
+
+            # The loop has not run the callback in `threshold` seconds: sample until it does
+            started = time.time() - self.threshold
+            samples: Counter[tuple[str, str, str]] = Counter()
+            while not self._answered.is_set() and not self._stop.is_set():
+                sample = self._sample()
+                if sample is not None:
+                    samples[sample] += 1
+                self._answered.wait(self.interval)
+            if samples and self._answered.is_set():
+                self._record(started, time.monotonic() - sent, samples)
+
+    def _record(self, started: float, duration: float, samples: Counter[tuple[str, str, str]]) -> None:
+        # A stall is put down to where most of its samples were
+        (handler, call_site, blocked_in), _ = samples.most_common(1)[0]
+        self.recent.append(Stall(started, duration, handler, call_site, blocked_in, sum(samples.values())))
+        self.stalls_total += 1
+        self.blocked_seconds_total += duration
+
+        stats = self.call_sites.get((handler, call_site))
+        if stats is None:
+            stats = self.call_sites[(handler, call_site)] = CallSiteStats(handler, call_site, blocked_in)
+        stats.stalls += 1
+        stats.total += duration
+        stats.max = max(stats.max, duration)
+        stats.blocked_in = blocked_in
+
+        logger.warning(
+            "Event loop blocked for %.0f ms in %s, at %s, in %s",
+            duration * 1000, handler, call_site, blocked_in, extra={"latency_ms": round(duration * 1000, 1)}
+        )
+
+    def top_call_sites(self, count: int) -> list[CallSiteStats]:
+        """
+        Get the call sites that have blocked the loop the longest.
+
+        Args:
+            count (int): How many to return.
+
+        Returns:
+            list[CallSiteStats]: The call sites, most total blocked time first.
+        """
+        return sorted(self.call_sites.values(), key=lambda stats: stats.total, reverse=True)[:count]
+
+loop_watchdog = LoopWatchdog(LOOP_LAG_THRESHOLD_MS / 1000, LOOP_WATCHDOG_INTERVAL_MS / 1000, LOOP_STALL_HISTORY)
+
+register_gauge("bot_event_loop_stalls_total", "Times the event loop was blocked past LOOP_LAG_THRESHOLD_MS.", lambda: loop_watchdog.stalls_total, type="counter")
+register_gauge("bot_event_loop_blocked_seconds_total", "Seconds the event loop spent blocked in stalls.", lambda: loop_watchdog.blocked_seconds_total, type="counter")
+
+#endregion
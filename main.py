@@ -1,98 +1,101 @@
 #region Imports
-import os
-import uuid
 import asyncio
+import logging
+import os
 
-from datetime import datetime, timezone, timedelta
 from dotenv import main
 import hikari
 import lightbulb
 from hikari import Intents
-from database import members
+import database
+import sharding
+from cache_profile import cache_settings
+from hooks import COMMAND_METRICS_HOOKS
+from metrics import instrument_rest, register_gauge
+from loop_watchdog import loop_watchdog
+from metrics_server import start_metrics_server, stop_metrics_server
+from logs import setup_logging
+from indexes import ensure_indexes, log_report
+from startup import startup_profile
+from extensions.members.provisioning import member_provisioner
 
 import extensions
-from hooks import fail_if_not_admin_or_owner
 #endregion
 
 #region Bot Setup
 
 main.load_dotenv()
+setup_logging()
+logger = logging.getLogger(__name__)
 
 INTENTS = Intents.GUILD_MEMBERS | Intents.GUILDS | Intents.DM_MESSAGES | Intents.GUILD_MESSAGES | Intents.MESSAGE_CONTENT | Intents.GUILD_MESSAGE_REACTIONS
 
-bot = hikari.GatewayBot(os.getenv("BOT_TOKEN"), intents=INTENTS)
-client = lightbulb.client_from_app(bot)
-
-bot.subscribe(hikari.StartingEvent, client.start)
+# Member chunks are requested by the member backfill (extensions/members/backfill.py) instead of on every guild.
+# The cache keeps only what the extensions read, see cache_profile.py
+bot = hikari.GatewayBot(os.getenv("BOT_TOKEN"), intents=INTENTS, auto_chunk_members=False, cache_settings=cache_settings(), logs=None)
+# With HTTP_INTERACTIONS, http_main.py owns the slash commands and this process only handles gateway events.
+# Under launcher.py only the worker running shard 0 syncs them, instead of every worker at once
+client = lightbulb.client_from_app(
+    bot, sync_commands=sharding.serves_commands() and sharding.is_primary_worker(), hooks=COMMAND_METRICS_HOOKS
+)
+instrument_rest(bot.rest)
 
 registry = client.di.registry_for(lightbulb.di.Contexts.DEFAULT)
 
 registry.register_factory(hikari.GatewayBot, lambda: bot)
 registry.register_factory(lightbulb.GatewayEnabledClient, lambda: client)
 
+# The same latency /ping shows, per shard; NaN until a shard's first heartbeat is acknowledged
+register_gauge(
+    "bot_gateway_heartbeat_latency_seconds", "Gateway heartbeat latency of each shard run by this process.",
+    lambda: {shard_id: shard.heartbeat_latency for shard_id, shard in bot.shards.items()}, label="shard"
+)
+
 #endregion
 
 #region Starting Events
 
+async def prepare_database() -> None:
+    with startup_profile.phase("database"):
+        await database.connect()
+    logger.info("Ensuring database indexes...")
+    with startup_profile.phase("indexes"):
+        # Creating indexes is idempotent, but only one process should drop them
+        drop_redundant = os.getenv("DROP_REDUNDANT_INDEXES", "").lower() == "true" and sharding.is_primary_worker()
+        for report in await ensure_indexes(drop_redundant=drop_redundant):
+            log_report(report)
+
 @bot.listen(hikari.StartingEvent)
 async def on_startup(_: hikari.StartingEvent) -> None:
-    print("Bot is starting...")
-    print("Loading extensions...")
-    await client.load_extensions_from_package(extensions, recursive=True)
-    print("Extensions loaded successfully.")
-    await client.start()
+    logger.info("Bot is starting (%s)...", sharding.worker_label())
+    # The database round trips overlap with importing extensions, which needs no database
+    database_ready = asyncio.create_task(prepare_database())
+    logger.info("Loading extensions...")
+    await startup_profile.load_extensions(client, extensions)
+    logger.info("Extensions loaded successfully.")
+    try:
+        await database_ready
+    except Exception:
+        # Every command and listener needs the database, so stop before any shard connects
+        logger.critical("Database is unavailable, shutting down.", exc_info=True)
+        await bot.close()
+        # Exit non-zero before start() goes on to use the closed REST client
+        raise SystemExit(1)
+    with startup_profile.phase("commands"):
+        await client.start()
+    await start_metrics_server()
+    loop_watchdog.start()
 
 @bot.listen(hikari.StartedEvent)
 async def on_started(_: hikari.StartedEvent) -> None:
-    print("Bot has started successfully!")
-
-#endregion
+    logger.info("Bot has started successfully!")
+    startup_profile.mark_ready()
 
-#region Commands - General
-
-@client.register()
-class Ping(
-    lightbulb.SlashCommand,
-    name = "ping",
-    description = "Check the bot's latency."
-):
-    @lightbulb.invoke
-    async def invoke(self, ctx: lightbulb.Context) -> None:
-        latency = bot.heartbeat_latency * 1000
-        await ctx.respond(f"Pong! Latency: {latency:.2f} ms")
-
-@client.register()
-class Announcement(
-    lightbulb.SlashCommand,
-    name = "announcement",
-    description = "Send an announcement to a specific channel.",
-    hooks = [fail_if_not_admin_or_owner]
-):
-
-    message = lightbulb.string("message", "Announcement message")
-    channel = lightbulb.channel("channel", "Channel to send the announcement to")
-    attachment = lightbulb.attachment("attachment", "Optional attachment for the announcement", default=None)
-
-    @lightbulb.invoke
-    async def invoke(self, ctx: lightbulb.Context) -> None:
-        channel = self.channel
-        message = self.message
-
-        embed = hikari.Embed(
-            title="Announcement!",
-            description=message,
-            color=0x00FF00,  # Green color
-            timestamp=datetime.now().astimezone()
-        )
-
-        try:
-            await bot.rest.create_message(
-                channel=channel.id,
-                embed=embed
-            )
-            await ctx.respond(f"Announcement sent to {channel.mention}!", ephemeral= True)
-        except Exception as e:
-            await ctx.respond(f"Failed to send announcement: {str(e)}", ephemeral= True)
+@bot.listen(hikari.StoppedEvent)
+async def on_stopped(_: hikari.StoppedEvent) -> None:
+    loop_watchdog.stop()
+    await stop_metrics_server()
+    await database.close()
 
 #endregion
 
@@ -104,33 +107,10 @@ async def on_message_create(event: hikari.MessageCreateEvent) -> None:
     if not member:
         return
 
-    # Check if the member already exists in the database
-    existing_member = members.find_one({"id": str(member.id)})
-    if existing_member:
-        return
-
-    # Create a new member document
-    new_member = {
-        "id": str(member.id),
-        "username": member.username,
-        "display_name": member.display_name,
-        "cash": 1000,  # Default starting cash (cash name customizable)
-        "bank": 0,  # Default starting bank balance
-        "debts": [], # List of debts
-        "total_debt": 0, # Total debt amount
-        "credit_score": 500, # Credit score
-        "wins": 0, # Wins in gambling
-        "losses": 0, # Losses in gambling
-        "trophies": [], # List of trophies
-        "emote_count": [], # Count of certain emotes used
-        "emote_rank": [],
-        "joined_at": datetime.now(timezone.utc),
-        "created_at": member.created_at
-    }
-
-    # Insert the new member into the database
-    members.insert_one(new_member)
-    print(f"New member added: {member.username} (ID: {member.id})")
+    # Registered members are answered from memory, only unknown authors reach the database
+    if await member_provisioner.ensure(member):
+        # DM messages have no guild
+        logger.info("New member added: %s", member.username, extra={"guild": getattr(event, "guild_id", None), "user": member.id})
 
 @bot.listen(hikari.MemberCreateEvent)
 async def on_member_create(event: hikari.MemberCreateEvent) -> None:
@@ -138,58 +118,11 @@ async def on_member_create(event: hikari.MemberCreateEvent) -> None:
     if not member:
         return
 
-    # Check if the member already exists in the database
-    existing_member = members.find_one({"id": member.id})
-    if existing_member:
-        return
-
-    # Create a new member document
-    new_member = {
-        "id": str(member.id),
-        "username": member.username,
-        "display_name": member.display_name,
-        "cash": 1000,  # Default starting cash (cash name customizable)
-        "bank": 0,  # Default starting bank balance
-        "debts": [], # List of debts
-        "total_debt": 0, # Total debt amount
-        "credit_score": 500, # Credit score
-        "wins": 0, # Wins in gambling
-        "losses": 0, # Losses in gambling
-        "trophies": [], # List of trophies
-        "emote_count": [], # Count of certain emotes used
-        "emote_rank": [],
-        "joined_at": datetime.now(timezone.utc),
-        "created_at": member.created_at
-    }
-
-    # Insert the new member into the database
-    members.insert_one(new_member)
-    print(f"New member added: {member.username} (ID: {member.id})")
+    if await member_provisioner.ensure(member):
+        logger.info("New member added: %s", member.username, extra={"guild": member.guild_id, "user": member.id})
 
 #endregion
 
-
-class TestModal(lightbulb.components.Modal):
-    def __init__(self) -> None:
-        self.text = self.add_short_text_input("Enter text here")
-
-    async def on_submit(self, ctx: lightbulb.components.ModalContext) -> None:
-        await ctx.respond(f"You entered: {ctx.value_for(self.text)}", ephemeral=True)
-
-@client.register()
-class TestModalCommand(
-    lightbulb.SlashCommand,
-    name="testmodal",
-    description="Test modal command"
-):
-    @lightbulb.invoke
-    async def invoke(self, ctx: lightbulb.Context, client: lightbulb.Client) -> None:
-        modal = TestModal()
-
-        await ctx.respond_with_modal("test modal", c_id := str(uuid.uuid4()), components=modal)
-        try:
-            await modal.attach(client, c_id)
-        except asyncio.TimeoutError:
-            await ctx.respond("Modal timed out.", ephemeral=True)
-
-bot.run()
\ No newline at end of file
+if __name__ == "__main__":
+    # Run on its own, hikari picks the recommended shard count; under launcher.py each process runs a slice of it
+    bot.run(shard_ids=sharding.SHARD_IDS, shard_count=sharding.SHARD_COUNT)
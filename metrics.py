@@ -0,0 +1,524 @@
+"""
+In-process latency metrics, and the gauges the metrics endpoint (metrics_server.py) exposes.
+
+Histograms use HDR-style log-linear buckets: values are kept with two significant digits, so
+percentiles are within about 1.6% of the true value, memory is fixed per histogram and recording
+is a couple of integer operations.
+"""
+#region Imports
+import asyncio
+import logging
+import math
+import re
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable
+#endregion
+
+logger = logging.getLogger(__name__)
+
+#region Histogram
+
+SUB_BUCKET_BITS = 7  # 128 linear sub-buckets, so two significant digits
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT // 2
+
+def _bucket_index(value: int) -> int:
+    if value < SUB_BUCKET_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return SUB_BUCKET_COUNT + (shift - 1) * SUB_BUCKET_HALF + (value >> shift) - SUB_BUCKET_HALF
+
+def _bucket_value(index: int) -> int:
+    """The highest value that falls into a bucket, so percentiles never under-report."""
+    if index < SUB_BUCKET_COUNT:
+        return index
+    shift = (index - SUB_BUCKET_COUNT) // SUB_BUCKET_HALF + 1
+    sub_bucket = (index - SUB_BUCKET_COUNT) % SUB_BUCKET_HALF + SUB_BUCKET_HALF
+    return ((sub_bucket + 1) << shift) - 1
+
+class Histogram:
+    """
+    A latency histogram in microseconds, recorded and read in milliseconds.
+    """
+
+    def __init__(self) -> None:
+        self.counts: list[int] = []
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, milliseconds: float) -> None:
+        """
+        Record one value.
+
+        Args:
+            milliseconds (float): The value, negative values count as 0.
+        """
+        index = _bucket_index(max(int(milliseconds * 1000), 0))
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += milliseconds
+        self.max_ms = max(self.max_ms, milliseconds)
+
+    def percentile(self, percent: float) -> float:
+        """
+        Get the value below which a percentage of the recorded values fall.
+
+        Args:
+            percent (float): The percentile, from 0 to 100.
+
+        Returns:
+            float: The value in milliseconds, 0 when nothing was recorded.
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, round(self.count * percent / 100))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(_bucket_value(index) / 1000, self.max_ms)
+        return self.max_ms
+
+    def summary(self) -> dict[str, float]:
+        """
+        Summarise the histogram.
+
+        Returns:
+            dict[str, float]: The count, mean, p50, p95, p99 and max, in milliseconds.
+        """
+        return {
+            "count": self.count,
+            "mean": self.total_ms / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max_ms
+        }
+
+#endregion
+
+#region Command Metrics
+
+@dataclass
+class CommandTimings:
+    """The time one command invocation has spent so far, and where."""
+    command: str
+    started: float = field(default_factory=time.perf_counter)
+    db_seconds: float = 0.0
+    db_calls: int = 0
+    rest_seconds: float = 0.0
+    rest_calls: int = 0
+
+@dataclass
+class CommandStats:
+    """Everything recorded for one command."""
+    wall: Histogram = field(default_factory=Histogram)
+    db: Histogram = field(default_factory=Histogram)
+    rest: Histogram = field(default_factory=Histogram)
+    db_calls: int = 0
+    rest_calls: int = 0
+    outcomes: Counter[str] = field(default_factory=Counter)
+
+    @property
+    def errors(self) -> int:
+        return self.outcomes["error"]
+
+# The command running in the current task, if any. Database and REST calls add their time to it.
+current_command: ContextVar[CommandTimings | None] = ContextVar("current_command", default=None)
+
+class CommandMetrics:
+    """
+    Per-command latency histograms and outcomes.
+
+    An invocation is opened with `begin`, which makes it the current command of the task. Every
+    database or REST call made in that task, however deep, then adds its time to it. `end` records
+    the wall time, the database and REST time and the outcome.
+    """
+
+    def __init__(self) -> None:
+        self.commands: dict[str, CommandStats] = {}
+
+    def begin(self, command: str) -> CommandTimings:
+        """
+        Start timing a command invocation in the current task.
+
+        Args:
+            command (str): The command's qualified name, e.g. "gambling slots spin".
+
+        Returns:
+            CommandTimings: The invocation's timings.
+        """
+        timings = CommandTimings(command)
+        current_command.set(timings)
+        return timings
+
+    def end(self, outcome: str) -> None:
+        """
+        Record the current task's command invocation.
+
+        Args:
+            outcome (str): "ok", "error" if the command raised, or "rejected" if a check or cooldown stopped it.
+        """
+        timings = current_command.get()
+        if timings is None:
+            return
+        current_command.set(None)
+
+        stats = self.commands.get(timings.command)
+        if stats is None:
+            stats = self.commands[timings.command] = CommandStats()
+        stats.wall.record((time.perf_counter() - timings.started) * 1000)
+        stats.db.record(timings.db_seconds * 1000)
+        stats.rest.record(timings.rest_seconds * 1000)
+        stats.db_calls += timings.db_calls
+        stats.rest_calls += timings.rest_calls
+        stats.outcomes[outcome] += 1
+
+    def report(self) -> list[dict[str, Any]]:
+        """
+        Summarise every command, slowest p99 first.
+
+        Returns:
+            list[dict[str, Any]]: Per command, its name, invocations, errors, wall/db/rest summaries
+            and average database and REST calls per invocation.
+        """
+        rows = []
+        for name, stats in self.commands.items():
+            invocations = stats.wall.count
+            rows.append({
+                "command": name,
+                "invocations": invocations,
+                "errors": stats.errors,
+                "rejected": stats.outcomes["rejected"],
+                "wall": stats.wall.summary(),
+                "db": stats.db.summary(),
+                "rest": stats.rest.summary(),
+                "db_calls": stats.db_calls / invocations if invocations else 0.0,
+                "rest_calls": stats.rest_calls / invocations if invocations else 0.0
+            })
+        return sorted(rows, key=lambda row: row["wall"]["p99"], reverse=True)
+
+command_metrics = CommandMetrics()
+
+def track_db(seconds: float) -> None:
+    """Add a database call to the current command, if there is one."""
+    timings = current_command.get()
+    if timings is not None:
+        timings.db_seconds += seconds
+        timings.db_calls += 1
+
+def track_rest(seconds: float) -> None:
+    """Add a Discord REST call to the current command, if there is one."""
+    timings = current_command.get()
+    if timings is not None:
+        timings.rest_seconds += seconds
+        timings.rest_calls += 1
+
+def instrument_rest(rest: Any) -> None:
+    """
+    Time every request a hikari REST client makes, including rate limit waits, with `track_rest`.
+
+    hikari has no public hook around requests, and its REST client uses __slots__. Every endpoint
+    method goes through `_request`, so that method is wrapped on the client's class, once.
+
+    Args:
+        rest (hikari.api.RESTClient): The bot's REST client.
+    """
+    rest_type = type(rest)
+    request = rest_type._request
+    if getattr(request, "instrumented", False):
+        return
+
+    async def timed_request(self: Any, *args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return await request(self, *args, **kwargs)
+        finally:
+            track_rest(time.perf_counter() - start)
+
+    timed_request.instrumented = True
+    rest_type._request = timed_request
+
+#endregion
+
+#region Database Commands
+
+# Background work that is not a slash command names itself here with set_origin
+current_origin: ContextVar[str | None] = ContextVar("current_origin", default=None)
+
+# hikari runs every listener in a task named after it
+HANDLER_TASK_NAME = re.compile(r"handler '(.+)' for '")
+
+def set_origin(name: str) -> None:
+    """
+    Name the work the current task does, e.g. a scheduled task or a flush loop, for the database
+    command metrics. Its calls stop counting towards the slash command that started the task, if any.
+
+    Args:
+        name (str): The name, e.g. "weekly_loan_accrual".
+    """
+    current_origin.set(name)
+    current_command.set(None)
+
+def origin() -> str:
+    """
+    Get what the current task is doing: the name given with set_origin, the slash command being
+    invoked, or the listener hikari is running.
+
+    Returns:
+        str: The origin, "background" for an unnamed task.
+    """
+    name = current_origin.get()
+    if name is not None:
+        return name
+    timings = current_command.get()
+    if timings is not None:
+        return timings.command
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        match = HANDLER_TASK_NAME.match(task.get_name())
+        if match:
+            return match.group(1)
+    return "background"
+
+@dataclass
+class QueryStats:
+    """Every database command of one operation on one collection, from one origin."""
+    latency: Histogram = field(default_factory=Histogram)
+    documents: Histogram = field(default_factory=Histogram)  # Documents returned or written per command, recorded as plain numbers
+    failures: int = 0
+
+class QueryMetrics:
+    """
+    Latency and document count histograms per collection, operation and origin, fed by the
+    MongoDB driver's command monitoring (see storage/mongo.py).
+    """
+
+    def __init__(self) -> None:
+        self.queries: dict[tuple[str, str, str], QueryStats] = {}
+
+    def record(self, collection: str, operation: str, seconds: float, documents: int, failed: bool) -> None:
+        """
+        Record one database command, for the origin of the current task.
+
+        Args:
+            collection (str): The collection, e.g. "members".
+            operation (str): The driver command, e.g. "find", "update" or "findAndModify".
+            seconds (float): The round trip.
+            documents (int): Documents returned, or matched by a write.
+            failed (bool): Whether the command failed.
+        """
+        key = (collection, operation, origin())
+        stats = self.queries.get(key)
+        if stats is None:
+            stats = self.queries[key] = QueryStats()
+        stats.latency.record(seconds * 1000)
+        stats.documents.record(documents)
+        stats.failures += failed
+
+    def report(self, origin: str | None = None) -> list[dict[str, Any]]:
+        """
+        Summarise every collection, operation and origin, most total time first.
+
+        Args:
+            origin (str | None): Only the commands of this origin, e.g. "gambling slots spin".
+
+        Returns:
+            list[dict[str, Any]]: Per key, the collection, operation, origin, failures, total
+            milliseconds, and latency and document count summaries.
+        """
+        rows = []
+        for (collection, operation, row_origin), stats in self.queries.items():
+            if origin is not None and row_origin != origin:
+                continue
+            rows.append({
+                "collection": collection,
+                "operation": operation,
+                "origin": row_origin,
+                "failures": stats.failures,
+                "total_ms": stats.latency.total_ms,
+                "latency": stats.latency.summary(),
+                "documents": stats.documents.summary()
+            })
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+query_metrics = QueryMetrics()
+
+#endregion
+
+#region Gauges
+
+@dataclass
+class Gauge:
+    """A value read when the metrics are scraped."""
+    name: str
+    help: str
+    read: Callable[[], float | dict[str, float]]
+    label: str | None = None  # Label for the keys when `read` returns a dict
+    type: str = "gauge"  # "counter" for totals that only go up
+
+gauges: dict[str, Gauge] = {}
+
+def register_gauge(
+    name: str,
+    help: str,
+    read: Callable[[], float | dict[str, float]],
+    label: str | None = None,
+    type: str = "gauge"
+) -> None:
+    """
+    Expose a value on the metrics endpoint. Registering a name again replaces it, so an extension can
+    register its gauges at import and be reloaded.
+
+    Args:
+        name (str): The metric name, e.g. "bot_active_races".
+        help (str): One line describing it.
+        read (Callable[[], float | dict[str, float]]): Returns the value, or a value per label value.
+        label (str | None): The label name when `read` returns a dict.
+        type (str): "gauge" or "counter".
+    """
+    gauges[name] = Gauge(name, help, read, label, type)
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(**labels: Any) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+def _number(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+def render_prometheus() -> str:
+    """
+    Render every gauge and the command metrics in the Prometheus text exposition format.
+
+    Returns:
+        str: The metrics page.
+    """
+    lines = []
+    for gauge in list(gauges.values()):
+        try:
+            value = gauge.read()
+        except Exception:
+            logger.debug("Could not read %s", gauge.name, exc_info=True)
+            continue
+        lines.append(f"# HELP {gauge.name} {gauge.help}")
+        lines.append(f"# TYPE {gauge.name} {gauge.type}")
+        if isinstance(value, dict):
+            for key, item in value.items():
+                lines.append(f"{gauge.name}{_labels(**{gauge.label or 'key': key})} {_number(item)}")
+        else:
+            lines.append(f"{gauge.name} {_number(value)}")
+
+    lines.append("# HELP bot_command_duration_seconds Slash command time: wall clock, and the part spent on database and REST calls.")
+    lines.append("# TYPE bot_command_duration_seconds summary")
+    for name, stats in list(command_metrics.commands.items()):
+        for part, histogram in (("wall", stats.wall), ("db", stats.db), ("rest", stats.rest)):
+            for quantile in (0.5, 0.95, 0.99):
+                labels = _labels(command=name, part=part, quantile=quantile)
+                lines.append(f"bot_command_duration_seconds{labels} {_number(histogram.percentile(quantile * 100) / 1000)}")
+            lines.append(f"bot_command_duration_seconds_sum{_labels(command=name, part=part)} {_number(histogram.total_ms / 1000)}")
+            lines.append(f"bot_command_duration_seconds_count{_labels(command=name, part=part)} {histogram.count}")
+
+    lines.append("# HELP bot_command_invocations_total Slash command invocations by outcome: ok, error or rejected.")
+    lines.append("# TYPE bot_command_invocations_total counter")
+    for name, stats in list(command_metrics.commands.items()):
+        for outcome, count in stats.outcomes.items():
+            lines.append(f"bot_command_invocations_total{_labels(command=name, outcome=outcome)} {count}")
+
+    lines.append("# HELP bot_db_command_duration_seconds MongoDB command round trips by collection, operation and origin.")
+    lines.append("# TYPE bot_db_command_duration_seconds summary")
+    for (collection, operation, origin_name), stats in list(query_metrics.queries.items()):
+        for quantile in (0.5, 0.95, 0.99):
+            labels = _labels(collection=collection, operation=operation, origin=origin_name, quantile=quantile)
+            lines.append(f"bot_db_command_duration_seconds{labels} {_number(stats.latency.percentile(quantile * 100) / 1000)}")
+        labels = _labels(collection=collection, operation=operation, origin=origin_name)
+        lines.append(f"bot_db_command_duration_seconds_sum{labels} {_number(stats.latency.total_ms / 1000)}")
+        lines.append(f"bot_db_command_duration_seconds_count{labels} {stats.latency.count}")
+
+    lines.append("# HELP bot_db_command_documents Documents returned or matched per MongoDB command.")
+    lines.append("# TYPE bot_db_command_documents summary")
+    for (collection, operation, origin_name), stats in list(query_metrics.queries.items()):
+        for quantile in (0.5, 0.99):
+            labels = _labels(collection=collection, operation=operation, origin=origin_name, quantile=quantile)
+            lines.append(f"bot_db_command_documents{labels} {_number(stats.documents.percentile(quantile * 100))}")
+        labels = _labels(collection=collection, operation=operation, origin=origin_name)
+        lines.append(f"bot_db_command_documents_sum{labels} {_number(stats.documents.total_ms)}")
+        lines.append(f"bot_db_command_documents_count{labels} {stats.documents.count}")
+
+    return "\n".join(lines) + "\n"
+
+#endregion
+
+#region Event Loop Lag
+
+class LoopLagProbe:
+    """
+    Measures event loop lag: how much later than asked a sleeping task wakes up. Anything that blocks
+    the loop, such as a synchronous call in a handler, shows up as lag for every other task.
+
+    Args:
+        interval (float): Seconds between measurements.
+        window (float): Seconds of measurements the last/max/p99 readout covers.
+    """
+
+    def __init__(self, interval: float = 0.25, window: float = 60.0) -> None:
+        self.interval = interval
+        self.samples: deque[float] = deque(maxlen=max(1, int(window / interval)))
+        self.histogram = Histogram()
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - start - self.interval, 0.0)
+            self.samples.append(lag)
+            self.histogram.record(lag * 1000)
+
+    def start(self) -> None:
+        """Start measuring on the running loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        """Stop measuring."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict[str, float]:
+        """
+        Get the lag over the window.
+
+        Returns:
+            dict[str, float]: The last, p99 and max lag in seconds.
+        """
+        if not self.samples:
+            return {"last": 0.0, "p99": 0.0, "max": 0.0}
+        ordered = sorted(self.samples)
+        return {
+            "last": self.samples[-1],
+            "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+            "max": ordered[-1]
+        }
+
+loop_lag = LoopLagProbe()
+
+register_gauge("bot_event_loop_lag_seconds", "Event loop lag over the last minute.", loop_lag.stats, label="stat")
+
+#endregion
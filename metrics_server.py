@@ -0,0 +1,65 @@
+"""
+Serve the bot's metrics in the Prometheus text format, on localhost by default.
+
+Every gauge registered with metrics.register_gauge is read on each scrape, together with the slash
+command latency summaries and the event loop lag. Under launcher.py each worker listens on
+METRICS_PORT + its worker index, so every process can be scraped on its own.
+"""
+#region Imports
+import logging
+import os
+
+from aiohttp import web
+
+import sharding
+from metrics import loop_lag, render_prometheus
+#endregion
+
+logger = logging.getLogger(__name__)
+
+#region Configuration
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # Only local scrapers by default
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))  # 0 to disable the endpoint
+#endregion
+
+#region Server
+
+_runner: web.AppRunner | None = None
+
+async def metrics_page(_: web.Request) -> web.Response:
+    return web.Response(text=render_prometheus(), content_type="text/plain", charset="utf-8", headers={"X-Content-Type-Options": "nosniff"})
+
+async def start_metrics_server() -> None:
+    """
+    Start the event loop lag probe and the metrics endpoint at /metrics. A port that is already
+    taken is logged and the bot runs on without the endpoint.
+    """
+    global _runner
+    loop_lag.start()
+    if METRICS_PORT <= 0 or _runner is not None:
+        return
+
+    port = METRICS_PORT + sharding.WORKER_INDEX
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_page)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, METRICS_HOST, port).start()
+    except OSError as e:
+        logger.warning("Could not serve metrics on %s:%d: %s", METRICS_HOST, port, e)
+        await runner.cleanup()
+        return
+
+    _runner = runner
+    logger.info("Serving metrics on http://%s:%d/metrics", METRICS_HOST, port)
+
+async def stop_metrics_server() -> None:
+    """Stop the metrics endpoint and the lag probe."""
+    global _runner
+    loop_lag.stop()
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
+
+#endregion
@@ -0,0 +1,101 @@
+"""
+Shared plumbing for migrations that move an array out of member documents into its own collection.
+
+Each script only says how one member's array becomes upserts; streaming the members, writing the upserts
+in unordered batches, `--dry-run` and `--unset` work the same way for all of them.
+"""
+import argparse
+import asyncio
+import logging
+from typing import Callable, Iterable
+
+from pymongo import UpdateOne
+
+import database
+from database import members
+from logs import setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate_member_arrays(
+    field: str,
+    target,
+    transform: Callable[[dict], Iterable[UpdateOne]],
+    unset_fields: tuple[str, ...],
+    batch_size: int,
+    unset: bool,
+    dry_run: bool
+) -> None:
+    """
+    Stream every member with a non-empty array and write the upserts it becomes to another collection.
+
+    Members are fetched with a projection to `id` and the array, so only one batch is held in memory at a time.
+
+    Args:
+        field (str): The array field on member documents.
+        target: The collection the upserts are written to.
+        transform (Callable[[dict], Iterable[UpdateOne]]): Turns a projected member document into upserts.
+        unset_fields (tuple[str, ...]): Fields removed from member documents by `--unset`.
+        batch_size (int): Members fetched, and upserts written, per round trip.
+        unset (bool): Remove `unset_fields` from member documents once every upsert is written.
+        dry_run (bool): Count what would be written without writing.
+    """
+    await database.connect()
+    try:
+        migrated_members = 0
+        written = 0
+        batch: list[UpdateOne] = []
+
+        async def flush() -> None:
+            nonlocal written, batch
+            if batch and not dry_run:
+                await target.bulk_write(batch, ordered=False)
+            written += len(batch)
+            batch = []
+
+        cursor = members.find({field: {"$exists": True, "$ne": []}}, {"_id": 0, "id": 1, field: 1}, batch_size=batch_size)
+        async for member_doc in cursor:
+            migrated_members += 1
+            for request in transform(member_doc):
+                batch.append(request)
+                if len(batch) >= batch_size:
+                    await flush()
+        await flush()
+        logger.info("%s %d %s documents from %d members.", "Would write" if dry_run else "Wrote", written, target.name, migrated_members)
+
+        if unset and not dry_run:
+            result = await members.update_many(
+                {"$or": [{name: {"$exists": True}} for name in unset_fields]},
+                {"$unset": {name: "" for name in unset_fields}}
+            )
+            logger.info("Removed %s from %d members.", ", ".join(unset_fields), result.modified_count)
+    finally:
+        await database.close()
+
+
+def run(
+    description: str,
+    field: str,
+    target,
+    transform: Callable[[dict], Iterable[UpdateOne]],
+    unset_fields: tuple[str, ...]
+) -> None:
+    """
+    Parse the shared command line options and run a member array migration.
+
+    Args:
+        description (str): The script's docstring, shown by --help.
+        field (str): The array field on member documents.
+        target: The collection the upserts are written to.
+        transform (Callable[[dict], Iterable[UpdateOne]]): Turns a projected member document into upserts.
+        unset_fields (tuple[str, ...]): Fields removed from member documents by `--unset`.
+    """
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--unset", action="store_true", help="Remove the old arrays from member documents afterwards")
+    parser.add_argument("--dry-run", action="store_true", help="Count what would be migrated without writing")
+    args = parser.parse_args()
+
+    setup_logging()
+    asyncio.run(migrate_member_arrays(field, target, transform, unset_fields, args.batch_size, args.unset, args.dry_run))
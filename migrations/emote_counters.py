@@ -0,0 +1,43 @@
+"""
+Move the per-member `emote_count` arrays into the `emote_counters` collection.
+
+Members are streamed with a projection so only one batch is held in memory at a time.
+Each entry becomes an upsert keyed by (guild_id, emoji_id, user_id) that uses `$max`,
+so re-running the migration, or running it while the bot is live and already counting
+into `emote_counters`, never lowers a count.
+
+Usage:
+    python -m migrations.emote_counters [--batch-size 1000] [--unset] [--dry-run]
+
+    --unset removes `emote_count` and `emote_rank` from member documents once every counter is written.
+"""
+from datetime import datetime, timezone
+from typing import Iterator
+
+from pymongo import UpdateOne
+
+from database import emote_counters
+from migrations._common import run
+
+
+def counter_upserts(member_doc: dict) -> Iterator[UpdateOne]:
+    for entry in member_doc.get("emote_count", []):
+        if "guild_id" not in entry or "emoji_id" not in entry:
+            continue
+
+        yield UpdateOne(
+            {"guild_id": entry["guild_id"], "emoji_id": entry["emoji_id"], "user_id": member_doc["id"]},
+            {
+                "$max": {"count": entry.get("count", 0)},
+                "$setOnInsert": {"updated_at": datetime.now(timezone.utc)}
+            },
+            upsert=True
+        )
+
+
+def main() -> None:
+    run(__doc__, "emote_count", emote_counters, counter_upserts, ("emote_count", "emote_rank"))
+
+
+if __name__ == "__main__":
+    main()
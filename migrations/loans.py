@@ -0,0 +1,43 @@
+"""
+Move the per-member `debts` arrays into the `loans` collection.
+
+Members are streamed with a projection so only one batch is held in memory at a time.
+Each loan becomes an upsert keyed by (user_id, loan_id) that only sets fields on insert,
+so re-running the migration never overwrites a loan the bot has already paid into or accrued.
+Loans without a `last_accrual` fall back to `created_at`, which is what the accrual job used to do.
+
+Usage:
+    python -m migrations.loans [--batch-size 1000] [--unset] [--dry-run]
+
+    --unset removes `debts` from member documents once every loan is written.
+"""
+from typing import Iterator
+
+from pymongo import UpdateOne
+
+from database import loans
+from migrations._common import run
+
+
+def loan_upserts(member_doc: dict) -> Iterator[UpdateOne]:
+    for loan in member_doc.get("debts", []):
+        if "loan_id" not in loan:
+            continue
+
+        loan_doc = {**loan, "user_id": member_doc["id"]}
+        loan_doc.setdefault("last_accrual", loan.get("created_at"))
+        loan_doc.setdefault("status", "active")
+
+        yield UpdateOne(
+            {"user_id": member_doc["id"], "loan_id": loan["loan_id"]},
+            {"$setOnInsert": loan_doc},
+            upsert=True
+        )
+
+
+def main() -> None:
+    run(__doc__, "debts", loans, loan_upserts, ("debts",))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Profile the running bot for a few seconds, for /diagnostics profile.
+
+The CPU profile samples the event loop thread's stack from another thread and counts identical stacks,
+giving collapsed stacks (`frame;frame;frame count`) that flamegraph.pl, speedscope or inferno read. The
+memory profile traces allocations with tracemalloc for the window, then reports the lines and call paths
+holding the most of what was allocated and is still alive.
+"""
+#region Imports
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass
+
+from loop_watchdog import short_path, stack_frames
+#endregion
+
+#region Configuration
+PROFILE_SAMPLE_MS = float(os.getenv("PROFILE_SAMPLE_MS", "5"))  # Time between CPU profile samples
+PROFILE_TRACEBACK_FRAMES = int(os.getenv("PROFILE_TRACEBACK_FRAMES", "16"))  # Frames tracemalloc keeps per allocation
+PROFILE_TOP_ALLOCATIONS = int(os.getenv("PROFILE_TOP_ALLOCATIONS", "25"))  # Lines and call paths listed in a memory profile
+#endregion
+
+#region Profiling
+
+@dataclass
+class ProfileReport:
+    """A finished profile."""
+    summary: str  # One line for the response
+    text: str  # The report, sent as an attachment
+    filename: str
+
+# One profile at a time, so two admins cannot skew each other's numbers
+profile_lock = asyncio.Lock()
+
+def _sample_stacks(thread_id: int, seconds: float, interval: float) -> Counter[str]:
+    stacks: Counter[str] = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            stacks[";".join(
+                f"{each.f_code.co_name} ({short_path(each.f_code.co_filename)}:{each.f_lineno})"
+                for each in stack_frames(frame)
+            )] += 1
+        del frame
+        time.sleep(interval)
+    return stacks
+
+async def profile_cpu(seconds: float) -> ProfileReport:
+    """
+    Sample the event loop thread's stack for a while.
+
+    Args:
+        seconds (float): How long to sample.
+
+    Returns:
+        ProfileReport: Collapsed stacks, one unique stack per line with its sample count.
+    """
+    thread_id = threading.get_ident()
+    stacks = await asyncio.to_thread(_sample_stacks, thread_id, seconds, PROFILE_SAMPLE_MS / 1000)
+
+    samples = sum(stacks.values())
+    # A loop waiting for I/O sits in the selector, so every other sample is time spent running code
+    idle = sum(count for stack, count in stacks.items() if stack.rsplit(";", 1)[-1].startswith("select (selectors.py"))
+    busy = (samples - idle) / samples if samples else 0.0
+    return ProfileReport(
+        summary=f"{samples:,} samples over {seconds:g}s, event loop busy {busy:.0%} of the time.",
+        text="\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n",
+        filename=f"cpu-{int(time.time())}.collapsed.txt"
+    )
+
+async def profile_memory(seconds: float) -> ProfileReport:
+    """
+    Trace allocations for a while.
+
+    Args:
+        seconds (float): How long to trace.
+
+    Returns:
+        ProfileReport: The lines, then the call paths, holding the most memory allocated during the window.
+    """
+    started_here = not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start(PROFILE_TRACEBACK_FRAMES)
+    try:
+        await asyncio.sleep(seconds)
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        if started_here:
+            tracemalloc.stop()
+
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>")
+    ))
+    by_line = snapshot.statistics("lineno")
+    by_traceback = snapshot.statistics("traceback")
+    total = sum(stat.size for stat in by_line)
+
+    lines = [f"Allocated during the last {seconds:g}s and still alive: {total / 1024:,.1f} KiB", "", "Top lines:"]
+    for stat in by_line[:PROFILE_TOP_ALLOCATIONS]:
+        frame = stat.traceback[0]
+        lines.append(f"{stat.size / 1024:>10,.1f} KiB {stat.count:>8,} blocks  {short_path(frame.filename)}:{frame.lineno}")
+
+    lines.extend(["", "Top call paths:"])
+    for rank, stat in enumerate(by_traceback[:PROFILE_TOP_ALLOCATIONS], start=1):
+        lines.append(f"#{rank}: {stat.size / 1024:,.1f} KiB in {stat.count:,} blocks")
+        for frame in stat.traceback:
+            lines.append(f"    {short_path(frame.filename)}:{frame.lineno}")
+
+    return ProfileReport(
+        summary=f"{total / 1024 / 1024:,.2f} MiB allocated over {seconds:g}s is still alive, in {len(by_line):,} lines.",
+        text="\n".join(lines) + "\n",
+        filename=f"memory-{int(time.time())}.txt"
+    )
+
+#endregion
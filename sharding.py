@@ -0,0 +1,106 @@
+#region Imports
+import os
+#endregion
+
+#region Configuration
+
+def _parse_shard_ids(value: str | None) -> list[int] | None:
+    """
+    Parse a comma separated list of shard IDs, where "a-b" is an inclusive range.
+
+    Args:
+        value (str | None): The value of SHARD_IDS, e.g. "0-3" or "0,2,4".
+
+    Returns:
+        list[int] | None: The shard IDs, or None to let hikari run every recommended shard.
+    """
+    if not value or not value.strip():
+        return None
+
+    shard_ids = []
+    for part in value.split(","):
+        part = part.strip()
+        if "-" in part:
+            first, last = part.split("-", 1)
+            shard_ids.extend(range(int(first), int(last) + 1))
+        elif part:
+            shard_ids.append(int(part))
+    return sorted(set(shard_ids))
+
+SHARD_IDS = _parse_shard_ids(os.getenv("SHARD_IDS"))  # Shards run by this process, set by launcher.py
+SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None  # Total shards across every process
+WORKER_INDEX = int(os.getenv("WORKER_INDEX", "0"))  # This process's index in the launcher, 0 when run on its own
+HTTP_INTERACTIONS = os.getenv("HTTP_INTERACTIONS", "").lower() == "true"  # Slash commands are served by http_main.py, not the gateway
+
+if SHARD_IDS is not None and SHARD_COUNT is None:
+    raise RuntimeError("SHARD_IDS is set but SHARD_COUNT is not.")
+if SHARD_IDS is not None and any(shard_id >= SHARD_COUNT for shard_id in SHARD_IDS):
+    raise RuntimeError(f"SHARD_IDS {SHARD_IDS} are outside SHARD_COUNT {SHARD_COUNT}.")
+
+#endregion
+
+#region Process Role
+
+# "gateway" for main.py, "http" for http_main.py, which sets it before loading extensions
+role = "gateway"
+
+#endregion
+
+#region Helpers
+
+def worker_label() -> str:
+    """
+    Describe this process for log lines, e.g. "worker 1, shards 4-7 of 16".
+
+    Returns:
+        str: The label.
+    """
+    if SHARD_IDS is None:
+        return f"worker {WORKER_INDEX}, all shards"
+
+    if SHARD_IDS == list(range(SHARD_IDS[0], SHARD_IDS[-1] + 1)):
+        shards = f"{SHARD_IDS[0]}-{SHARD_IDS[-1]}" if len(SHARD_IDS) > 1 else str(SHARD_IDS[0])
+    else:
+        shards = ",".join(map(str, SHARD_IDS))
+    return f"worker {WORKER_INDEX}, shards {shards} of {SHARD_COUNT}"
+
+def serves_commands() -> bool:
+    """
+    Check whether this process handles slash commands and components. Gateway processes leave them
+    to the HTTP interaction servers when HTTP_INTERACTIONS is set.
+
+    Returns:
+        bool: True if command extensions should be loaded.
+    """
+    return role == "http" or not HTTP_INTERACTIONS
+
+def serves_events() -> bool:
+    """
+    Check whether this process receives gateway events, and so runs listeners and background jobs.
+
+    Returns:
+        bool: True for gateway processes.
+    """
+    return role == "gateway"
+
+def is_multi_process() -> bool:
+    """
+    Check whether other processes share the bot's work with this one: sibling shard workers started by
+    launcher.py, or the gateway and HTTP interaction servers when HTTP_INTERACTIONS is set.
+
+    Returns:
+        bool: True if another process may write the same member documents.
+    """
+    return HTTP_INTERACTIONS or role == "http" or (SHARD_IDS is not None and len(SHARD_IDS) < SHARD_COUNT)
+
+def is_primary_worker() -> bool:
+    """
+    Check whether this process runs the bot-wide jobs, such as weekly interest, that must happen only once
+    no matter how many processes share the shards. That is the process running shard 0.
+
+    Returns:
+        bool: True for the gateway process that owns shard 0, or when the bot runs in a single process.
+    """
+    return serves_events() and (SHARD_IDS is None or 0 in SHARD_IDS)
+
+#endregion
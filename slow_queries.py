@@ -0,0 +1,315 @@
+"""
+Log MongoDB queries slower than SLOW_QUERY_MS, explain each query shape once, and suggest indexes.
+
+A query's shape is its filter with every value replaced by "?", plus its sort, so
+`{"user_id": "1", "bank": {"$gt": 0}}` and `{"user_id": "2", "bank": {"$gt": 5}}` are one shape. The
+first slow query of a shape is explained with the query planner, not run again. Plans that scan the
+whole collection (COLLSCAN) or sort in memory get an index suggestion following the equality, sort,
+range rule, written as the IndexModel to add to indexes.py. Every shape seen, its timings and origins,
+its plan and the suggestion are written to SLOW_QUERY_REPORT.
+"""
+#region Imports
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+
+from metrics import origin
+#endregion
+
+logger = logging.getLogger(__name__)
+
+#region Configuration
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))  # Queries at least this slow are logged and explained, 0 to disable
+SLOW_QUERY_REPORT = os.getenv("SLOW_QUERY_REPORT", "slow_queries.txt")  # Report of every slow query shape, rewritten as shapes are explained
+SLOW_QUERY_REPORT_INTERVAL = 60.0  # Most often the report is rewritten for new timings alone, in seconds
+#endregion
+
+#region Query Shapes
+
+# Operators that match one value, so an index can seek to it
+EQUALITY_OPERATORS = frozenset({"$eq", "$in"})
+
+def query_of(operation: str, command: dict) -> tuple[dict, dict] | None:
+    """
+    Get the filter and sort of a command sent to the server.
+
+    Args:
+        operation (str): The command name, e.g. "find" or "update".
+        command (dict): The command document.
+
+    Returns:
+        tuple[dict, dict] | None: The filter and sort, or None for commands without a filter.
+    """
+    if operation == "find":
+        return command.get("filter") or {}, command.get("sort") or {}
+    if operation in ("findAndModify", "count", "distinct"):
+        return command.get("query") or {}, command.get("sort") or {}
+    if operation == "aggregate":
+        pipeline = command.get("pipeline") or []
+        if pipeline and "$match" in pipeline[0]:
+            sort = pipeline[1].get("$sort", {}) if len(pipeline) > 1 else {}
+            return pipeline[0]["$match"], sort
+        return None
+    if operation in ("update", "delete"):
+        statements = command.get("updates" if operation == "update" else "deletes") or []
+        return (statements[0].get("q") or {}, {}) if statements else None
+    return None
+
+def shape_of(value: Any) -> Any:
+    """
+    Replace every value in a filter with "?", keeping field names and operators.
+
+    Args:
+        value (Any): The filter, or part of it.
+
+    Returns:
+        Any: The shape.
+    """
+    if isinstance(value, dict):
+        return {key: shape_of(item) for key, item in value.items()}
+    if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        return [shape_of(item) for item in value]  # $and and $or branches
+    return "?"
+
+def _predicates(query: dict) -> list[tuple[str, Any]] | None:
+    """The field predicates ANDed together in a filter, or None when it has $or, $expr or the like."""
+    predicates = []
+    for key, value in query.items():
+        if key == "$and":
+            for branch in value:
+                branch_predicates = _predicates(branch)
+                if branch_predicates is None:
+                    return None
+                predicates.extend(branch_predicates)
+        elif key.startswith("$"):
+            return None
+        else:
+            predicates.append((key, value))
+    return predicates
+
+def suggest_index(query: dict, sort: dict) -> tuple[list[tuple[str, int]], str] | None:
+    """
+    Suggest an index for a query: equality fields first, then the sort, then range fields.
+
+    Args:
+        query (dict): The filter.
+        sort (dict): The sort, field to 1 or -1.
+
+    Returns:
+        tuple[list[tuple[str, int]], str] | None: The index keys and a note on the suggestion, or
+        None when the filter cannot be served by one index, e.g. it has $or.
+    """
+    predicates = _predicates(query)
+    if predicates is None:
+        return None
+
+    equality, ranges, range_operators = [], [], set()
+    for name, value in predicates:
+        operators = [key for key in value if key.startswith("$")] if isinstance(value, dict) else []
+        if not operators or set(operators) <= EQUALITY_OPERATORS:
+            equality.append(name)
+        else:
+            ranges.append(name)
+            range_operators.update(operators)
+
+    keys = [(name, 1) for name in dict.fromkeys(equality)]
+    keys += [(name, direction) for name, direction in sort.items() if name not in equality and direction in (1, -1)]
+    keys += [(name, 1) for name in dict.fromkeys(ranges) if name not in equality and name not in sort]
+    if not keys:
+        return None
+
+    note = "equality, sort, range"
+    if not equality and not sort and range_operators <= {"$exists", "$ne"}:
+        # Only "has the field" matches, which an index over every document barely narrows
+        note = "sparse=True, so it only holds the documents that have the field"
+    return keys, note
+
+def format_index(collection: str, keys: list[tuple[str, int]], note: str) -> str:
+    """
+    Write a suggested index the way indexes.py declares them.
+
+    Args:
+        collection (str): The collection.
+        keys (list[tuple[str, int]]): The index keys.
+        note (str): Why the keys are in this order, or an option to add.
+
+    Returns:
+        str: The IndexModel, the INDEX_SPECS entry it belongs to, and the note.
+    """
+    fields = ", ".join(f'("{name}", {"ASCENDING" if direction == 1 else "DESCENDING"})' for name, direction in keys)
+    name = "_".join(name.replace(".", "_") for name, _ in keys)
+    sparse = ", sparse=True" if note.startswith("sparse") else ""
+    return f'IndexModel([{fields}], name="{name}"{sparse}) under {collection} in INDEX_SPECS ({note})'
+
+def plan_stages(explain: dict) -> tuple[list[str], list[str]]:
+    """
+    Get the stages and indexes of the winning plan of an explain.
+
+    Args:
+        explain (dict): The reply to an explain command with queryPlanner verbosity.
+
+    Returns:
+        tuple[list[str], list[str]]: The stage names, outermost first, and the indexes scanned.
+    """
+    winning = explain.get("queryPlanner", {}).get("winningPlan", {})
+    stack = [winning.get("queryPlan", winning)]  # Servers using the slot based engine nest the plan
+    stages, indexes = [], []
+    while stack:
+        stage = stack.pop()
+        if "stage" in stage:
+            stages.append(stage["stage"])
+        if "indexName" in stage:
+            indexes.append(stage["indexName"])
+        if "inputStage" in stage:
+            stack.append(stage["inputStage"])
+        stack.extend(reversed(stage.get("inputStages", [])))
+    return stages, indexes
+
+#endregion
+
+#region Slow Query Log
+
+@dataclass
+class SlowShape:
+    """Every slow query of one shape, and what its plan looks like."""
+    database: str
+    collection: str
+    operation: str
+    shape: str
+    sort: str
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    origins: Counter[str] = field(default_factory=Counter)
+    stages: list[str] = field(default_factory=list)
+    indexes: list[str] = field(default_factory=list)
+    problem: str | None = None  # "COLLSCAN" or "in-memory SORT" when the plan has one
+    advice: str | None = None
+    explain_error: str | None = None
+
+class SlowQueryLog:
+    """
+    Collects slow queries by shape and explains each shape once.
+
+    Args:
+        threshold (float): Seconds from which a query is slow.
+        report_path (str): The report file.
+        run_command (Callable[[str, dict], Awaitable[dict]]): Runs a command on a database, used for explain.
+    """
+
+    def __init__(self, threshold: float, report_path: str, run_command: Callable[[str, dict], Awaitable[dict]]) -> None:
+        self.threshold = threshold
+        self.report_path = report_path
+        self.run_command = run_command
+        self.shapes: dict[tuple[str, str, str, str, str], SlowShape] = {}
+        self.started = datetime.now(timezone.utc)
+        self._last_write = 0.0
+        self._write_lock = asyncio.Lock()
+        self._tasks: set[asyncio.Task] = set()
+
+    def record(self, database: str, collection: str, operation: str, command: dict, seconds: float) -> None:
+        """
+        Record a query, called by the driver's command listener for every command that was slow.
+
+        Args:
+            database (str): The database.
+            collection (str): The collection.
+            operation (str): The command name, e.g. "find".
+            command (dict): The command document.
+            seconds (float): The round trip.
+        """
+        query = query_of(operation, command)
+        if query is None:
+            return
+        query_filter, sort = query
+        shape = json.dumps(shape_of(query_filter), default=str)
+        sort_shape = json.dumps(dict(sort), default=str)
+
+        key = (database, collection, operation, shape, sort_shape)
+        slow = self.shapes.get(key)
+        new = slow is None
+        if new:
+            slow = self.shapes[key] = SlowShape(database, collection, operation, shape, sort_shape)
+        slow.count += 1
+        slow.total += seconds
+        slow.max = max(slow.max, seconds)
+        slow.origins[origin()] += 1
+
+        if new:
+            logger.info("Slow query on %s.%s (%s): %s, explaining it.", collection, operation, origin(), shape, extra={"latency_ms": round(seconds * 1000, 1)})
+            self._spawn(self._explain(slow, query_filter, dict(sort)))
+        elif time.monotonic() - self._last_write >= SLOW_QUERY_REPORT_INTERVAL:
+            self._spawn(self.write_report())
+
+    def _spawn(self, coroutine: Awaitable[None]) -> None:
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _explain(self, slow: SlowShape, query_filter: dict, sort: dict) -> None:
+        command = {"find": slow.collection, "filter": query_filter}
+        if sort:
+            command["sort"] = sort
+        try:
+            explain = await self.run_command(slow.database, {"explain": command, "verbosity": "queryPlanner"})
+        except Exception as e:
+            slow.explain_error = str(e)
+            logger.warning("Could not explain a slow query on %s.%s: %s", slow.collection, slow.operation, e)
+        else:
+            slow.stages, slow.indexes = plan_stages(explain)
+            if "COLLSCAN" in slow.stages:
+                slow.problem = "COLLSCAN"
+            elif "SORT" in slow.stages:
+                slow.problem = "in-memory SORT"
+
+            if slow.problem:
+                suggestion = suggest_index(query_filter, sort)
+                slow.advice = format_index(slow.collection, *suggestion) if suggestion else "No single index serves this filter; index each $or branch."
+                logger.warning("Slow query on %s.%s has a %s plan: %s. Suggested: %s", slow.collection, slow.operation, slow.problem, slow.shape, slow.advice)
+        await self.write_report()
+
+    def report(self) -> str:
+        """
+        Lay out every slow query shape, most total time first.
+
+        Returns:
+            str: The report.
+        """
+        lines = [f"Queries slower than {self.threshold * 1000:.0f} ms since {self.started.isoformat(timespec='seconds')}, most total time first.", ""]
+        for slow in sorted(self.shapes.values(), key=lambda slow: slow.total, reverse=True):
+            sort = f" sort {slow.sort}" if slow.sort != "{}" else ""
+            lines.append(f"{slow.database}.{slow.collection} {slow.operation} {slow.shape}{sort}")
+            origins = ", ".join(f"{name} ({count})" for name, count in slow.origins.most_common())
+            lines.append(f"  {slow.count} slow, total {slow.total * 1000:.0f} ms, max {slow.max * 1000:.0f} ms, from {origins}")
+            if slow.explain_error:
+                lines.append(f"  explain failed: {slow.explain_error}")
+            elif slow.stages:
+                indexes = f" using {', '.join(slow.indexes)}" if slow.indexes else ""
+                lines.append(f"  plan: {' <- '.join(slow.stages)}{indexes}")
+            if slow.problem:
+                lines.append(f"  {slow.problem}, add {slow.advice}")
+            lines.append("")
+        return "\n".join(lines)
+
+    async def write_report(self) -> None:
+        """Write the report to SLOW_QUERY_REPORT, off the event loop."""
+        self._last_write = time.monotonic()
+        async with self._write_lock:
+            try:
+                await asyncio.to_thread(_write_text, self.report_path, self.report())
+            except OSError as e:
+                logger.warning("Could not write the slow query report to %s: %s", self.report_path, e)
+
+def _write_text(path: str, text: str) -> None:
+    # Readers never see a half written report
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        file.write(text)
+    os.replace(path + ".tmp", path)
+
+#endregion
@@ -0,0 +1,166 @@
+#region Imports
+import asyncio
+import importlib
+import logging
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from types import ModuleType
+from typing import Iterator
+
+import lightbulb
+#endregion
+
+logger = logging.getLogger(__name__)
+
+#region Configuration
+STARTUP_BUDGET = float(os.getenv("STARTUP_BUDGET", "20"))  # Seconds from process start to READY before startup counts as slow
+STARTUP_REPORT_TOP = int(os.getenv("STARTUP_REPORT_TOP", "5"))  # Slowest extensions listed in the startup report
+#endregion
+
+#region Process Start
+
+def _process_age() -> float:
+    """
+    Get how long ago the interpreter started, so the time spent before this module was imported counts too.
+    Only Linux exposes it; elsewhere the clock starts when this module is imported.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the command name, which may itself contain spaces; starttime is field 22
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+PROCESS_STARTED = time.perf_counter() - _process_age()
+
+#endregion
+
+#region Startup Profile
+
+@dataclass
+class ExtensionTiming:
+    """How long one extension module took to import and to register with the client."""
+    name: str
+    import_seconds: float
+    register_seconds: float
+    failed: bool = False
+
+    @property
+    def total(self) -> float:
+        return self.import_seconds + self.register_seconds
+
+class StartupProfile:
+    """
+    Records where start-up time goes, from process start until the bot is ready.
+
+    Phases are timed with `phase`. Extensions are loaded one module at a time by `load_extensions`, so
+    the import and the registration of each module are timed separately. A module's import time
+    includes the first import of anything it pulls in that nothing before it had imported.
+    """
+
+    def __init__(self, budget: float = STARTUP_BUDGET) -> None:
+        self.budget = budget
+        self.phases: list[tuple[str, float]] = []
+        self.extensions: list[ExtensionTiming] = []
+        self.ready_after: float | None = None
+
+    def elapsed(self) -> float:
+        """Seconds since the process started."""
+        return time.perf_counter() - PROCESS_STARTED
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a start-up step, e.g. `with startup_profile.phase("database"):`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    async def load_extensions(self, client: lightbulb.Client, package: ModuleType) -> None:
+        """
+        Load every extension module in a package and its subpackages, as `client.load_extensions_from_package`
+        does, timing each module.
+
+        Args:
+            client (lightbulb.Client): The client to load the extensions into.
+            package (ModuleType): The extensions package.
+        """
+        start = time.perf_counter()
+        for name in discover_extensions(package):
+            import_start = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                # lightbulb skips extensions with a missing import; keep the same behaviour, with the traceback.
+                # Any other error is a bug in the extension and stops start-up, as it does in lightbulb.
+                logger.exception("Could not import %s, skipping it", name)
+                self.extensions.append(ExtensionTiming(name, time.perf_counter() - import_start, 0.0, failed=True))
+                continue
+            imported = time.perf_counter()
+
+            await client.load_extensions(name)
+            self.extensions.append(ExtensionTiming(name, imported - import_start, time.perf_counter() - imported))
+
+            # Give other start-up work, such as connecting to the database, a turn between modules
+            await asyncio.sleep(0)
+
+        self.phases.append(("extensions", time.perf_counter() - start))
+
+    def mark_ready(self) -> None:
+        """Record that the bot is ready and print the start-up report."""
+        if self.ready_after is None:
+            self.ready_after = self.elapsed()
+            logger.info(self.report())
+
+    def report(self) -> str:
+        """
+        Build the start-up report: time to ready against the budget, each phase and the slowest extensions.
+
+        Returns:
+            str: The report, one line per entry.
+        """
+        total = self.ready_after if self.ready_after is not None else self.elapsed()
+        verdict = "within" if total <= self.budget else "OVER"
+        lines = [f"[Startup] Ready after {total:.2f}s, {verdict} the {self.budget:.0f}s budget."]
+
+        if self.phases:
+            lines.append("[Startup]   " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases))
+
+        slowest = sorted(self.extensions, key=lambda timing: timing.total, reverse=True)[:STARTUP_REPORT_TOP]
+        for timing in slowest:
+            status = " (failed)" if timing.failed else ""
+            lines.append(
+                f"[Startup]   {timing.name:<45} import {timing.import_seconds * 1000:>7.1f} ms  "
+                f"register {timing.register_seconds * 1000:>6.1f} ms{status}"
+            )
+        return "\n".join(lines)
+
+def discover_extensions(package: ModuleType) -> list[str]:
+    """
+    List the extension modules in a package and its subpackages, skipping files that start with an underscore.
+
+    Args:
+        package (ModuleType): The package to search.
+
+    Returns:
+        list[str]: The import paths, in a stable order.
+    """
+    names = []
+    root = Path(package.__file__).parent
+    for item in sorted(root.iterdir()):
+        if item.is_dir() and (item / "__init__.py").exists():
+            names.extend(discover_extensions(importlib.import_module(f"{package.__name__}.{item.name}")))
+        elif item.suffix == ".py" and not item.name.startswith("_"):
+            names.append(f"{package.__name__}.{item.stem}")
+    return names
+
+startup_profile = StartupProfile()
+
+#endregion
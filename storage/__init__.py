@@ -0,0 +1,32 @@
+"""
+Storage backends behind database.py's collections.
+
+Backends are imported lazily so a deployment only loads the one it uses.
+"""
+from typing import Any
+
+from storage.base import Backend, Collection, Cursor
+
+BACKENDS = ("mongo", "memory", "sqlite")
+
+def create_backend(name: str, **options: Any) -> Backend:
+    """
+    Build a storage backend by name.
+
+    Args:
+        name (str): One of BACKENDS.
+        **options (Any): Passed to the backend's constructor.
+
+    Returns:
+        Backend: The backend.
+    """
+    if name == "mongo":
+        from storage.mongo import MongoBackend
+        return MongoBackend(**options)
+    if name == "memory":
+        from storage.memory import MemoryBackend
+        return MemoryBackend(**options)
+    if name == "sqlite":
+        from storage.sqlite import SQLiteBackend
+        return SQLiteBackend(**options)
+    raise ValueError(f"Unknown storage backend {name!r}, expected one of {BACKENDS}.")
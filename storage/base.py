@@ -0,0 +1,67 @@
+"""
+The interface every storage backend implements.
+
+It is the subset of pymongo's async collection API the bot relies on, so a MongoDB
+AsyncCollection satisfies it as-is and other backends only have to match its shape.
+"""
+#region Imports
+from typing import Any, AsyncIterator, Iterable, Protocol
+#endregion
+
+#region Protocols
+
+class Cursor(Protocol):
+    """A lazily evaluated query result."""
+
+    def sort(self, key_or_list: Any, direction: int | None = None) -> "Cursor": ...
+
+    def skip(self, skip: int) -> "Cursor": ...
+
+    def limit(self, limit: int) -> "Cursor": ...
+
+    async def to_list(self, length: int | None = None) -> list[dict]: ...
+
+    def __aiter__(self) -> AsyncIterator[dict]: ...
+
+class Collection(Protocol):
+    """A named set of documents."""
+    name: str
+    full_name: str
+
+    async def find_one(self, filter: dict | None = None, projection: dict | None = None, *args: Any, **kwargs: Any) -> dict | None: ...
+
+    def find(self, filter: dict | None = None, projection: dict | None = None, *args: Any, **kwargs: Any) -> Cursor: ...
+
+    async def count_documents(self, filter: dict, **kwargs: Any) -> int: ...
+
+    async def aggregate(self, pipeline: list[dict], *args: Any, **kwargs: Any) -> Cursor: ...
+
+    async def insert_one(self, document: dict, *args: Any, **kwargs: Any) -> Any: ...
+
+    async def insert_many(self, documents: Iterable[dict], ordered: bool = True, *args: Any, **kwargs: Any) -> Any: ...
+
+    async def update_one(self, filter: dict, update: dict | list[dict], upsert: bool = False, *args: Any, **kwargs: Any) -> Any: ...
+
+    async def update_many(self, filter: dict, update: dict | list[dict], upsert: bool = False, *args: Any, **kwargs: Any) -> Any: ...
+
+    async def find_one_and_update(self, filter: dict, update: dict | list[dict], *args: Any, **kwargs: Any) -> dict | None: ...
+
+    async def bulk_write(self, requests: Iterable[Any], ordered: bool = True, *args: Any, **kwargs: Any) -> Any: ...
+
+    async def index_information(self) -> dict[str, dict]: ...
+
+    async def create_indexes(self, indexes: list[Any], *args: Any, **kwargs: Any) -> list[str]: ...
+
+    async def drop_index(self, index_or_name: str, *args: Any, **kwargs: Any) -> None: ...
+
+class Backend(Protocol):
+    """Owns the connection, if any, and hands out collections."""
+    name: str
+
+    def collection(self, database: str, name: str) -> Collection: ...
+
+    async def ping(self) -> None: ...
+
+    async def close(self) -> None: ...
+
+#endregion
@@ -0,0 +1,489 @@
+"""
+An in-process storage backend that keeps every collection in a dict.
+
+Meant for benchmarks and offline runs: results are deterministic, nothing touches the network,
+and an optional fixed latency can be added to every call to model database round trips.
+Results and errors use pymongo's own types so calling code cannot tell the backends apart.
+"""
+#region Imports
+import asyncio
+import copy
+from typing import Any, Callable, Iterable
+
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+from storage import query
+#endregion
+
+BULK_WRITE_YIELD_EVERY = 10  # Requests a bulk write applies between yields to the event loop
+
+#region Cursor
+
+class MemoryCursor:
+    """
+    A cursor over documents produced on first iteration, mirroring the parts of AsyncCursor the bot uses.
+    """
+
+    def __init__(self, source: Callable[[], list[dict]], projection: dict | None = None) -> None:
+        self._source = source
+        self._projection = projection
+        self._sort: list[tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+        self._results: list[dict] | None = None
+        self._position = 0
+
+    def sort(self, key_or_list: Any, direction: int | None = None) -> "MemoryCursor":
+        self._sort = query.normalise_sort(key_or_list, direction)
+        return self
+
+    def skip(self, skip: int) -> "MemoryCursor":
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int) -> "MemoryCursor":
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size: int) -> "MemoryCursor":
+        return self
+
+    def _materialise(self) -> list[dict]:
+        if self._results is None:
+            documents = self._source()
+            if self._sort:
+                documents = query.sort_documents(documents, self._sort)
+            documents = documents[self._skip:]
+            if self._limit:
+                documents = documents[:self._limit]
+            self._results = [query.project(document, self._projection) for document in documents]
+        return self._results
+
+    async def to_list(self, length: int | None = None) -> list[dict]:
+        results = self._materialise()
+        end = len(results) if length is None else self._position + length
+        taken = results[self._position:end]
+        self._position += len(taken)
+        return taken
+
+    def __aiter__(self) -> "MemoryCursor":
+        return self
+
+    async def __anext__(self) -> dict:
+        results = self._materialise()
+        if self._position >= len(results):
+            raise StopAsyncIteration
+        self._position += 1
+        return results[self._position - 1]
+
+    async def close(self) -> None:
+        self._results = []
+        self._position = 0
+
+#endregion
+
+#region Collection
+
+class MemoryCollection:
+    """
+    An in-memory stand-in for pymongo's AsyncCollection.
+
+    Documents are stored by `_id` in insertion order. Unique indexes are enforced and double as
+    hash lookups, so a filter with equality on every field of a unique index is answered without a scan.
+    """
+
+    def __init__(self, database_name: str, name: str, latency: float = 0.0) -> None:
+        self.name = name
+        self.full_name = f"{database_name}.{name}"
+        self.latency = latency
+
+        self._documents: dict[Any, dict] = {}
+        self._indexes: dict[str, dict] = {"_id_": {"key": [("_id", 1)], "v": 2}}
+        self._unique: dict[str, dict[tuple, Any]] = {}
+
+    async def _round_trip(self) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    #region Index Bookkeeping
+
+    def _unique_fields(self, name: str) -> list[str]:
+        return [field for field, _ in self._indexes[name]["key"]]
+
+    def _unique_key(self, name: str, document: dict) -> tuple:
+        return tuple(query.hashable(query.get_path(document, field)) for field in self._unique_fields(name))
+
+    def _check_unique(self, document: dict, ignore_id: Any = None) -> None:
+        for name, entries in self._unique.items():
+            owner = entries.get(self._unique_key(name, document))
+            if owner is not None and owner != ignore_id:
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.full_name} index: {name}",
+                    11000,
+                    {"index": name}
+                )
+        if document["_id"] in self._documents and document["_id"] != ignore_id:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.full_name} index: _id_", 11000)
+
+    def _index_document(self, document: dict) -> None:
+        for name, entries in self._unique.items():
+            entries[self._unique_key(name, document)] = document["_id"]
+
+    def _unindex_document(self, document: dict) -> None:
+        for name, entries in self._unique.items():
+            entries.pop(self._unique_key(name, document), None)
+
+    #endregion
+
+    #region Document Selection
+
+    def _candidates(self, filter: dict | None) -> Iterable[dict]:
+        """
+        Narrow the documents a filter can match using `_id` or a unique index when possible.
+        """
+        equalities = query.equality_fields(filter)
+
+        if "_id" in equalities:
+            document = self._documents.get(equalities["_id"])
+            return [document] if document is not None else []
+
+        for name, entries in self._unique.items():
+            fields = self._unique_fields(name)
+            if all(field in equalities for field in fields):
+                owner = entries.get(tuple(query.hashable(equalities[field]) for field in fields))
+                return [self._documents[owner]] if owner is not None else []
+
+        return list(self._documents.values())
+
+    def _select(self, filter: dict | None, sort: Any = None, limit: int = 0) -> list[dict]:
+        matched = [document for document in self._candidates(filter) if query.match(document, filter)]
+        if sort:
+            matched = query.sort_documents(matched, query.normalise_sort(sort))
+        if limit:
+            matched = matched[:limit]
+        return matched
+
+    #endregion
+
+    #region Writes
+
+    def _insert(self, document: dict) -> Any:
+        if "_id" not in document:
+            # pymongo adds the generated _id to the caller's document, keep that behaviour
+            document["_id"] = ObjectId()
+        stored = copy.deepcopy(document)
+        self._check_unique(stored)
+        self._documents[stored["_id"]] = stored
+        self._index_document(stored)
+        return stored["_id"]
+
+    def _replace_stored(self, stored: dict, updated: dict) -> None:
+        self._unindex_document(stored)
+        try:
+            self._check_unique(updated, ignore_id=stored["_id"])
+        except DuplicateKeyError:
+            self._index_document(stored)
+            raise
+        self._documents[stored["_id"]] = updated
+        self._index_document(updated)
+
+    def _update(self, filter: dict, update: dict | list[dict], upsert: bool, many: bool, replace: bool = False) -> dict:
+        """
+        Apply an update or replacement and return a raw result in the server's format.
+        """
+        targets = self._select(filter)
+        if not many:
+            targets = targets[:1]
+
+        if not targets:
+            if not upsert:
+                return {"n": 0, "nModified": 0, "updatedExisting": False}
+            seed = {} if replace else query.upsert_seed(filter)
+            if replace:
+                seed.update(copy.deepcopy(update))
+            else:
+                query.apply_update(seed, update, inserting=True)
+            upserted_id = self._insert(seed)
+            return {"n": 1, "nModified": 0, "upserted": upserted_id, "updatedExisting": False}
+
+        modified = 0
+        for stored in targets:
+            if replace:
+                updated = {"_id": stored["_id"], **copy.deepcopy(update)}
+            else:
+                updated = copy.deepcopy(stored)
+                query.apply_update(updated, update)
+            if updated != stored:
+                self._replace_stored(stored, updated)
+                modified += 1
+        return {"n": len(targets), "nModified": modified, "updatedExisting": True}
+
+    def _delete(self, filter: dict, many: bool) -> int:
+        targets = self._select(filter)
+        if not many:
+            targets = targets[:1]
+        for stored in targets:
+            self._unindex_document(stored)
+            del self._documents[stored["_id"]]
+        return len(targets)
+
+    #endregion
+
+    #region Reads
+
+    async def find_one(self, filter: dict | None = None, projection: dict | None = None, *args: Any, sort: Any = None, **kwargs: Any) -> dict | None:
+        await self._round_trip()
+        matched = self._select(filter, sort, limit=1)
+        return query.project(matched[0], projection) if matched else None
+
+    def find(
+            self,
+            filter: dict | None = None,
+            projection: dict | None = None,
+            *args: Any,
+            sort: Any = None,
+            skip: int = 0,
+            limit: int = 0,
+            **kwargs: Any
+    ) -> MemoryCursor:
+        cursor = MemoryCursor(lambda: self._select(filter), projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit)
+
+    async def count_documents(self, filter: dict, skip: int = 0, limit: int = 0, **kwargs: Any) -> int:
+        await self._round_trip()
+        count = max(0, len(self._select(filter)) - skip)
+        return min(count, limit) if limit else count
+
+    async def estimated_document_count(self, **kwargs: Any) -> int:
+        await self._round_trip()
+        return len(self._documents)
+
+    async def aggregate(self, pipeline: list[dict], *args: Any, **kwargs: Any) -> MemoryCursor:
+        await self._round_trip()
+        results = query.aggregate(self._documents.values(), pipeline)
+        return MemoryCursor(lambda: results)
+
+    async def distinct(self, key: str, filter: dict | None = None, **kwargs: Any) -> list:
+        await self._round_trip()
+        values = []
+        for document in self._select(filter):
+            value = query.get_path(document, key)
+            for item in value if isinstance(value, list) else [value]:
+                if item is not query._MISSING and not any(query.values_equal(item, seen) for seen in values):
+                    values.append(item)
+        return values
+
+    #endregion
+
+    #region Write Operations
+
+    async def insert_one(self, document: dict, *args: Any, **kwargs: Any) -> InsertOneResult:
+        await self._round_trip()
+        return InsertOneResult(self._insert(document), True)
+
+    async def insert_many(self, documents: Iterable[dict], ordered: bool = True, *args: Any, **kwargs: Any) -> InsertManyResult:
+        await self._round_trip()
+        inserted_ids = []
+        write_errors = []
+        for index, document in enumerate(documents):
+            try:
+                inserted_ids.append(self._insert(document))
+            except DuplicateKeyError as e:
+                write_errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": document})
+                if ordered:
+                    break
+        if write_errors:
+            raise BulkWriteError(self._bulk_result(n_inserted=len(inserted_ids), write_errors=write_errors))
+        return InsertManyResult(inserted_ids, True)
+
+    async def update_one(self, filter: dict, update: dict | list[dict], upsert: bool = False, *args: Any, **kwargs: Any) -> UpdateResult:
+        await self._round_trip()
+        return UpdateResult(self._update(filter, update, upsert, many=False), True)
+
+    async def update_many(self, filter: dict, update: dict | list[dict], upsert: bool = False, *args: Any, **kwargs: Any) -> UpdateResult:
+        await self._round_trip()
+        return UpdateResult(self._update(filter, update, upsert, many=True), True)
+
+    async def replace_one(self, filter: dict, replacement: dict, upsert: bool = False, *args: Any, **kwargs: Any) -> UpdateResult:
+        await self._round_trip()
+        return UpdateResult(self._update(filter, replacement, upsert, many=False, replace=True), True)
+
+    async def delete_one(self, filter: dict, *args: Any, **kwargs: Any) -> DeleteResult:
+        await self._round_trip()
+        return DeleteResult({"n": self._delete(filter, many=False)}, True)
+
+    async def delete_many(self, filter: dict, *args: Any, **kwargs: Any) -> DeleteResult:
+        await self._round_trip()
+        return DeleteResult({"n": self._delete(filter, many=True)}, True)
+
+    async def find_one_and_update(
+            self,
+            filter: dict,
+            update: dict | list[dict],
+            projection: dict | None = None,
+            sort: Any = None,
+            upsert: bool = False,
+            return_document: bool = ReturnDocument.BEFORE,
+            **kwargs: Any
+    ) -> dict | None:
+        await self._round_trip()
+        matched = self._select(filter, sort, limit=1)
+
+        if not matched:
+            if not upsert:
+                return None
+            raw = self._update(filter, update, upsert=True, many=False)
+            return query.project(self._documents[raw["upserted"]], projection) if return_document == ReturnDocument.AFTER else None
+
+        before = copy.deepcopy(matched[0])
+        self._update({"_id": before["_id"]}, update, upsert=False, many=False)
+        document = self._documents[before["_id"]] if return_document == ReturnDocument.AFTER else before
+        return query.project(document, projection)
+
+    @staticmethod
+    def _bulk_result(
+            n_inserted: int = 0,
+            n_matched: int = 0,
+            n_modified: int = 0,
+            n_removed: int = 0,
+            upserted: list[dict] | None = None,
+            write_errors: list[dict] | None = None
+    ) -> dict:
+        upserted = upserted or []
+        return {
+            "nInserted": n_inserted,
+            "nUpserted": len(upserted),
+            "nMatched": n_matched,
+            "nModified": n_modified,
+            "nRemoved": n_removed,
+            "upserted": upserted,
+            "writeErrors": write_errors or [],
+            "writeConcernErrors": []
+        }
+
+    async def bulk_write(self, requests: Iterable[Any], ordered: bool = True, *args: Any, **kwargs: Any) -> BulkWriteResult:
+        """
+        Apply pymongo write models in one call. The models' private fields are read directly,
+        which is the same data pymongo itself serialises into the bulk command. Like a server,
+        it lets other calls run between requests; no bulk write is applied atomically.
+        """
+        await self._round_trip()
+        counts = {"n_inserted": 0, "n_matched": 0, "n_modified": 0, "n_removed": 0}
+        upserted = []
+        write_errors = []
+
+        for index, request in enumerate(requests):
+            if index and index % BULK_WRITE_YIELD_EVERY == 0:
+                # A server applies a large bulk write while the client's event loop keeps running
+                await asyncio.sleep(0)
+            try:
+                if isinstance(request, InsertOne):
+                    self._insert(request._doc)
+                    counts["n_inserted"] += 1
+                elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                    raw = self._update(
+                        request._filter,
+                        request._doc,
+                        bool(request._upsert),
+                        many=isinstance(request, UpdateMany),
+                        replace=isinstance(request, ReplaceOne)
+                    )
+                    if "upserted" in raw:
+                        upserted.append({"index": index, "_id": raw["upserted"]})
+                    else:
+                        counts["n_matched"] += raw["n"]
+                        counts["n_modified"] += raw["nModified"]
+                elif isinstance(request, (DeleteOne, DeleteMany)):
+                    counts["n_removed"] += self._delete(request._filter, many=isinstance(request, DeleteMany))
+                else:
+                    raise TypeError(f"{request!r} is not a valid request")
+            except DuplicateKeyError as e:
+                write_errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": request})
+                if ordered:
+                    break
+
+        result = self._bulk_result(upserted=upserted, write_errors=write_errors, **counts)
+        if write_errors:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    #endregion
+
+    #region Index Management
+
+    async def index_information(self) -> dict[str, dict]:
+        await self._round_trip()
+        return copy.deepcopy(self._indexes)
+
+    async def create_indexes(self, indexes: list[Any], *args: Any, **kwargs: Any) -> list[str]:
+        await self._round_trip()
+        names = []
+        for model in indexes:
+            document = model.document
+            name = document["name"]
+            info = {"key": list(document["key"].items()), "v": 2}
+            if document.get("sparse"):
+                info["sparse"] = True
+            if document.get("unique"):
+                info["unique"] = True
+
+                entries = {}
+                for stored in self._documents.values():
+                    key = tuple(query.hashable(query.get_path(stored, field)) for field, _ in info["key"])
+                    if key in entries:
+                        raise OperationFailure(f"Index build failed: E11000 duplicate key error collection: {self.full_name} index: {name}", 11000)
+                    entries[key] = stored["_id"]
+                self._unique[name] = entries
+
+            self._indexes[name] = info
+            names.append(name)
+        return names
+
+    async def drop_index(self, index_or_name: str, *args: Any, **kwargs: Any) -> None:
+        await self._round_trip()
+        if index_or_name not in self._indexes or index_or_name == "_id_":
+            raise OperationFailure(f"index not found with name [{index_or_name}]", 27)
+        del self._indexes[index_or_name]
+        self._unique.pop(index_or_name, None)
+
+    async def drop(self, *args: Any, **kwargs: Any) -> None:
+        await self._round_trip()
+        self._documents.clear()
+        self._indexes = {"_id_": {"key": [("_id", 1)], "v": 2}}
+        self._unique.clear()
+
+    #endregion
+
+#endregion
+
+#region Backend
+
+class MemoryBackend:
+    """
+    Hands out MemoryCollections, one per database and collection name.
+    """
+    name = "memory"
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self._collections: dict[tuple[str, str], MemoryCollection] = {}
+
+    def collection(self, database: str, name: str) -> MemoryCollection:
+        key = (database, name)
+        if key not in self._collections:
+            self._collections[key] = MemoryCollection(database, name, self.latency)
+        return self._collections[key]
+
+    async def ping(self) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def close(self) -> None:
+        return None
+
+#endregion
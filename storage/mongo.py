@@ -0,0 +1,183 @@
+"""
+The MongoDB backend. Collections are pymongo's own AsyncCollections; database.py wraps the backend in a
+TimedBackend, and CommandMonitor reports each command from the driver's own events.
+"""
+#region Imports
+import time
+from typing import Any, Callable
+
+from pymongo import AsyncMongoClient
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.monitoring import CommandListener, ConnectionPoolListener
+#endregion
+
+#region Configuration
+PENDING_MAX_AGE = 600.0  # Seconds after which a command with no succeeded or failed event is forgotten
+PENDING_PRUNE_AT = 1000  # Commands in flight before old ones are looked for
+#endregion
+
+#region Pool Monitor
+
+class PoolMonitor(ConnectionPoolListener):
+    """Counts the connections of the client's pools, across every server it talks to."""
+
+    def __init__(self) -> None:
+        self.open = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.clears = 0
+
+    def connection_created(self, event: Any) -> None:
+        self.open += 1
+
+    def connection_closed(self, event: Any) -> None:
+        self.open = max(self.open - 1, 0)
+
+    def connection_check_out_started(self, event: Any) -> None:
+        self.waiting += 1
+
+    def connection_checked_out(self, event: Any) -> None:
+        self.waiting = max(self.waiting - 1, 0)
+        self.in_use += 1
+        self.checkouts += 1
+
+    def connection_check_out_failed(self, event: Any) -> None:
+        self.waiting = max(self.waiting - 1, 0)
+        self.checkout_failures += 1
+
+    def connection_checked_in(self, event: Any) -> None:
+        self.in_use = max(self.in_use - 1, 0)
+
+    def pool_cleared(self, event: Any) -> None:
+        self.clears += 1
+
+    def pool_created(self, event: Any) -> None: ...
+
+    def pool_ready(self, event: Any) -> None: ...
+
+    def pool_closed(self, event: Any) -> None: ...
+
+    def connection_ready(self, event: Any) -> None: ...
+
+#endregion
+
+#region Command Monitor
+
+class CommandMonitor(CommandListener):
+    """
+    Reports every command the client sends to a collection: its collection, the driver command
+    ("find", "update", "findAndModify", ...), the round trip, the documents it returned or matched,
+    and whether it failed. Handshakes, pings and other commands without a collection are skipped.
+
+    The driver calls the listener in the task that awaited the command, so the callbacks can read
+    that task's context variables. A command whose succeeded or failed event never arrives, e.g. when
+    its connection is closed mid-command, is forgotten after PENDING_MAX_AGE seconds.
+
+    Args:
+        on_command (Callable[[str, str, float, int, bool], None]): Called with the collection,
+            operation, seconds, documents and whether the command failed.
+        on_slow (Callable[[str, str, str, dict, float], None] | None): Called with the database,
+            collection, operation, command document and seconds of every command that succeeded
+            but took at least `slow_threshold` seconds.
+        slow_threshold (float): Seconds from which a command goes to `on_slow`.
+    """
+
+    def __init__(
+        self,
+        on_command: Callable[[str, str, float, int, bool], None],
+        on_slow: Callable[[str, str, str, dict, float], None] | None = None,
+        slow_threshold: float = 0.0
+    ) -> None:
+        self.on_command = on_command
+        self.on_slow = on_slow
+        self.slow_threshold = slow_threshold
+        # Start time, database, collection and command of each command in flight, by request id, oldest first
+        self._pending: dict[int, tuple[float, str, str, Any]] = {}
+        self._prune_at = PENDING_PRUNE_AT
+
+    def started(self, event: Any) -> None:
+        collection = event.command.get("collection") if event.command_name == "getMore" else event.command.get(event.command_name)
+        if isinstance(collection, str):
+            # The command document is only kept when slow commands are reported
+            self._pending[event.request_id] = (time.monotonic(), event.database_name, collection, event.command if self.on_slow else None)
+            if len(self._pending) > self._prune_at:
+                self._prune()
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - PENDING_MAX_AGE
+        for request_id, pending in list(self._pending.items()):
+            if pending[0] >= cutoff:
+                break
+            del self._pending[request_id]
+        # Look again once the commands in flight have doubled, so pruning stays cheap under real load
+        self._prune_at = max(PENDING_PRUNE_AT, len(self._pending) * 2)
+
+    def succeeded(self, event: Any) -> None:
+        pending = self._pending.pop(event.request_id, None)
+        if pending is None:
+            return
+        _, database, collection, command = pending
+        seconds = event.duration_micros / 1_000_000
+        self.on_command(collection, event.command_name, seconds, _documents(event.command_name, event.reply), False)
+        if command is not None and seconds >= self.slow_threshold:
+            self.on_slow(database, collection, event.command_name, command, seconds)
+
+    def failed(self, event: Any) -> None:
+        pending = self._pending.pop(event.request_id, None)
+        if pending is not None:
+            self.on_command(pending[2], event.command_name, event.duration_micros / 1_000_000, 0, True)
+
+def _documents(command_name: str, reply: Any) -> int:
+    cursor = reply.get("cursor")
+    if cursor is not None:
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", ())))
+    if command_name == "findAndModify":
+        return 0 if reply.get("value") is None else 1
+    return int(reply.get("n", 0))
+
+#endregion
+
+#region Backend
+
+class MongoBackend:
+    """
+    Hands out collections from a single pooled AsyncMongoClient.
+    Building the backend does no network I/O; the pool opens on `ping()` or the first operation.
+    """
+    name = "mongo"
+
+    def __init__(self, uri: str, **client_options: Any) -> None:
+        self.pool = PoolMonitor()
+        client_options["event_listeners"] = [*client_options.get("event_listeners", []), self.pool]
+        self.client = AsyncMongoClient(uri, connect=False, **client_options)
+
+    def collection(self, database: str, name: str) -> AsyncCollection:
+        return self.client[database][name]
+
+    async def ping(self) -> None:
+        await self.client.admin.command("ping")
+
+    async def close(self) -> None:
+        await self.client.close()
+
+    def stats(self) -> dict[str, float]:
+        """
+        Get the connection pool's counters.
+
+        Returns:
+            dict[str, float]: Connections open, in use and waited for, the pool's size limit, and
+            checkout, checkout failure and pool clear totals.
+        """
+        return {
+            "pool_open": self.pool.open,
+            "pool_in_use": self.pool.in_use,
+            "pool_waiting": self.pool.waiting,
+            "pool_max_size": self.client.options.pool_options.max_pool_size,
+            "pool_checkouts": self.pool.checkouts,
+            "pool_checkout_failures": self.pool.checkout_failures,
+            "pool_clears": self.pool.clears
+        }
+
+#endregion
@@ -0,0 +1,738 @@
+"""
+Pure-Python evaluation of the MongoDB query, update, projection and aggregation subset the bot uses.
+
+Shared by the backends that do not have a server to run queries for them. Anything outside
+the supported subset raises ValueError rather than silently matching the wrong documents.
+"""
+#region Imports
+import copy
+from datetime import datetime
+from typing import Any, Iterable
+#endregion
+
+_MISSING = object()
+
+#region Values and Comparison
+
+def _type_rank(value: Any) -> int:
+    """
+    Rank a value by MongoDB's cross-type sort order so mixed-type fields still sort deterministically.
+
+    Args:
+        value (Any): The value to rank.
+
+    Returns:
+        int: The rank of the value's type.
+    """
+    if value is None or value is _MISSING:
+        return 0
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 1
+    if isinstance(value, str):
+        return 2
+    if isinstance(value, dict):
+        return 3
+    if isinstance(value, (list, tuple)):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if type(value).__name__ == "ObjectId":
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+def sort_key(value: Any) -> tuple:
+    """
+    Build a key that orders values the way MongoDB sorts them.
+
+    Args:
+        value (Any): The value to build a key for.
+
+    Returns:
+        tuple: A key that is comparable with any other key built by this function.
+    """
+    rank = _type_rank(value)
+    if rank == 0:
+        return (0, 0)
+    if rank in (3, 4, 10):
+        return (rank, repr(value))
+    if rank == 9 and value.tzinfo is not None:
+        # Stored documents may mix aware and naive datetimes; compare them all as naive UTC
+        value = value.replace(tzinfo=None) - value.utcoffset()
+    return (rank, value)
+
+def values_equal(left: Any, right: Any) -> bool:
+    """
+    Compare two values with MongoDB's equality rules, where booleans never equal numbers.
+
+    Args:
+        left (Any): The first value.
+        right (Any): The second value.
+
+    Returns:
+        bool: Whether the values are equal.
+    """
+    if left is _MISSING:
+        left = None
+    if right is _MISSING:
+        right = None
+    if _type_rank(left) != _type_rank(right):
+        return False
+    if isinstance(left, datetime):
+        return sort_key(left) == sort_key(right)
+    return left == right
+
+def _compare(left: Any, right: Any, operator: str) -> bool:
+    """
+    Apply an ordering operator, matching only values of the same type bracket like MongoDB does.
+
+    Args:
+        left (Any): The document value.
+        right (Any): The query value.
+        operator (str): One of $gt, $gte, $lt and $lte.
+
+    Returns:
+        bool: Whether the comparison holds.
+    """
+    if left is _MISSING or _type_rank(left) != _type_rank(right):
+        return False
+    left_key, right_key = sort_key(left), sort_key(right)
+    if operator == "$gt":
+        return left_key > right_key
+    if operator == "$gte":
+        return left_key >= right_key
+    if operator == "$lt":
+        return left_key < right_key
+    return left_key <= right_key
+
+def hashable(value: Any) -> Any:
+    """
+    Convert a value into something usable as a dict key, for unique index lookups.
+
+    Args:
+        value (Any): The value to convert.
+
+    Returns:
+        Any: A hashable equivalent of the value.
+    """
+    if value is _MISSING:
+        return None
+    if isinstance(value, dict):
+        return tuple((key, hashable(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(hashable(item) for item in value)
+    if isinstance(value, bool):
+        return ("bool", value)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+#endregion
+
+#region Field Paths
+
+def get_path(document: dict, path: str) -> Any:
+    """
+    Read a dotted field path without descending into arrays.
+
+    Args:
+        document (dict): The document to read from.
+        path (str): The dotted field path.
+
+    Returns:
+        Any: The value, or the module's missing sentinel when the path does not exist.
+    """
+    value = document
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return _MISSING
+    return value
+
+def _candidates(document: Any, parts: list[str]) -> list[Any]:
+    """
+    Collect every value a dotted path can reach, fanning out over arrays like MongoDB queries do.
+
+    Args:
+        document (Any): The document or sub-document being walked.
+        parts (list[str]): The remaining path components.
+
+    Returns:
+        list[Any]: The reachable values, empty when the path does not exist.
+    """
+    if not parts:
+        return [document]
+
+    head, rest = parts[0], parts[1:]
+    if isinstance(document, dict):
+        if head not in document:
+            return []
+        return _candidates(document[head], rest)
+    if isinstance(document, list):
+        if head.isdigit() and int(head) < len(document):
+            return _candidates(document[int(head)], rest)
+        found = []
+        for item in document:
+            if isinstance(item, (dict, list)):
+                found.extend(_candidates(item, parts))
+        return found
+    return []
+
+def set_path(document: dict, path: str, value: Any) -> None:
+    """
+    Set a dotted field path, creating intermediate sub-documents as needed.
+
+    Args:
+        document (dict): The document to modify.
+        path (str): The dotted field path.
+        value (Any): The value to store.
+    """
+    parts = path.split(".")
+    target = document
+    for part in parts[:-1]:
+        if isinstance(target, list) and part.isdigit():
+            target = target[int(part)]
+            continue
+        if not isinstance(target.get(part), (dict, list)):
+            target[part] = {}
+        target = target[part]
+    if isinstance(target, list) and parts[-1].isdigit():
+        target[int(parts[-1])] = value
+    else:
+        target[parts[-1]] = value
+
+def unset_path(document: dict, path: str) -> None:
+    """
+    Remove a dotted field path if it exists.
+
+    Args:
+        document (dict): The document to modify.
+        path (str): The dotted field path.
+    """
+    parts = path.split(".")
+    target = document
+    for part in parts[:-1]:
+        target = target.get(part) if isinstance(target, dict) else None
+        if target is None:
+            return
+    if isinstance(target, dict):
+        target.pop(parts[-1], None)
+
+#endregion
+
+#region Query Matching
+
+def _match_operators(values: list[Any], conditions: dict) -> bool:
+    """
+    Check a field's reachable values against an operator document such as {"$gt": 5}.
+
+    Args:
+        values (list[Any]): The values the field path reached.
+        conditions (dict): The operator document.
+
+    Returns:
+        bool: Whether every operator is satisfied.
+    """
+    # Arrays match an operator when the array itself or any of its elements does
+    expanded = list(values)
+    for value in values:
+        if isinstance(value, list):
+            expanded.extend(value)
+
+    for operator, operand in conditions.items():
+        if operator == "$eq":
+            matched = any(values_equal(value, operand) for value in expanded) or (operand is None and not values)
+        elif operator == "$ne":
+            matched = not (any(values_equal(value, operand) for value in expanded) or (operand is None and not values))
+        elif operator in ("$gt", "$gte", "$lt", "$lte"):
+            matched = any(_compare(value, operand, operator) for value in expanded)
+        elif operator == "$in":
+            matched = any(values_equal(value, option) for value in expanded for option in operand) or (None in operand and not values)
+        elif operator == "$nin":
+            matched = not (any(values_equal(value, option) for value in expanded for option in operand) or (None in operand and not values))
+        elif operator == "$exists":
+            matched = bool(values) == bool(operand)
+        elif operator == "$size":
+            matched = any(isinstance(value, list) and len(value) == operand for value in values)
+        elif operator == "$elemMatch":
+            matched = any(
+                isinstance(value, list) and any(
+                    match(item, operand) if isinstance(item, dict) else _match_operators([item], operand)
+                    for item in value
+                ) for value in values
+            )
+        elif operator == "$not":
+            matched = not _match_operators(values, operand)
+        else:
+            raise ValueError(f"Unsupported query operator {operator!r}.")
+
+        if not matched:
+            return False
+
+    return True
+
+def _is_operator_document(value: Any) -> bool:
+    return isinstance(value, dict) and bool(value) and all(key.startswith("$") for key in value)
+
+def match(document: dict, query: dict | None) -> bool:
+    """
+    Check whether a document satisfies a MongoDB query filter.
+
+    Args:
+        document (dict): The document to test.
+        query (dict | None): The query filter. None or {} matches everything.
+
+    Returns:
+        bool: Whether the document matches.
+    """
+    if not query:
+        return True
+
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(match(document, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(match(document, clause) for clause in condition):
+                return False
+        elif key == "$nor":
+            if any(match(document, clause) for clause in condition):
+                return False
+        elif key.startswith("$"):
+            raise ValueError(f"Unsupported top-level query operator {key!r}.")
+        else:
+            values = _candidates(document, key.split("."))
+            conditions = condition if _is_operator_document(condition) else {"$eq": condition}
+            if not _match_operators(values, conditions):
+                return False
+
+    return True
+
+def equality_fields(query: dict | None) -> dict[str, Any]:
+    """
+    Extract the plain equality conditions of a filter, used to seed upserts and to hit unique indexes.
+
+    Args:
+        query (dict | None): The query filter.
+
+    Returns:
+        dict[str, Any]: Field path to required value.
+    """
+    fields = {}
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            for clause in condition:
+                fields.update(equality_fields(clause))
+        elif key.startswith("$"):
+            continue
+        elif _is_operator_document(condition):
+            if "$eq" in condition:
+                fields[key] = condition["$eq"]
+        else:
+            fields[key] = condition
+    return fields
+
+#endregion
+
+#region Updates
+
+def apply_pipeline_update(document: dict, pipeline: list[dict]) -> None:
+    """
+    Apply an update pipeline in place. Each stage's expressions see the document as it entered the stage.
+
+    Args:
+        document (dict): The document to modify.
+        pipeline (list[dict]): The stages, $set/$addFields and $unset,
+            e.g. [{"$set": {"credit_score": {"$min": [850, {"$add": ["$credit_score", 5]}]}}}].
+    """
+    for stage in pipeline:
+        (operator, operand), = stage.items()
+        if operator in ("$set", "$addFields"):
+            values = {path: evaluate(expression, document) for path, expression in operand.items()}
+            for path, value in values.items():
+                if path == "_id":
+                    raise ValueError("The _id field cannot be modified.")
+                set_path(document, path, copy.deepcopy(value))
+        elif operator == "$unset":
+            for path in [operand] if isinstance(operand, str) else operand:
+                unset_path(document, path)
+        else:
+            raise ValueError(f"Unsupported update pipeline stage {operator!r}.")
+
+def apply_update(document: dict, update: dict | list[dict], inserting: bool = False) -> None:
+    """
+    Apply a MongoDB update document, or update pipeline, in place.
+
+    Args:
+        document (dict): The document to modify.
+        update (dict | list[dict]): The update document, e.g. {"$inc": {"cash": 5}}, or an update pipeline.
+        inserting (bool): Whether the document is being created by an upsert, which enables $setOnInsert.
+    """
+    if isinstance(update, list):
+        apply_pipeline_update(document, update)
+        return
+
+    if not update or not all(key.startswith("$") for key in update):
+        raise ValueError("Update documents must only contain update operators.")
+
+    for operator, fields in update.items():
+        for path, operand in fields.items():
+            if path == "_id" and operator != "$setOnInsert":
+                raise ValueError("The _id field cannot be modified.")
+
+            current = get_path(document, path)
+
+            if operator == "$set":
+                set_path(document, path, copy.deepcopy(operand))
+            elif operator == "$setOnInsert":
+                if inserting:
+                    set_path(document, path, copy.deepcopy(operand))
+            elif operator == "$unset":
+                unset_path(document, path)
+            elif operator == "$inc":
+                set_path(document, path, operand if current is _MISSING else current + operand)
+            elif operator == "$mul":
+                set_path(document, path, 0 if current is _MISSING else current * operand)
+            elif operator == "$max":
+                if current is _MISSING or sort_key(operand) > sort_key(current):
+                    set_path(document, path, copy.deepcopy(operand))
+            elif operator == "$min":
+                if current is _MISSING or sort_key(operand) < sort_key(current):
+                    set_path(document, path, copy.deepcopy(operand))
+            elif operator in ("$push", "$addToSet"):
+                items = operand["$each"] if isinstance(operand, dict) and "$each" in operand else [operand]
+                array = [] if current is _MISSING else current
+                if not isinstance(array, list):
+                    raise ValueError(f"Cannot apply {operator} to non-array field {path!r}.")
+                for item in items:
+                    if operator == "$push" or not any(values_equal(existing, item) for existing in array):
+                        array.append(copy.deepcopy(item))
+                set_path(document, path, array)
+            elif operator == "$pull":
+                if isinstance(current, list):
+                    set_path(document, path, [
+                        item for item in current
+                        if not (
+                            match(item, operand) if isinstance(item, dict) and isinstance(operand, dict) and not _is_operator_document(operand)
+                            else _match_operators([item], operand) if _is_operator_document(operand)
+                            else values_equal(item, operand)
+                        )
+                    ])
+            else:
+                raise ValueError(f"Unsupported update operator {operator!r}.")
+
+def upsert_seed(query: dict | None) -> dict:
+    """
+    Build the document an upsert starts from, made of the filter's equality conditions.
+
+    Args:
+        query (dict | None): The query filter of the upsert.
+
+    Returns:
+        dict: The seed document.
+    """
+    seed = {}
+    for path, value in equality_fields(query).items():
+        set_path(seed, path, copy.deepcopy(value))
+    return seed
+
+#endregion
+
+#region Projection and Sorting
+
+def project(document: dict, projection: dict | Iterable[str] | None) -> dict:
+    """
+    Apply an inclusion or exclusion projection to top-level fields.
+
+    Args:
+        document (dict): The document to project.
+        projection (dict | Iterable[str] | None): The projection, as a dict or a list of included fields.
+
+    Returns:
+        dict: A new, independent document.
+    """
+    if not projection:
+        return copy.deepcopy(document)
+
+    if not isinstance(projection, dict):
+        projection = {name: 1 for name in projection}
+
+    include_id = bool(projection.get("_id", 1))
+    included = [name for name, flag in projection.items() if name != "_id" and flag]
+
+    if included:
+        result = {}
+        if include_id and "_id" in document:
+            result["_id"] = document["_id"]
+        for name in included:
+            value = get_path(document, name)
+            if value is not _MISSING:
+                set_path(result, name, copy.deepcopy(value))
+        return result
+
+    result = copy.deepcopy(document)
+    for name, flag in projection.items():
+        if not flag:
+            unset_path(result, name)
+    return result
+
+def normalise_sort(sort: Any, direction: int | None = None) -> list[tuple[str, int]]:
+    """
+    Accept every sort spelling pymongo does: a key and direction, a list of pairs or a dict.
+
+    Args:
+        sort (Any): The sort key or specification.
+        direction (int | None): The direction when `sort` is a single key.
+
+    Returns:
+        list[tuple[str, int]]: The sort specification as (field, direction) pairs.
+    """
+    if sort is None:
+        return []
+    if isinstance(sort, str):
+        return [(sort, direction if direction is not None else 1)]
+    if isinstance(sort, dict):
+        return list(sort.items())
+    return [(name, order) for name, order in sort]
+
+def sort_documents(documents: list[dict], sort: list[tuple[str, int]]) -> list[dict]:
+    """
+    Sort documents by a multi-field specification, stably.
+
+    Args:
+        documents (list[dict]): The documents to sort.
+        sort (list[tuple[str, int]]): The (field, direction) pairs.
+
+    Returns:
+        list[dict]: The sorted documents.
+    """
+    ordered = list(documents)
+    for name, direction in reversed(sort):
+        ordered.sort(key=lambda document: sort_key(get_path(document, name)), reverse=direction < 0)
+    return ordered
+
+#endregion
+
+#region Aggregation
+
+def evaluate(expression: Any, document: dict) -> Any:
+    """
+    Evaluate an aggregation expression such as "$cash" or {"$add": ["$cash", 5]} against a document.
+
+    Args:
+        expression (Any): The expression.
+        document (dict): The document providing field values.
+
+    Returns:
+        Any: The result. Missing fields evaluate to None.
+    """
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = get_path(document, expression[1:])
+        return None if value is _MISSING else value
+
+    if isinstance(expression, list):
+        return [evaluate(item, document) for item in expression]
+
+    if not isinstance(expression, dict):
+        return expression
+
+    if not _is_operator_document(expression):
+        return {key: evaluate(value, document) for key, value in expression.items()}
+
+    (operator, operand), = expression.items()
+
+    if operator == "$literal":
+        return operand
+
+    arguments = [evaluate(item, document) for item in operand] if isinstance(operand, list) else [evaluate(operand, document)]
+
+    if operator == "$add":
+        return None if any(item is None for item in arguments) else sum(arguments)
+    if operator == "$subtract":
+        return None if None in arguments[:2] else arguments[0] - arguments[1]
+    if operator == "$multiply":
+        result = 1
+        for item in arguments:
+            if item is None:
+                return None
+            result *= item
+        return result
+    if operator == "$divide":
+        return None if None in arguments[:2] else arguments[0] / arguments[1]
+    if operator in ("$max", "$min"):
+        present = [item for item in arguments if item is not None]
+        if not present:
+            return None
+        chooser = max if operator == "$max" else min
+        return chooser(present, key=sort_key)
+    if operator == "$ifNull":
+        for item in arguments[:-1]:
+            if item is not None:
+                return item
+        return arguments[-1]
+    if operator == "$cond":
+        if isinstance(operand, dict):
+            condition, then, otherwise = operand["if"], operand["then"], operand["else"]
+        else:
+            condition, then, otherwise = operand
+        return evaluate(then, document) if evaluate(condition, document) else evaluate(otherwise, document)
+    if operator == "$eq":
+        return values_equal(arguments[0], arguments[1])
+    if operator == "$ne":
+        return not values_equal(arguments[0], arguments[1])
+    if operator in ("$gt", "$gte", "$lt", "$lte"):
+        left, right = sort_key(arguments[0]), sort_key(arguments[1])
+        return {"$gt": left > right, "$gte": left >= right, "$lt": left < right, "$lte": left <= right}[operator]
+    if operator == "$and":
+        return all(arguments)
+    if operator == "$or":
+        return any(arguments)
+    if operator == "$not":
+        return not arguments[0]
+    if operator == "$size":
+        return len(arguments[0])
+
+    raise ValueError(f"Unsupported expression operator {operator!r}.")
+
+def _accumulate(operator: str, values: list[Any]) -> Any:
+    """
+    Run a $group accumulator over the values collected for one group.
+
+    Args:
+        operator (str): The accumulator, e.g. "$sum".
+        values (list[Any]): The evaluated values, in document order.
+
+    Returns:
+        Any: The accumulated value.
+    """
+    numbers = [value for value in values if isinstance(value, (int, float)) and not isinstance(value, bool)]
+    present = [value for value in values if value is not None]
+
+    if operator == "$sum":
+        return sum(numbers)
+    if operator == "$avg":
+        return sum(numbers) / len(numbers) if numbers else None
+    if operator == "$max":
+        return max(present, key=sort_key) if present else None
+    if operator == "$min":
+        return min(present, key=sort_key) if present else None
+    if operator == "$first":
+        return values[0] if values else None
+    if operator == "$last":
+        return values[-1] if values else None
+    if operator == "$push":
+        return list(values)
+    if operator == "$addToSet":
+        unique = []
+        for value in values:
+            if not any(values_equal(value, existing) for existing in unique):
+                unique.append(value)
+        return unique
+    raise ValueError(f"Unsupported $group accumulator {operator!r}.")
+
+def _group(documents: list[dict], specification: dict) -> list[dict]:
+    """
+    Run a $group stage.
+
+    Args:
+        documents (list[dict]): The input documents.
+        specification (dict): The $group specification.
+
+    Returns:
+        list[dict]: One document per group, in order of first appearance.
+    """
+    groups: dict[Any, tuple[Any, list[dict]]] = {}
+    for document in documents:
+        group_id = evaluate(specification["_id"], document)
+        groups.setdefault(hashable(group_id), (group_id, []))[1].append(document)
+
+    results = []
+    for group_id, members in groups.values():
+        result = {"_id": group_id}
+        for name, accumulator in specification.items():
+            if name == "_id":
+                continue
+            (operator, expression), = accumulator.items()
+            result[name] = _accumulate(operator, [evaluate(expression, member) for member in members])
+        results.append(result)
+    return results
+
+def aggregate(documents: Iterable[dict], pipeline: list[dict]) -> list[dict]:
+    """
+    Run an aggregation pipeline over documents.
+    Supports $match, $group, $sort, $skip, $limit, $project, $set/$addFields, $unset, $unwind and $count.
+
+    Args:
+        documents (Iterable[dict]): The collection's documents. They are not modified.
+        pipeline (list[dict]): The pipeline stages.
+
+    Returns:
+        list[dict]: The resulting documents.
+    """
+    results = [copy.deepcopy(document) for document in documents]
+
+    for stage in pipeline:
+        (name, specification), = stage.items()
+
+        if name == "$match":
+            results = [document for document in results if match(document, specification)]
+        elif name == "$group":
+            results = _group(results, specification)
+        elif name == "$sort":
+            results = sort_documents(results, normalise_sort(specification))
+        elif name == "$skip":
+            results = results[specification:]
+        elif name == "$limit":
+            results = results[:specification]
+        elif name == "$project":
+            flags = {key: value for key, value in specification.items() if isinstance(value, (bool, int))}
+            computed = {key: value for key, value in specification.items() if key not in flags}
+            if computed or any(flag for key, flag in flags.items() if key != "_id"):
+                projected = []
+                for document in results:
+                    result = {"_id": document["_id"]} if flags.get("_id", 1) and "_id" in document else {}
+                    for key, flag in flags.items():
+                        value = get_path(document, key)
+                        if key != "_id" and flag and value is not _MISSING:
+                            set_path(result, key, value)
+                    for key, expression in computed.items():
+                        set_path(result, key, evaluate(expression, document))
+                    projected.append(result)
+                results = projected
+            else:
+                results = [project(document, flags) for document in results]
+        elif name in ("$set", "$addFields"):
+            for document in results:
+                values = {key: evaluate(expression, document) for key, expression in specification.items()}
+                for key, value in values.items():
+                    set_path(document, key, value)
+        elif name == "$unset":
+            for document in results:
+                for path in [specification] if isinstance(specification, str) else specification:
+                    unset_path(document, path)
+        elif name == "$unwind":
+            path = specification if isinstance(specification, str) else specification["path"]
+            path = path[1:]
+            unwound = []
+            for document in results:
+                array = get_path(document, path)
+                if isinstance(array, list):
+                    for item in array:
+                        copied = copy.deepcopy(document)
+                        set_path(copied, path, item)
+                        unwound.append(copied)
+            results = unwound
+        elif name == "$count":
+            results = [{specification: len(results)}] if results else []
+        else:
+            raise ValueError(f"Unsupported aggregation stage {name!r}.")
+
+    return results
+
+#endregion
@@ -0,0 +1,796 @@
+"""
+An embedded SQLite backend for single-node deployments.
+
+Every collection is a table of (_id, doc) rows where `doc` is the document as JSON. Indexes from
+indexes.py become SQLite expression indexes over `json_extract`, and filters on indexed fields are
+pushed down into SQL so those indexes are used. Whatever cannot be expressed in SQL is checked in Python
+with the same matcher the memory backend uses, so results never depend on what was pushed down.
+
+The database runs in WAL mode. Reads run on worker threads with their own connections, while every write
+goes through one dedicated writer thread that commits queued writes together in a single transaction.
+"""
+#region Imports
+import asyncio
+import base64
+import json
+import queue
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable
+
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+from storage import query
+#endregion
+
+#region Encoding
+
+_FIELD_PATH = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+def _encode_value(value: Any) -> Any:
+    """
+    Encode the BSON types JSON has no literal for. Datetimes are stored as fixed-width UTC strings
+    so their JSON text sorts chronologically, which lets range filters on them run in SQL.
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return {"$date": value.strftime(_DATE_FORMAT)}
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    if isinstance(value, bytes):
+        return {"$binary": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Cannot store values of type {type(value).__name__}.")
+
+def _decode_object(document: dict) -> Any:
+    if len(document) == 1:
+        if "$date" in document:
+            return datetime.strptime(document["$date"], _DATE_FORMAT).replace(tzinfo=timezone.utc)
+        if "$oid" in document:
+            return ObjectId(document["$oid"])
+        if "$binary" in document:
+            return base64.b64decode(document["$binary"])
+    return document
+
+def dumps(value: Any) -> str:
+    """Serialise a document or value the way it is stored, in SQLite's own compact JSON form."""
+    return json.dumps(value, default=_encode_value, separators=(",", ":"), ensure_ascii=False)
+
+def loads(text: str) -> Any:
+    return json.loads(text, object_hook=_decode_object)
+
+def _expression(path: str) -> str:
+    """The SQL expression for a field. Index definitions and queries must build it identically for SQLite to use the index."""
+    return f"json_extract(doc, '$.{path}')"
+
+def _sql_param(value: Any) -> Any:
+    """Convert a query value into what `json_extract` returns for the same stored value."""
+    if isinstance(value, (datetime, ObjectId, bytes)):
+        return dumps(value)
+    return value
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+#endregion
+
+#region Filter Pushdown
+
+def _translate(filter: dict | None, indexed: set[str]) -> tuple[list[str], list[Any], bool]:
+    """
+    Translate the parts of a filter that touch indexed fields into SQL conditions.
+
+    The SQL always selects a superset of the matching documents, so results are re-checked in Python.
+    Index keys are assumed to hold scalars, as all of the bot's do.
+
+    Args:
+        filter (dict | None): The query filter.
+        indexed (set[str]): The field paths covered by an index on the collection.
+
+    Returns:
+        tuple[list[str], list[Any], bool]: The SQL conditions, their parameters, and whether the
+            conditions express the whole filter exactly.
+    """
+    clauses: list[str] = []
+    params: list[Any] = []
+    complete = True
+
+    for key, condition in (filter or {}).items():
+        if key == "$and":
+            for clause in condition:
+                sub_clauses, sub_params, sub_complete = _translate(clause, indexed)
+                clauses.extend(sub_clauses)
+                params.extend(sub_params)
+                complete = complete and sub_complete
+            continue
+
+        if key == "$or":
+            branches = [_translate(clause, indexed) for clause in condition]
+            if branches and all(branch[0] for branch in branches):
+                clauses.append("(" + " OR ".join("(" + " AND ".join(branch[0]) + ")" for branch in branches) + ")")
+                for branch in branches:
+                    params.extend(branch[1])
+                complete = complete and all(branch[2] for branch in branches)
+            else:
+                complete = False
+            continue
+
+        if key.startswith("$") or not _FIELD_PATH.match(key) or (key != "_id" and key not in indexed):
+            complete = False
+            continue
+
+        expression = "_id" if key == "_id" else _expression(key)
+        operators = condition if isinstance(condition, dict) and condition and all(name.startswith("$") for name in condition) else {"$eq": condition}
+
+        for operator, operand in operators.items():
+            exact_scalar = isinstance(operand, (str, int, float)) and not isinstance(operand, bool)
+
+            if key == "_id":
+                if operator == "$eq":
+                    clauses.append("_id = ?")
+                    params.append(dumps(operand))
+                else:
+                    complete = False
+            elif operator == "$eq" and exact_scalar:
+                clauses.append(f"{expression} = ?")
+                params.append(operand)
+            elif operator == "$in" and operand and all(isinstance(item, (str, int, float)) and not isinstance(item, bool) for item in operand):
+                clauses.append(f"{expression} IN ({', '.join('?' for _ in operand)})")
+                params.extend(operand)
+            elif operator in ("$gt", "$gte", "$lt", "$lte") and operand is not None and not isinstance(operand, (bool, dict, list)):
+                # SQLite orders numbers before text, so this still selects a superset of MongoDB's type-bracketed match
+                sql_operator = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}[operator]
+                clauses.append(f"{expression} {sql_operator} ?")
+                params.append(_sql_param(operand))
+                complete = False
+            else:
+                complete = False
+
+    return clauses, params, complete
+
+#endregion
+
+#region Writer Thread
+
+class _Writer(threading.Thread):
+    """
+    Owns the only writing connection. Jobs queued while a transaction is running are committed
+    together in the next one, each inside its own savepoint so a failing job only rolls back itself.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], batch_size: int) -> None:
+        super().__init__(name="sqlite-writer", daemon=True)
+        self._connect = connect
+        self.batch_size = batch_size
+        self._jobs: queue.SimpleQueue = queue.SimpleQueue()
+
+        # Counters
+        self.transactions = 0
+        self.jobs = 0
+
+    def submit(self, job: Callable[[sqlite3.Connection], Any]) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._jobs.put((job, loop, future))
+        return future
+
+    def stop(self) -> None:
+        self._jobs.put(None)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result: Any, error: BaseException | None) -> None:
+        if future.cancelled():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run(self) -> None:
+        connection = self._connect()
+        stopping = False
+
+        while not stopping:
+            item = self._jobs.get()
+            if item is None:
+                break
+
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            outcomes = []
+            connection.execute("BEGIN IMMEDIATE")
+            for job, loop, future in batch:
+                connection.execute("SAVEPOINT job")
+                try:
+                    result = job(connection)
+                    connection.execute("RELEASE job")
+                    outcomes.append((loop, future, result, None))
+                except Exception as e:
+                    connection.execute("ROLLBACK TO job")
+                    connection.execute("RELEASE job")
+                    outcomes.append((loop, future, None, e))
+
+            try:
+                connection.execute("COMMIT")
+            except sqlite3.Error as e:
+                connection.execute("ROLLBACK")
+                outcomes = [(loop, future, None, OperationFailure(f"SQLite commit failed: {e}")) for loop, future, _, _ in outcomes]
+
+            self.transactions += 1
+            self.jobs += len(batch)
+
+            for loop, future, result, error in outcomes:
+                try:
+                    loop.call_soon_threadsafe(self._resolve, future, result, error)
+                except RuntimeError:
+                    # The caller's loop already closed, there is nobody left to tell
+                    pass
+
+        connection.close()
+
+#endregion
+
+#region Cursor
+
+class SQLiteCursor:
+    """
+    A cursor that runs its query on a worker thread the first time it is read.
+    Sort, skip and limit are pushed into SQL when the filter and sort keys allow it.
+    """
+
+    def __init__(self, collection: "SQLiteCollection", filter: dict | None, projection: dict | None) -> None:
+        self._collection = collection
+        self._filter = filter
+        self._projection = projection
+        self._sort: list[tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+        self._results: list[dict] | None = None
+        self._position = 0
+
+    def sort(self, key_or_list: Any, direction: int | None = None) -> "SQLiteCursor":
+        self._sort = query.normalise_sort(key_or_list, direction)
+        return self
+
+    def skip(self, skip: int) -> "SQLiteCursor":
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int) -> "SQLiteCursor":
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size: int) -> "SQLiteCursor":
+        return self
+
+    async def _materialise(self) -> list[dict]:
+        if self._results is None:
+            documents = await self._collection._read(
+                self._collection._select, self._filter, self._sort, self._skip, self._limit
+            )
+            self._results = [query.project(document, self._projection) for document in documents]
+        return self._results
+
+    async def to_list(self, length: int | None = None) -> list[dict]:
+        results = await self._materialise()
+        end = len(results) if length is None else self._position + length
+        taken = results[self._position:end]
+        self._position += len(taken)
+        return taken
+
+    def __aiter__(self) -> "SQLiteCursor":
+        return self
+
+    async def __anext__(self) -> dict:
+        results = await self._materialise()
+        if self._position >= len(results):
+            raise StopAsyncIteration
+        self._position += 1
+        return results[self._position - 1]
+
+    async def close(self) -> None:
+        self._results = []
+        self._position = 0
+
+class _ListCursor(SQLiteCursor):
+    """A cursor over results that are already computed, as returned by `aggregate`."""
+
+    def __init__(self, results: list[dict]) -> None:
+        super().__init__(None, None, None)
+        self._results = results
+
+#endregion
+
+#region Collection
+
+class SQLiteCollection:
+    """
+    A collection stored in one SQLite table, mirroring the parts of pymongo's AsyncCollection the bot uses.
+    """
+
+    def __init__(self, backend: "SQLiteBackend", database_name: str, name: str) -> None:
+        self._backend = backend
+        self.name = name
+        self.full_name = f"{database_name}.{name}"
+        self._table = _quote(self.full_name)
+        self._ready = False
+        self._indexed: set[str] = set()
+
+    #region Plumbing
+
+    async def _prepare(self) -> None:
+        if self._ready:
+            return
+        await self._backend._write(self._create_table)
+        self._indexed = await self._backend._read(self._load_indexed_fields)
+        self._ready = True
+
+    def _create_table(self, connection: sqlite3.Connection) -> None:
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {self._table} (_id TEXT PRIMARY KEY, doc TEXT NOT NULL)")
+
+    def _load_indexed_fields(self, connection: sqlite3.Connection) -> set[str]:
+        fields = set()
+        for (key,) in connection.execute("SELECT key FROM __indexes WHERE collection = ?", (self.full_name,)):
+            fields.update(field for field, _ in json.loads(key))
+        return fields
+
+    async def _read(self, function: Callable, *args: Any) -> Any:
+        await self._prepare()
+        return await self._backend._read(function, *args)
+
+    async def _write(self, function: Callable, *args: Any) -> Any:
+        await self._prepare()
+        return await self._backend._write(lambda connection: function(connection, *args))
+
+    def _duplicate(self, error: sqlite3.IntegrityError) -> DuplicateKeyError:
+        return DuplicateKeyError(f"E11000 duplicate key error collection: {self.full_name} ({error})", 11000)
+
+    #endregion
+
+    #region Selection
+
+    def _select(
+            self,
+            connection: sqlite3.Connection,
+            filter: dict | None,
+            sort: list[tuple[str, int]] | None = None,
+            skip: int = 0,
+            limit: int = 0
+    ) -> list[dict]:
+        clauses, params, complete = _translate(filter, self._indexed)
+        sql = f"SELECT doc FROM {self._table}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+
+        sort = sort or []
+        pushdown = complete and all(name in self._indexed for name, _ in sort)
+        if pushdown:
+            if sort:
+                sql += " ORDER BY " + ", ".join(f"{_expression(name)} {'DESC' if direction < 0 else 'ASC'}" for name, direction in sort)
+            if limit or skip:
+                sql += " LIMIT ? OFFSET ?"
+                params = [*params, limit or -1, skip]
+            return [loads(text) for (text,) in connection.execute(sql, params)]
+
+        documents = [document for document in (loads(text) for (text,) in connection.execute(sql, params)) if query.match(document, filter)]
+        if sort:
+            documents = query.sort_documents(documents, sort)
+        documents = documents[skip:]
+        return documents[:limit] if limit else documents
+
+    def _count(self, connection: sqlite3.Connection, filter: dict | None) -> int:
+        clauses, params, complete = _translate(filter, self._indexed)
+        if complete:
+            sql = f"SELECT COUNT(*) FROM {self._table}"
+            if clauses:
+                sql += " WHERE " + " AND ".join(clauses)
+            return connection.execute(sql, params).fetchone()[0]
+        return len(self._select(connection, filter))
+
+    #endregion
+
+    #region Write Primitives
+
+    def _insert(self, connection: sqlite3.Connection, document: dict) -> Any:
+        if "_id" not in document:
+            # pymongo adds the generated _id to the caller's document, keep that behaviour
+            document["_id"] = ObjectId()
+        try:
+            connection.execute(f"INSERT INTO {self._table} (_id, doc) VALUES (?, ?)", (dumps(document["_id"]), dumps(document)))
+        except sqlite3.IntegrityError as e:
+            raise self._duplicate(e) from e
+        return document["_id"]
+
+    def _update(
+            self,
+            connection: sqlite3.Connection,
+            filter: dict,
+            update: dict | list[dict],
+            upsert: bool,
+            many: bool,
+            replace: bool = False,
+            sort: list[tuple[str, int]] | None = None
+    ) -> tuple[dict, dict | None, dict | None]:
+        """
+        Apply an update or replacement.
+
+        Returns:
+            tuple[dict, dict | None, dict | None]: The raw result in the server's format, and the first
+                matched document before and after the change.
+        """
+        targets = self._select(connection, filter, sort, limit=0 if many else 1)
+
+        if not targets:
+            if not upsert:
+                return {"n": 0, "nModified": 0, "updatedExisting": False}, None, None
+            if replace:
+                document = dict(update)
+            else:
+                document = query.upsert_seed(filter)
+                query.apply_update(document, update, inserting=True)
+            upserted_id = self._insert(connection, document)
+            return {"n": 1, "nModified": 0, "upserted": upserted_id, "updatedExisting": False}, None, document
+
+        modified = 0
+        first_after = None
+        for stored in targets:
+            if replace:
+                updated = {"_id": stored["_id"], **update}
+            else:
+                updated = loads(dumps(stored))
+                query.apply_update(updated, update)
+            if first_after is None:
+                first_after = updated
+            if updated != stored:
+                try:
+                    connection.execute(f"UPDATE {self._table} SET doc = ? WHERE _id = ?", (dumps(updated), dumps(stored["_id"])))
+                except sqlite3.IntegrityError as e:
+                    raise self._duplicate(e) from e
+                modified += 1
+        return {"n": len(targets), "nModified": modified, "updatedExisting": True}, targets[0], first_after
+
+    def _delete(self, connection: sqlite3.Connection, filter: dict, many: bool) -> int:
+        targets = self._select(connection, filter, limit=0 if many else 1)
+        connection.executemany(f"DELETE FROM {self._table} WHERE _id = ?", [(dumps(document["_id"]),) for document in targets])
+        return len(targets)
+
+    #endregion
+
+    #region Reads
+
+    async def find_one(self, filter: dict | None = None, projection: dict | None = None, *args: Any, sort: Any = None, **kwargs: Any) -> dict | None:
+        documents = await self._read(self._select, filter, query.normalise_sort(sort), 0, 1)
+        return query.project(documents[0], projection) if documents else None
+
+    def find(
+            self,
+            filter: dict | None = None,
+            projection: dict | None = None,
+            *args: Any,
+            sort: Any = None,
+            skip: int = 0,
+            limit: int = 0,
+            **kwargs: Any
+    ) -> SQLiteCursor:
+        cursor = SQLiteCursor(self, filter, projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit)
+
+    async def count_documents(self, filter: dict, skip: int = 0, limit: int = 0, **kwargs: Any) -> int:
+        count = max(0, await self._read(self._count, filter) - skip)
+        return min(count, limit) if limit else count
+
+    async def estimated_document_count(self, **kwargs: Any) -> int:
+        return await self._read(self._count, None)
+
+    async def aggregate(self, pipeline: list[dict], *args: Any, **kwargs: Any) -> SQLiteCursor:
+        # A leading $match is pushed down like any other filter, the rest runs in Python
+        leading_match = pipeline[0]["$match"] if pipeline and "$match" in pipeline[0] else None
+        documents = await self._read(self._select, leading_match)
+        return _ListCursor(query.aggregate(documents, pipeline[1:] if leading_match is not None else pipeline))
+
+    #endregion
+
+    #region Write Operations
+
+    async def insert_one(self, document: dict, *args: Any, **kwargs: Any) -> InsertOneResult:
+        return InsertOneResult(await self._write(self._insert, document), True)
+
+    async def insert_many(self, documents: Iterable[dict], ordered: bool = True, *args: Any, **kwargs: Any) -> InsertManyResult:
+        documents = list(documents)
+
+        def insert_all(connection: sqlite3.Connection) -> tuple[list, list]:
+            inserted_ids, write_errors = [], []
+            for index, document in enumerate(documents):
+                try:
+                    inserted_ids.append(self._insert(connection, document))
+                except DuplicateKeyError as e:
+                    write_errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": document})
+                    if ordered:
+                        break
+            return inserted_ids, write_errors
+
+        inserted_ids, write_errors = await self._write(insert_all)
+        if write_errors:
+            raise BulkWriteError(_bulk_result(n_inserted=len(inserted_ids), write_errors=write_errors))
+        return InsertManyResult(inserted_ids, True)
+
+    async def update_one(self, filter: dict, update: dict | list[dict], upsert: bool = False, *args: Any, **kwargs: Any) -> UpdateResult:
+        raw, _, _ = await self._write(self._update, filter, update, upsert, False)
+        return UpdateResult(raw, True)
+
+    async def update_many(self, filter: dict, update: dict | list[dict], upsert: bool = False, *args: Any, **kwargs: Any) -> UpdateResult:
+        raw, _, _ = await self._write(self._update, filter, update, upsert, True)
+        return UpdateResult(raw, True)
+
+    async def replace_one(self, filter: dict, replacement: dict, upsert: bool = False, *args: Any, **kwargs: Any) -> UpdateResult:
+        raw, _, _ = await self._write(self._update, filter, replacement, upsert, False, True)
+        return UpdateResult(raw, True)
+
+    async def delete_one(self, filter: dict, *args: Any, **kwargs: Any) -> DeleteResult:
+        return DeleteResult({"n": await self._write(self._delete, filter, False)}, True)
+
+    async def delete_many(self, filter: dict, *args: Any, **kwargs: Any) -> DeleteResult:
+        return DeleteResult({"n": await self._write(self._delete, filter, True)}, True)
+
+    async def find_one_and_update(
+            self,
+            filter: dict,
+            update: dict | list[dict],
+            projection: dict | None = None,
+            sort: Any = None,
+            upsert: bool = False,
+            return_document: bool = ReturnDocument.BEFORE,
+            **kwargs: Any
+    ) -> dict | None:
+        _, before, after = await self._write(self._update, filter, update, upsert, False, False, query.normalise_sort(sort))
+        document = after if return_document == ReturnDocument.AFTER else before
+        return query.project(document, projection) if document is not None else None
+
+    async def bulk_write(self, requests: Iterable[Any], ordered: bool = True, *args: Any, **kwargs: Any) -> BulkWriteResult:
+        """
+        Apply pymongo write models in one writer transaction. The models' private fields are read directly,
+        which is the same data pymongo itself serialises into the bulk command.
+        """
+        requests = list(requests)
+
+        def apply_all(connection: sqlite3.Connection) -> tuple[dict, list, list]:
+            counts = {"n_inserted": 0, "n_matched": 0, "n_modified": 0, "n_removed": 0}
+            upserted, write_errors = [], []
+            for index, request in enumerate(requests):
+                connection.execute("SAVEPOINT bulk_op")
+                try:
+                    if isinstance(request, InsertOne):
+                        self._insert(connection, request._doc)
+                        counts["n_inserted"] += 1
+                    elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                        raw, _, _ = self._update(
+                            connection,
+                            request._filter,
+                            request._doc,
+                            bool(request._upsert),
+                            isinstance(request, UpdateMany),
+                            isinstance(request, ReplaceOne)
+                        )
+                        if "upserted" in raw:
+                            upserted.append({"index": index, "_id": raw["upserted"]})
+                        else:
+                            counts["n_matched"] += raw["n"]
+                            counts["n_modified"] += raw["nModified"]
+                    elif isinstance(request, (DeleteOne, DeleteMany)):
+                        counts["n_removed"] += self._delete(connection, request._filter, isinstance(request, DeleteMany))
+                    else:
+                        raise TypeError(f"{request!r} is not a valid request")
+                    connection.execute("RELEASE bulk_op")
+                except DuplicateKeyError as e:
+                    connection.execute("ROLLBACK TO bulk_op")
+                    connection.execute("RELEASE bulk_op")
+                    write_errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": request})
+                    if ordered:
+                        break
+            return counts, upserted, write_errors
+
+        counts, upserted, write_errors = await self._write(apply_all)
+        result = _bulk_result(upserted=upserted, write_errors=write_errors, **counts)
+        if write_errors:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    #endregion
+
+    #region Index Management
+
+    def _index_information(self, connection: sqlite3.Connection) -> dict[str, dict]:
+        information = {"_id_": {"key": [("_id", 1)], "v": 2}}
+        for name, key, unique in connection.execute("SELECT name, key, is_unique FROM __indexes WHERE collection = ?", (self.full_name,)):
+            information[name] = {"key": [tuple(pair) for pair in json.loads(key)], "v": 2}
+            if unique:
+                information[name]["unique"] = True
+        return information
+
+    async def index_information(self) -> dict[str, dict]:
+        return await self._read(self._index_information)
+
+    async def create_indexes(self, indexes: list[Any], *args: Any, **kwargs: Any) -> list[str]:
+        specs = []
+        for model in indexes:
+            document = model.document
+            key = [(field, int(direction)) for field, direction in document["key"].items()]
+            for field, _ in key:
+                if not _FIELD_PATH.match(field):
+                    raise OperationFailure(f"Unsupported index key {field!r} for the SQLite backend.")
+            specs.append((document["name"], key, bool(document.get("unique"))))
+
+        def create_all(connection: sqlite3.Connection) -> list[str]:
+            for name, key, unique in specs:
+                columns = ", ".join(f"{_expression(field)} {'DESC' if direction < 0 else 'ASC'}" for field, direction in key)
+                try:
+                    connection.execute(
+                        f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {_quote(self.full_name + '.' + name)} "
+                        f"ON {self._table} ({columns})"
+                    )
+                except sqlite3.IntegrityError as e:
+                    raise OperationFailure(f"Index build failed: E11000 duplicate key error collection: {self.full_name} index: {name}", 11000) from e
+                connection.execute(
+                    "INSERT OR REPLACE INTO __indexes (collection, name, key, is_unique) VALUES (?, ?, ?, ?)",
+                    (self.full_name, name, json.dumps(key), int(unique))
+                )
+            return [name for name, _, _ in specs]
+
+        names = await self._write(create_all)
+        self._indexed.update(field for _, key, _ in specs for field, _ in key)
+        return names
+
+    async def drop_index(self, index_or_name: str, *args: Any, **kwargs: Any) -> None:
+        def drop(connection: sqlite3.Connection) -> None:
+            deleted = connection.execute(
+                "DELETE FROM __indexes WHERE collection = ? AND name = ?", (self.full_name, index_or_name)
+            ).rowcount
+            if not deleted:
+                raise OperationFailure(f"index not found with name [{index_or_name}]", 27)
+            connection.execute(f"DROP INDEX IF EXISTS {_quote(self.full_name + '.' + index_or_name)}")
+
+        await self._write(drop)
+        self._indexed = await self._backend._read(self._load_indexed_fields)
+
+    async def drop(self, *args: Any, **kwargs: Any) -> None:
+        def drop_table(connection: sqlite3.Connection) -> None:
+            connection.execute(f"DROP TABLE IF EXISTS {self._table}")
+            connection.execute("DELETE FROM __indexes WHERE collection = ?", (self.full_name,))
+
+        await self._write(drop_table)
+        self._ready = False
+
+    #endregion
+
+def _bulk_result(
+        n_inserted: int = 0,
+        n_matched: int = 0,
+        n_modified: int = 0,
+        n_removed: int = 0,
+        upserted: list[dict] | None = None,
+        write_errors: list[dict] | None = None
+) -> dict:
+    upserted = upserted or []
+    return {
+        "nInserted": n_inserted,
+        "nUpserted": len(upserted),
+        "nMatched": n_matched,
+        "nModified": n_modified,
+        "nRemoved": n_removed,
+        "upserted": upserted,
+        "writeErrors": write_errors or [],
+        "writeConcernErrors": []
+    }
+
+#endregion
+
+#region Backend
+
+class SQLiteBackend:
+    """
+    Hands out SQLiteCollections stored in one database file.
+    Nothing is opened until the first operation or `ping()`.
+    """
+    name = "sqlite"
+
+    def __init__(self, path: str, batch_size: int = 256, busy_timeout_ms: int = 5000) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.busy_timeout_ms = busy_timeout_ms
+
+        self._collections: dict[tuple[str, str], SQLiteCollection] = {}
+        self._writer: _Writer | None = None
+        self._readers = threading.local()
+        self._reader_connections: list[sqlite3.Connection] = []
+        self._reader_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        return connection
+
+    def _connect_writer(self) -> sqlite3.Connection:
+        connection = self._connect()
+        connection.execute("CREATE TABLE IF NOT EXISTS __indexes (collection TEXT NOT NULL, name TEXT NOT NULL, key TEXT NOT NULL, is_unique INTEGER NOT NULL, PRIMARY KEY (collection, name))")
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self._readers, "connection", None)
+        if connection is None:
+            connection = self._connect()
+            connection.execute("PRAGMA query_only=1")
+            self._readers.connection = connection
+            with self._reader_lock:
+                self._reader_connections.append(connection)
+        return connection
+
+    async def _write(self, job: Callable[[sqlite3.Connection], Any]) -> Any:
+        if self._writer is None:
+            self._writer = _Writer(self._connect_writer, self.batch_size)
+            self._writer.start()
+        return await self._writer.submit(job)
+
+    async def _read(self, function: Callable, *args: Any) -> Any:
+        if self._writer is None:
+            # The writer creates the schema, make sure it has run before the first read
+            await self._write(lambda connection: None)
+        return await asyncio.to_thread(lambda: function(self._reader(), *args))
+
+    def collection(self, database: str, name: str) -> SQLiteCollection:
+        key = (database, name)
+        if key not in self._collections:
+            self._collections[key] = SQLiteCollection(self, database, name)
+        return self._collections[key]
+
+    def stats(self) -> dict[str, float]:
+        """
+        Get the writer's counters.
+
+        Returns:
+            dict[str, float]: Write jobs, transactions and the average number of jobs per transaction.
+        """
+        writer = self._writer
+        if writer is None:
+            return {"jobs": 0, "transactions": 0, "jobs_per_transaction": 0.0}
+        return {
+            "jobs": writer.jobs,
+            "transactions": writer.transactions,
+            "jobs_per_transaction": writer.jobs / writer.transactions if writer.transactions else 0.0
+        }
+
+    async def ping(self) -> None:
+        await self._read(lambda connection: connection.execute("SELECT 1").fetchone())
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.stop()
+            await asyncio.to_thread(self._writer.join)
+            self._writer = None
+        with self._reader_lock:
+            for connection in self._reader_connections:
+                connection.close()
+            self._reader_connections.clear()
+        self._readers = threading.local()
+
+#endregion
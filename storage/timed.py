@@ -0,0 +1,127 @@
+"""
+A backend wrapper that reports how long every database call takes.
+
+Each collection method that goes to the database is awaited through the wrapper, which passes the
+elapsed seconds to a callback. Cursors are wrapped too, so `find(...).to_list()` and `async for` over
+a cursor are timed, while building the cursor is not. Everything else is passed straight through.
+"""
+#region Imports
+import time
+from typing import Any, AsyncIterator, Callable
+
+from storage.base import Backend, Collection, Cursor
+#endregion
+
+#region Timed Storage
+
+# Collection methods that return a coroutine doing I/O
+TIMED_METHODS = frozenset({
+    "find_one", "count_documents", "insert_one", "insert_many", "update_one", "update_many",
+    "find_one_and_update", "bulk_write", "index_information", "create_indexes", "drop_index",
+    "delete_one", "delete_many", "replace_one", "distinct"
+})
+
+class TimedCursor:
+    """A cursor whose reads are timed."""
+
+    def __init__(self, cursor: Cursor, on_call: Callable[[float], None]) -> None:
+        self._cursor = cursor
+        self._on_call = on_call
+
+    def sort(self, key_or_list: Any, direction: int | None = None) -> "TimedCursor":
+        self._cursor = self._cursor.sort(key_or_list, direction)
+        return self
+
+    def skip(self, skip: int) -> "TimedCursor":
+        self._cursor = self._cursor.skip(skip)
+        return self
+
+    def limit(self, limit: int) -> "TimedCursor":
+        self._cursor = self._cursor.limit(limit)
+        return self
+
+    async def to_list(self, length: int | None = None) -> list[dict]:
+        start = time.perf_counter()
+        try:
+            return await self._cursor.to_list(length)
+        finally:
+            self._on_call(time.perf_counter() - start)
+
+    async def __aiter__(self) -> AsyncIterator[dict]:
+        iterator = self._cursor.__aiter__()
+        while True:
+            start = time.perf_counter()
+            try:
+                document = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                self._on_call(time.perf_counter() - start)
+            yield document
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+class TimedCollection:
+    """A collection whose database calls are timed."""
+
+    def __init__(self, collection: Collection, on_call: Callable[[float], None]) -> None:
+        self._collection = collection
+        self._on_call = on_call
+
+    def find(self, *args: Any, **kwargs: Any) -> TimedCursor:
+        return TimedCursor(self._collection.find(*args, **kwargs), self._on_call)
+
+    async def aggregate(self, *args: Any, **kwargs: Any) -> TimedCursor:
+        start = time.perf_counter()
+        try:
+            cursor = await self._collection.aggregate(*args, **kwargs)
+        finally:
+            self._on_call(time.perf_counter() - start)
+        return TimedCursor(cursor, self._on_call)
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._collection, name)
+        if name not in TIMED_METHODS:
+            return attribute
+
+        async def timed(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return await attribute(*args, **kwargs)
+            finally:
+                self._on_call(time.perf_counter() - start)
+
+        return timed
+
+class TimedBackend:
+    """
+    Wraps a backend so that every database call made through its collections is reported to `on_call`.
+
+    Args:
+        backend (Backend): The backend to wrap.
+        on_call (Callable[[float], None]): Called with the seconds each call took.
+    """
+
+    def __init__(self, backend: Backend, on_call: Callable[[float], None]) -> None:
+        self._backend = backend
+        self._on_call = on_call
+        self.name = backend.name
+
+    def collection(self, database: str, name: str) -> TimedCollection:
+        return TimedCollection(self._backend.collection(database, name), self._on_call)
+
+    async def ping(self) -> None:
+        start = time.perf_counter()
+        try:
+            await self._backend.ping()
+        finally:
+            self._on_call(time.perf_counter() - start)
+
+    async def close(self) -> None:
+        await self._backend.close()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._backend, name)
+
+#endregion